@@ -0,0 +1,139 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.dirname(__file__) + '/..'))
+import argparse
+import multiprocessing as mp
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from loguru import logger
+from utils import tools, io, monitor
+from utils.scheduler import run_job, DONE
+
+'''
+    End-to-end time-to-solution benchmark of the trainers.
+
+    python benchmarks/e2e.py run                                # ppo, her_ddqn, sac on their canonical instance
+    python benchmarks/e2e.py run --algorithms ppo --seeds 10 20 --num_steps 40 --reward 0
+    python benchmarks/e2e.py run --quick                        # small budgets, checks that the harness works
+    python benchmarks/e2e.py table cache/benchmarks/e2e_a.json cache/benchmarks/e2e_b.json
+
+    Every (algorithm, seed) trains from scratch in a fresh process with resume snapshots, plateau stops and the
+    profiler signal off, and ends at the first evaluation that reaches the target (monitor.Target_Detector): an
+    episode of at most 'num_steps' steps and, when given, a reward of at least 'reward'. The default target is an
+    episode that collects all the data before the step limit. A run records the wall-clock seconds and env steps
+    to the target, or its whole budget when it never gets there; table puts the medians over the seeds of one or
+    more result files side by side, so a change can be judged by time-to-solution instead of steps per second.
+'''
+
+BENCH_DIR = 'cache/benchmarks/'
+
+# budget: max_train_steps (env steps) for ppo and sac, episodes for her_ddqn; num_steps: default target (step limit - 1)
+ALGORITHMS = {
+    'ppo': {'entry_point': 'trainerV3.MA_PPO.train_ppo_vanilla:train_job', 'instance': 'config_5', 'num_steps': 99,
+            'budget': 'max_train_steps', 'full': 3e5, 'quick': 2e3, 'params': {'evaluate_freq': 1000, 'snapshot_freq': 0, 'device': 'cpu'}},
+    'her_ddqn': {'entry_point': 'trainerV2.DDQN_MA.main:train_job', 'instance': 'config_5', 'num_steps': 199,
+                 'budget': 'n_games', 'full': 3000, 'quick': 10, 'params': {}},
+    # NOTE: SAC trains on its own continuous test environment, its trainer is not wired to the instance lists
+    'sac': {'entry_point': 'benchmarks.e2e:sac_job', 'instance': 'Test_Environment_Continuous', 'num_steps': 99,
+            'budget': 'max_train_steps', 'full': 3e5, 'quick': 2e3, 'params': {}},
+}
+
+def ddqn_config():
+    # configs/config_ddqn_2.yaml without snapshots (a run must not resume), plateau stop and profiler signal
+    config = tools.load_config('configs/config_ddqn_2.yaml')
+    config['SNAPSHOT_FREQ'] = 0
+    config['PROFILE_SECONDS'] = 0
+    config.pop('EARLY_STOP', None)
+    io.save_config(output_dir=io.mkdir(BENCH_DIR), args=config, name='e2e_ddqn')
+    return BENCH_DIR + 'e2e_ddqn.yaml'
+
+def sac_job(params):
+    from trainer.SAC import sac_main
+    tools.setup_seed(params['seed'])
+    target = monitor.Target_Detector(**params['target'])
+    agent = sac_main.Agent()
+    agent.train(params['max_train_steps'], early_stop=target)
+    return target.result()
+
+def init_worker(threads):
+    import torch
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+
+def run_one(name, seed, target, quick=False, threads=1):
+    spec = ALGORITHMS[name]
+    params = dict(spec['params'], instance=spec['instance'], seed=seed, target=target)
+    params[spec['budget']] = spec['quick'] if quick else spec['full']
+    if name == 'her_ddqn':
+        params['config'] = ddqn_config()
+    # one fresh process per run, nothing is shared with the previous run
+    with ProcessPoolExecutor(max_workers=1, mp_context=mp.get_context('spawn'), initializer=init_worker, initargs=(threads,)) as pool:
+        status, result, seconds, error = pool.submit(run_job, spec['entry_point'], params).result()
+    if status != DONE:
+        logger.error('{} seed {} failed:\n{}'.format(name, seed, error))
+        return {'status': status, 'error': error.strip().splitlines()[-1] if error else '', 'wall_seconds': seconds}
+    return {'status': status, 'wall_seconds': seconds, 'solved': result.get('solved', False), 'steps_to_target': result.get('steps_to_target'),
+            'seconds_to_target': result.get('seconds_to_target'), 'evaluations_to_target': result.get('evaluations_to_target'),
+            'total_steps': result.get('total_steps'), 'best_reward': result.get('best_reward')}
+
+def run(algorithms, seeds, num_steps=None, reward=None, quick=False, threads=1):
+    from benchmarks.micro import machine_info
+    runs = {}
+    for name in algorithms:
+        target = {'max_num_steps': num_steps if num_steps is not None else ALGORITHMS[name]['num_steps'], 'min_reward': reward}
+        runs[name] = {'instance': ALGORITHMS[name]['instance'], 'target': target, 'seeds': {}}
+        for seed in seeds:
+            logger.info('e2e {} seed {}'.format(name, seed))
+            runs[name]['seeds'][str(seed)] = run_one(name, seed, target, quick=quick, threads=threads)
+    return {'meta': dict(machine_info(), quick=quick, threads=threads), 'runs': runs}
+
+def summarize(run):
+    # medians over the seeds that finished; time and steps to target only over the seeds that reached it
+    done = [result for result in run['seeds'].values() if result['status'] == DONE]
+    solved = [result for result in done if result['solved']]
+    median = lambda values: float(np.median(values)) if values else float('nan')
+    return {'seeds': len(run['seeds']), 'failed': len(run['seeds']) - len(done), 'solved': len(solved),
+            'seconds_to_target': median([result['seconds_to_target'] for result in solved]),
+            'steps_to_target': median([result['steps_to_target'] for result in solved]),
+            'wall_seconds': median([result['wall_seconds'] for result in done]),
+            'total_steps': median([result['total_steps'] for result in done if result['total_steps'] is not None])}
+
+def print_table(reports):
+    # seconds / env steps: to the target; wall s / total steps: the whole run, the budget when it was not solved
+    print('{:<24}  {:<10}  {:<28}  {:>7}  {:>9}  {:>10}  {:>9}  {:>11}'.format('run', 'algorithm', 'instance / target', 'solved', 'seconds', 'env steps', 'wall s', 'total steps'))
+    for label, report in reports:
+        for name, run in report['runs'].items():
+            row = summarize(run)
+            target = '{} <={}{}'.format(run['instance'], run['target']['max_num_steps'],
+                                       '' if run['target']['min_reward'] is None else ' r>={}'.format(run['target']['min_reward']))
+            print('{:<24}  {:<10}  {:<28}  {:>7}  {:>9.1f}  {:>10.0f}  {:>9.1f}  {:>11.0f}{}'.format(
+                label[:24], name, target[:28], '{}/{}'.format(row['solved'], row['seeds']), row['seconds_to_target'],
+                row['steps_to_target'], row['wall_seconds'], row['total_steps'], '  {} FAILED'.format(row['failed']) if row['failed'] else ''))
+    for label, report in reports:
+        print('{}: commit {} ({}){}'.format(label, report['meta']['commit'], report['meta']['time'], ', quick' if report['meta']['quick'] else ''))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='e2e', description='end-to-end time-to-solution benchmark')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    run_parser = subparsers.add_parser('run')
+    run_parser.add_argument('--algorithms', nargs='+', default=list(ALGORITHMS), choices=list(ALGORITHMS))
+    run_parser.add_argument('--seeds', nargs='+', type=int, default=[10])
+    run_parser.add_argument('--num_steps', type=int, default=None)
+    run_parser.add_argument('--reward', type=float, default=None)
+    run_parser.add_argument('--quick', action='store_true')
+    run_parser.add_argument('--threads', type=int, default=1)
+    run_parser.add_argument('--output', type=str, default=None)
+    table_parser = subparsers.add_parser('table')
+    table_parser.add_argument('reports', nargs='+', type=str)
+    parsed_args = parser.parse_args()
+
+    if parsed_args.command == 'run':
+        report = run(parsed_args.algorithms, parsed_args.seeds, num_steps=parsed_args.num_steps, reward=parsed_args.reward,
+                     quick=parsed_args.quick, threads=parsed_args.threads)
+        output = parsed_args.output or io.mkdir(BENCH_DIR) + 'e2e_{}.json'.format(time.strftime('%b%d-%H_%M_%S'))
+        io.mkdir(os.path.dirname(output) or '.')
+        io.dump_json(output, report)
+        logger.success('results written to {}'.format(output))
+        print_table([(os.path.basename(output), report)])
+    else:
+        print_table([(os.path.basename(file), io.load_json(file, default={})) for file in parsed_args.reports])
@@ -0,0 +1,331 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.dirname(__file__) + '/..'))
+import argparse
+import gc
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+import numpy as np
+import torch
+from loguru import logger
+from utils import tools, io
+
+'''
+    Micro-benchmarks of the environments, the rate cutoff, replay buffers, the PPO update, the seed ensemble and the
+    import time of worker entry modules.
+
+    python benchmarks/micro.py run                          # all benchmarks -> cache/benchmarks/micro_<time>.json
+    python benchmarks/micro.py run --filter v2_board --quick
+    python benchmarks/micro.py compare cache/benchmarks/micro_<time>.json --threshold 0.2
+    python benchmarks/micro.py run --save_baseline          # refresh benchmarks/baselines/micro.json
+
+    Every result has a value, a unit and whether higher is better; compare flags the results that are worse than
+    the baseline by more than 'threshold' (relative) and exits with 1 when there is any. Quick runs time far fewer
+    calls, they are compared with the looser QUICK_THRESHOLD and can not be saved as the baseline. Boards are built at
+    rounding 1 with their signal maps in cache/map/bench/, so the first run also pays for the map builds.
+'''
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines', 'micro.json')
+PHI_CONFIG = 'configs/config_trans_model_2_D_4.yaml'
+BENCH_DIR = 'cache/benchmarks/'
+# RATE_CUTOFF of bench_rate_cutoff: cutoff radii of 1.4 to 3.4 on the 10x10 bench boards
+RATE_CUTOFF = 0.2
+THRESHOLD = 0.2
+QUICK_THRESHOLD = 0.5
+
+def rate(fn, number, repeat=5):
+    # best of 'repeat' runs of 'number' calls, as calls per second
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append(time.perf_counter() - start)
+    best = min(times)
+    return {'value': number / best, 'unit': 'ops/s', 'higher_is_better': True, 'median_us': float(np.median(times)) / number * 1e6}
+
+def seconds(fn, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {'value': min(times), 'unit': 's', 'higher_is_better': False}
+
+def phi_config(num_towers, rate_cutoff=0):
+    # one phi per tower (the moving-target rate uses the whole list), cycled from the shipped 5-tower config
+    config = tools.load_config(PHI_CONFIG)
+    if num_towers == len(config['PHI_LIST']) and not rate_cutoff:
+        return PHI_CONFIG
+    config['PHI_LIST'] = [config['PHI_LIST'][i % len(config['PHI_LIST'])] for i in range(num_towers)]
+    config['RATE_CUTOFF'] = rate_cutoff
+    name = 'phi_{}'.format(num_towers) + ('_cutoff_{}'.format(rate_cutoff) if rate_cutoff else '')
+    io.save_config(output_dir=io.mkdir(BENCH_DIR), args=config, name=name)
+    return BENCH_DIR + name + '.yaml'
+
+def towers(num_towers, limit=10):
+    rng = np.random.default_rng(num_towers)
+    return np.round(rng.uniform(0.5, limit - 0.5, size=(num_towers, 2)), 1).tolist()
+
+def board(num_agents, num_towers, target_move_type='stationary', rounding=1, signal_map=True, rate_cutoff=0):
+    from environments.v2 import models
+    io.mkdir('cache/map/bench/')
+    args = {'target_move_type': target_move_type}
+    if target_move_type == 'circular':
+        args.update({'radius': [0.5] * num_towers, 'w': [0.1] * num_towers, 'w_0': list(range(num_towers))})
+    return models.Board(x_limit=10, y_limit=10, start_at=[[0, 1]] * num_agents, arrival_at=[[7, 9]] * num_agents,
+                        tower_location=towers(num_towers), dv_required=[5] * num_towers, phi_config_file=phi_config(num_towers, rate_cutoff),
+                        save_file='bench/towers_{}_r{}'.format(num_towers, rounding) if signal_map else None, rounding=rounding,
+                        control_time_scale=1, args=args)
+
+def board_steps(b, num_agents, quick):
+    rng = np.random.default_rng(0)
+    actions = rng.uniform(-0.5, 0.5, size=(100, num_agents, 2))
+    state = {'t': 0}
+
+    def step():
+        if state['t'] % 100 == 0:
+            b.reset()
+        b.update_agents(joint_actions=actions[state['t'] % 100])
+        state['t'] += 1
+    return rate(step, number=50 if quick else 200, repeat=3)
+
+def bench_v2_board(results, quick):
+    agents_list, towers_list = ([1, 4], [2, 8]) if quick else ([1, 4, 16], [2, 8, 64])
+    for target_move_type in ['stationary', 'circular']:
+        for num_agents in agents_list:
+            for num_towers in towers_list:
+                b = board(num_agents, num_towers, target_move_type)
+                results['v2_board_step/{}/agents_{}/towers_{}'.format(target_move_type, num_agents, num_towers)] = board_steps(b, num_agents, quick)
+
+def bench_rate_cutoff(results, quick):
+    # board steps without a signal map (rates every substep) with and without a RATE_CUTOFF; gain is the steps/s with the
+    # cutoff over without. Below Board.CULL_MIN_TOWERS towers both take the dense call, moving towers only skip the
+    # finished ones
+    for target_move_type in ['stationary', 'circular']:
+        for num_towers in [64, 1024]:
+            for rate_cutoff in [0, RATE_CUTOFF]:
+                b = board(1, num_towers, target_move_type, signal_map=False, rate_cutoff=rate_cutoff)
+                results['rate_cutoff/{}/towers_{}/cutoff_{}'.format(target_move_type, num_towers, rate_cutoff)] = board_steps(b, 1, quick)
+            without, cutoff = [results['rate_cutoff/{}/towers_{}/cutoff_{}'.format(target_move_type, num_towers, rate_cutoff)]['value'] for rate_cutoff in [0, RATE_CUTOFF]]
+            results['rate_cutoff/{}/towers_{}/gain'.format(target_move_type, num_towers)] = {'value': cutoff / without, 'unit': 'x', 'higher_is_better': True}
+
+def bench_v1_task(results, quick):
+    from environments.v1.tasks import Single_Task
+    from environments.v1.game import Agent
+    io.mkdir('cache/map/bench/')
+    # NOTE: Single_Task builds its map at rounding 2, a 4x4 board keeps the one-off build short
+    task = Single_Task(x_limit=4, y_limit=4, tower_location=[[1, 1], [3, 1], [3, 3]], config_name=PHI_CONFIG, save_file_name='bench/v1_single_task')
+    task.set_mission(start_at=[0, 0], arrival_at=[3, 3], dv_required=[5, 5, 5])
+    env = Agent(task=task, time_scale=2, action_type='Discrete', max_episode_steps=100)
+    rng = np.random.default_rng(0)
+    actions = rng.integers(0, env.action_space.n, size=100)
+    state = {'t': 0}
+
+    def step():
+        if state['t'] % 100 == 0:
+            env.reset()
+        env.step(int(actions[state['t'] % 100]), type_reward='HER')
+        state['t'] += 1
+    results['v1_single_task_step'] = rate(step, number=50 if quick else 200, repeat=3)
+
+def bench_signal_map(results, quick):
+    from environments.v2.transmission_model import Phi_dif_Model
+    for num_towers in ([4] if quick else [4, 64]):
+        save_file = 'bench/signal_map_{}'.format(num_towers)
+        tower_location = towers(num_towers)
+        config = phi_config(num_towers)
+
+        def build():
+            if os.path.exists('cache/map/' + save_file):
+                os.remove('cache/map/' + save_file)
+            Phi_dif_Model(x_limit=10, y_limit=10, tower_position=tower_location, phi_config_file=config, save_file=save_file, rounding=1)
+        results['signal_map_build/towers_{}'.format(num_towers)] = seconds(build, repeat=1)
+
+        def load():
+            Phi_dif_Model(x_limit=10, y_limit=10, tower_position=tower_location, phi_config_file=config, save_file=save_file, rounding=1)
+        results['signal_map_load/towers_{}'.format(num_towers)] = seconds(load)
+
+        gc.collect()
+        tracemalloc.start()
+        model = Phi_dif_Model(x_limit=10, y_limit=10, tower_position=tower_location, phi_config_file=config, save_file=save_file, rounding=1)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results['signal_map_memory/towers_{}'.format(num_towers)] = {'value': current / 2**20, 'unit': 'MiB', 'higher_is_better': False, 'peak_mib': peak / 2**20}
+        results['signal_map_file/towers_{}'.format(num_towers)] = {'value': os.path.getsize(model.save_file) / 2**20, 'unit': 'MiB', 'higher_is_better': False}
+
+def bench_actions(results, quick):
+    from environments.v2 import controller
+    from environments.v1 import actions as v1_actions
+    rng = np.random.default_rng(0)
+    ma_continuous = controller.Actions['MA_Continuous'](max_speed=1)
+    raw = rng.random(6)
+    results['action_decode/v2_ma_continuous'] = rate(lambda: ma_continuous.get_action(raw), number=2000)
+    ma_discrete = controller.Actions['MA_Discrete'](max_speed=1, num_agents=3)
+    results['action_decode/v2_ma_discrete'] = rate(lambda: ma_discrete.get_action(77), number=2000)
+    continuous = v1_actions.Continuous()
+    results['action_decode/v1_continuous'] = rate(lambda: continuous.get_action(raw[:2]), number=2000)
+
+def bench_buffers(results, quick):
+    from trainerV3.MA_PPO.scripts.replaybuffer import ReplayBuffer
+    from trainerV2.DDQN_MA.scripts.HERBuffer import HindsightExperienceReplayMemory as DDQN_HER_Memory
+    from trainer.SAC.HERMemory import HindsightExperienceReplayMemory as SAC_HER_Memory
+    from trainer.DDPG_HER.HERBuffer import HindsightExperienceReplayMemory as DDPG_HER_Memory
+    rng = np.random.default_rng(0)
+    state_dim, batch_size = 10, 64
+
+    args = tools.dict2class({'batch_size': 2048, 'state_dim': state_dim, 'action_dim': 2, 'num_agents': 3})
+    ppo_buffer = ReplayBuffer(args)
+    s, a = rng.random(state_dim), rng.random(6)
+
+    def ppo_store():
+        if ppo_buffer.count == args.batch_size:
+            ppo_buffer.count = 0
+        ppo_buffer.store(s, a, a, 1.0, s, False, False)
+    results['buffer_store/ppo'] = rate(ppo_store, number=2048)
+    results['buffer_sample/ppo_numpy_to_tensor'] = rate(ppo_buffer.numpy_to_tensor, number=20)
+
+    memories = {'her_ddqn': (DDQN_HER_Memory(10**5, state_dim), 1),
+                'her_sac': (SAC_HER_Memory(10**5, state_dim, 2), rng.random(2)),
+                'her_ddpg': (DDPG_HER_Memory(10**5, state_dim, 2), rng.random(2))}
+    for name, (memory, action) in memories.items():
+        results['buffer_store/{}'.format(name)] = rate(lambda: memory.add_experience(s, action, -1.0, s, False, s), number=5000)
+        results['buffer_sample/{}'.format(name)] = rate(lambda: memory.get_random_experience(batch_size), number=200)
+
+def bench_ppo_update(results, quick):
+    from trainerV3.MA_PPO.scripts.ppo_continuous import PPO_continuous
+    from trainerV3.MA_PPO.scripts.replaybuffer import ReplayBuffer
+    args = tools.dict2class(tools.load_config('configs/config_ppo_ma.yaml'))
+    args.state_dim, args.action_dim, args.num_agents, args.max_action, args.device, args.delta = 10, 2, 3, 1.0, 'cpu', 1
+    torch.manual_seed(0)
+    agent = PPO_continuous(args, chkpt_dir=BENCH_DIR, train_adv=False)
+    replay_buffer = ReplayBuffer(args)
+    rng = np.random.default_rng(0)
+    for _ in range(args.batch_size):
+        s = rng.random(args.state_dim)
+        a, a_logprob = agent.choose_action(s)
+        replay_buffer.store(s, a, a_logprob, -1.0, s, False, False)
+    results['ppo_update/batch_{}'.format(args.batch_size)] = rate(lambda: agent.update(replay_buffer, 1), number=1, repeat=1 if quick else 3)
+
+def bench_ensemble(results, quick):
+    # seconds of one PPO_ensemble run over 1 and N seeds with the same env steps per seed; cost_vs_one_run is the
+    # N seed run over the 1 seed run, N when nothing is shared and 1 when every seed came for free
+    from environments import registry
+    from trainerV3.MA_PPO.scripts.PPO_ensemble_main import PPO_EnsembleAgent
+    spec = registry.Env_Spec(instance_name='bench_ensemble', tower_location=[[3, 1], [7, 1], [7, 5], [7, 7]], start_at=[[0, 1]],
+                             arrival_at=[[7, 9]], dv_required=[5, 6, 3, 3], action_type='BangSingular', signal_map=False)
+    num_seeds = 4 if quick else 8
+    timings = {}
+    for seeds in [[10], list(range(10, 10 + num_seeds))]:
+        args = tools.dict2class(tools.load_config('configs/config_ppo_ma.yaml'))
+        args.batch_size, args.mini_batch_size, args.K_epochs = 256, 64, 2
+        args.max_train_steps = args.evaluate_freq = 512 if quick else 2048
+        args.train_adv, args.delta, args.run_name, args.type_reward, args.device = False, 0, 'bench_ensemble', 'Lagrangian', 'cpu'
+        agent = PPO_EnsembleAgent(args=args, seeds=seeds, output_dir=BENCH_DIR + 'ensemble/')
+        timings[len(seeds)] = seconds(lambda: agent.train(registry.make(spec)), repeat=1)
+        results['ensemble/seeds_{}'.format(len(seeds))] = timings[len(seeds)]
+    results['ensemble/cost_vs_one_run/seeds_{}'.format(num_seeds)] = {'value': timings[num_seeds]['value'] / timings[1]['value'], 'unit': 'x',
+                                                                      'higher_is_better': False}
+
+# modules a short-lived evaluation or sweep worker starts from, and the heavy imports they should not pull in
+STARTUP_MODULES = ['utils.tools', 'environments.v2.game', 'trainerV2.DDQN_MA.scripts.HER_ddqn', 'trainerV3.MA_PPO.scripts.PPO_continuous_main']
+HEAVY_MODULES = ['matplotlib', 'pygame', 'tkinter', 'tensorboard', 'torch']
+
+def bench_startup(results, quick):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for module in STARTUP_MODULES:
+        code = 'import sys, json; sys.path.insert(0, {!r}); import {}; print(json.dumps([m for m in {!r} if m in sys.modules]))'.format(root, module, HEAVY_MODULES)
+        loaded = []
+
+        def start():
+            loaded[:] = json.loads(subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout.strip().splitlines()[-1])
+        # a fresh interpreter every time, its own start included
+        results['startup/{}'.format(module)] = dict(seconds(start, repeat=2 if quick else 5), loaded=loaded)
+
+def bench_eval_pool(results, quick):
+    from utils import eval_pool
+    start = time.perf_counter()
+    pool = eval_pool.Eval_Pool(workers=2)
+    results['eval_pool/start'] = {'value': time.perf_counter() - start, 'unit': 's', 'higher_is_better': False}
+    # fixed cost of a task on a warm worker, compare with a fresh interpreter in startup/*
+    results['eval_pool/task_round_trip'] = rate(lambda: pool.submit(None, fn=eval_pool.ping).result(), number=100 if quick else 500)
+    pool.close()
+
+BENCHMARKS = {'v2_board': bench_v2_board, 'rate_cutoff': bench_rate_cutoff, 'v1_task': bench_v1_task, 'signal_map': bench_signal_map, 'actions': bench_actions,
+              'buffers': bench_buffers, 'ppo_update': bench_ppo_update, 'ensemble': bench_ensemble, 'startup': bench_startup,
+              'eval_pool': bench_eval_pool}
+
+def machine_info():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ''
+    return {'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'commit': commit, 'python': platform.python_version(), 'numpy': np.__version__,
+            'torch': torch.__version__, 'machine': platform.machine(), 'processor': platform.processor(), 'cpus': os.cpu_count(),
+            'torch_threads': torch.get_num_threads()}
+
+def run(filter='', quick=False, threads=1):
+    torch.set_num_threads(threads)
+    results = {}
+    for name, bench in BENCHMARKS.items():
+        if filter and filter not in name:
+            continue
+        logger.info('benchmark {}'.format(name))
+        bench(results, quick)
+    return {'meta': dict(machine_info(), quick=quick), 'results': results}
+
+def compare(current, baseline, threshold=None):
+    # rows of (name, baseline, current, relative change, regression); change > 0 is always an improvement
+    if threshold is None:
+        threshold = QUICK_THRESHOLD if current['meta'].get('quick') or baseline['meta'].get('quick') else THRESHOLD
+    rows = []
+    for name, result in sorted(current['results'].items()):
+        if name not in baseline['results']:
+            continue
+        base = baseline['results'][name]['value']
+        value = result['value']
+        change = (value - base) / base if base else 0.0
+        if not result['higher_is_better']:
+            change = -change
+        rows.append((name, base, value, change, change < -threshold))
+    return rows
+
+def print_table(rows, current, baseline):
+    width = max([len(row[0]) for row in rows] + [10])
+    print('{:<{w}}  {:>14}  {:>14}  {:>8}'.format('benchmark', 'baseline', 'current', 'change', w=width))
+    for name, base, value, change, regression in rows:
+        print('{:<{w}}  {:>14.4g}  {:>14.4g}  {:>+7.1f}%{}'.format(name, base, value, 100 * change, '  REGRESSION' if regression else '', w=width))
+    print('baseline {} ({}), current {} ({})'.format(baseline['meta']['commit'], baseline['meta']['time'], current['meta']['commit'], current['meta']['time']))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='micro', description='environment, buffer and update micro-benchmarks')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    run_parser = subparsers.add_parser('run')
+    run_parser.add_argument('--filter', type=str, default='')
+    run_parser.add_argument('--quick', action='store_true')
+    run_parser.add_argument('--threads', type=int, default=1)
+    run_parser.add_argument('--output', type=str, default=None)
+    run_parser.add_argument('--save_baseline', action='store_true')
+    compare_parser = subparsers.add_parser('compare')
+    compare_parser.add_argument('current', type=str)
+    compare_parser.add_argument('--baseline', type=str, default=BASELINE_FILE)
+    compare_parser.add_argument('--threshold', type=float, default=None, help='default {}, {} when either side is a quick run'.format(THRESHOLD, QUICK_THRESHOLD))
+    parsed_args = parser.parse_args()
+    if parsed_args.command == 'run' and parsed_args.quick and parsed_args.save_baseline:
+        parser.error('a quick run can not be saved as the baseline')
+
+    if parsed_args.command == 'run':
+        report = run(filter=parsed_args.filter, quick=parsed_args.quick, threads=parsed_args.threads)
+        output = BASELINE_FILE if parsed_args.save_baseline else parsed_args.output or io.mkdir(BENCH_DIR) + 'micro_{}.json'.format(time.strftime('%b%d-%H_%M_%S'))
+        io.mkdir(os.path.dirname(output) or '.')
+        io.dump_json(output, report)
+        logger.success('{} results written to {}'.format(len(report['results']), output))
+        if not parsed_args.save_baseline and os.path.exists(BASELINE_FILE):
+            print_table(compare(report, io.load_json(BASELINE_FILE, default={})), report, io.load_json(BASELINE_FILE, default={}))
+    else:
+        current, baseline = io.load_json(parsed_args.current, default={}), io.load_json(parsed_args.baseline, default={})
+        rows = compare(current, baseline, parsed_args.threshold)
+        print_table(rows, current, baseline)
+        sys.exit(1 if any(row[4] for row in rows) else 0)
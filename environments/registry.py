@@ -0,0 +1,137 @@
+import json
+import importlib
+from collections.abc import Sequence
+
+'''
+    Lazy registry of environment instances.
+
+    spec = registry.Env_Spec(instance_name='config_5', tower_location=[[3, 1], [7, 1], [7, 5], [7, 7]],
+                             start_at=[[0, 1]], arrival_at=[[7, 9]], dv_required=[5, 6, 3, 3], action_type='MA_Continuous')
+    env = registry.make(spec)                               # built on the first request, the same object afterwards
+    env = registry.make('trainerV2.MA_PPO.data.ma_env_list:config_5')
+
+    An Env_Spec is the plain data of an instance (towers, starts, arrivals, dv_required, action type, motion args of
+    moving targets, board size, signal model and per-tower phi), nothing is built until make() asks for it. Built environments are
+    cached per process by the spec, so a module, a trainer and an evaluation asking for the same instance share one
+    game.Agent and one signal map. to_dict() / from_dict() round-trip a spec through json or pickle, a worker gets
+    the spec (or a 'module:instance_name' / 'module:index' reference into an env_list module) instead of the
+    environment and builds only what it uses.
+
+    The env_list modules of the trainers hold specs: Instance.environment and Env_List[i] build through make().
+'''
+
+PHI_CONFIG = 'configs/config_trans_model_2_D_4.yaml'
+
+class Env_Spec():
+    def __init__(self, instance_name, tower_location, start_at, arrival_at, dv_required, action_type='Discrete', motion=None,
+                 x_limit=10, y_limit=10, phi_config_file=PHI_CONFIG, save_file=None, control_time_scale=1, rounding=2,
+                 max_episode_steps=100, phi=None, signal_map=True, macro_hover=False, version='v2') -> None:
+        self.instance_name = instance_name
+        self.tower_location = tower_location
+        self.start_at = start_at
+        self.arrival_at = arrival_at
+        self.dv_required = dv_required
+        self.action_type = action_type
+        # moving targets: {'target_move_type': 'circular', 'radius': [...], 'w': [...], 'w_0': [...]} or
+        # {'target_move_type': 'linear', 'switch_time': ..., 'speed': ...} or {'target_move_type': 'directives', 'step_sizes': [...],
+        # 'directives': [['N', 'E'], ...], 'intervals': [[2, 3], ...]}, None for stationary towers
+        self.motion = motion
+        self.x_limit = x_limit
+        self.y_limit = y_limit
+        self.phi_config_file = phi_config_file
+        self.save_file = save_file if save_file is not None else instance_name
+        self.control_time_scale = control_time_scale
+        self.rounding = rounding
+        self.max_episode_steps = max_episode_steps
+        # per-tower phi (v2 only), the PHI_LIST of phi_config_file when None
+        self.phi = phi
+        # False: no precomputed signal map, rates computed per step (v2 only, cheap to build for large instance sets)
+        self.signal_map = signal_map
+        # True: an all-zero action runs as one game.Agent.hover() macro-step (v2 only)
+        self.macro_hover = macro_hover
+        self.version = version
+
+    def to_dict(self):
+        return dict(vars(self))
+
+    @staticmethod
+    def from_dict(values):
+        return Env_Spec(**values)
+
+    def key(self):
+        return json.dumps(self.to_dict(), sort_keys=True)
+
+    def build(self):
+        if self.version == 'v1':
+            from environments.v1.game import Agent
+            from environments.v1.tasks import Single_Task
+            task = Single_Task(x_limit=self.x_limit, y_limit=self.y_limit, tower_location=self.tower_location,
+                config_name=self.phi_config_file, save_file_name=self.save_file)
+            task.set_mission(start_at=self.start_at, arrival_at=self.arrival_at, dv_required=self.dv_required)
+            return Agent(task=task, max_episode_steps=self.max_episode_steps, time_scale=self.control_time_scale, action_type=self.action_type)
+
+        from environments.v2.game import Agent
+        motion = self.motion or {}
+        return Agent(x_limit=self.x_limit, y_limit=self.y_limit, start_at=self.start_at, arrival_at=self.arrival_at,
+            tower_location=self.tower_location, dv_required=self.dv_required, phi_config_file=self.phi_config_file,
+            save_file=self.save_file if self.signal_map else None, rounding=self.rounding, control_time_scale=self.control_time_scale, action_type=self.action_type,
+            moving_target=motion.get('target_move_type', 'stationary'), max_episode_steps=self.max_episode_steps, motion_args=motion,
+            phi_list=self.phi, macro_hover=self.macro_hover)
+
+    def __repr__(self):
+        return 'Env_Spec({})'.format(self.instance_name)
+
+_environments = {}
+
+def resolve(spec):
+    # Env_Spec, its dict, or 'module:instance_name' / 'module:index' of an env_list module
+    if isinstance(spec, Env_Spec):
+        return spec
+    if isinstance(spec, dict):
+        return Env_Spec.from_dict(spec)
+    module_name, name = spec.split(':')
+    env_list = importlib.import_module(module_name).env_list
+    # a list of Instance, or an Instances object of missions with an Env_List
+    env_list = getattr(env_list, 'environment_list', env_list)
+    specs = env_list.specs if isinstance(env_list, Env_List) else [instance.spec for instance in env_list]
+    if name.isdigit():
+        return specs[int(name)]
+    return [s for s in specs if s.instance_name == name][0]
+
+def make(spec, cached=True):
+    spec = resolve(spec)
+    if not cached:
+        return spec.build()
+    key = spec.key()
+    if key not in _environments:
+        _environments[key] = spec.build()
+    return _environments[key]
+
+def built():
+    return len(_environments)
+
+class Instance():
+    # one named instance of an env_list module, built on first use of .environment
+    def __init__(self, spec) -> None:
+        self.spec = spec
+        self.instance_name = spec.instance_name
+
+    @property
+    def environment(self):
+        return make(self.spec)
+
+class Env_List(Sequence):
+    # the environment_list of a batch of missions, env_list[i] builds mission i on first use
+    def __init__(self, specs=()) -> None:
+        self.specs = list(specs)
+
+    def append(self, spec):
+        self.specs.append(spec)
+
+    def __len__(self):
+        return len(self.specs)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [make(spec) for spec in self.specs[index]]
+        return make(self.specs[index])
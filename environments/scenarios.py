@@ -0,0 +1,204 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.dirname(__file__) + '/..'))
+import json
+import argparse
+import numpy as np
+from loguru import logger
+
+'''
+    Procedural scenario sets for multi-instance training and evaluation at scale.
+
+    python environments/scenarios.py generate --config configs/config_scenarios.yaml --num 5000 --output cache/scenarios/train.scn
+    python environments/scenarios.py info cache/scenarios/train.scn
+
+    reader = scenarios.Scenario_Reader('cache/scenarios/train.scn')
+    for batch in reader.batches(batch_size=256, shuffle=True, seed=0):
+        batch['tower_location'][:, :, 0]        # (256, max_towers) x of every tower, padded past batch['num_towers']
+    spec = reader.spec(17)                      # one instance as a registry.Env_Spec, for the single-instance trainers
+
+    generate() samples every instance from the distribution of configs/config_scenarios.yaml: board size, towers
+    at least MIN_TOWER_DISTANCE apart, a phi and a dv_required per tower, agents with their starts and arrivals, and
+    stationary, circular or linear target motion with its args. The set is stored column by column in one file: a
+    json header (number of instances, dtype / shape / offset of every column, the distribution it was sampled
+    from) followed by the raw columns. Columns with one entry per tower or per agent are padded to the largest
+    count of the set and come with 'tower_mask' / 'agent_mask' in every batch. Scenario_Reader memory-maps the
+    columns, so opening a set of any size reads only its header, and a batch is a dict of numpy arrays sliced
+    from the columns, no per-instance python object is made.
+'''
+
+MAGIC = b'SCENARIOS\n'
+ALIGNMENT = 64
+MOTION_TYPES = ['stationary', 'circular', 'linear']
+
+def as_list(values):
+    # float32 columns back to the short decimals they were sampled with
+    return np.round(np.asarray(values, dtype=np.float64), 6).tolist()
+
+def uniform(rng, bounds, size=None):
+    return rng.uniform(bounds[0], bounds[1], size=size)
+
+def integers(rng, bounds, size=None):
+    return rng.integers(bounds[0], bounds[1] + 1, size=size)
+
+def sample_points(rng, count, x_limit, y_limit, rounding, min_distance=0, tries=100):
+    # positions inside [0, limit - 1]; with min_distance, rejection sampling that gives up on the distance after 'tries'
+    points = []
+    for _ in range(count):
+        for _ in range(tries):
+            point = np.round([rng.uniform(0, x_limit - 1), rng.uniform(0, y_limit - 1)], rounding)
+            if all(np.linalg.norm(point - other) >= min_distance for other in points):
+                break
+        points.append(point)
+    return np.array(points)
+
+def generate(config, num_instances=None, seed=None):
+    # {column: array} of a scenario set sampled from 'config' (configs/config_scenarios.yaml)
+    n = num_instances or config['NUM_INSTANCES']
+    rng = np.random.default_rng(config['SEED'] if seed is None else seed)
+    max_towers = config['NUM_TOWERS'][1]
+    max_agents = config['NUM_AGENTS'][1]
+    columns = {
+        'x_limit': integers(rng, config['X_LIMIT'], n).astype(np.int32),
+        'y_limit': integers(rng, config['Y_LIMIT'], n).astype(np.int32),
+        'num_towers': integers(rng, config['NUM_TOWERS'], n).astype(np.int32),
+        'num_agents': integers(rng, config['NUM_AGENTS'], n).astype(np.int32),
+        'tower_location': np.zeros((n, max_towers, 2), dtype=np.float32),
+        'phi': np.zeros((n, max_towers), dtype=np.float32),
+        'dv_required': np.zeros((n, max_towers), dtype=np.float32),
+        'start_at': np.zeros((n, max_agents, 2), dtype=np.float32),
+        'arrival_at': np.zeros((n, max_agents, 2), dtype=np.float32),
+        'motion': rng.choice(len(MOTION_TYPES), size=n, p=[config['MOTION'].get(name, 0) for name in MOTION_TYPES]).astype(np.int8),
+        'radius': np.zeros((n, max_towers), dtype=np.float32),
+        'w': np.zeros((n, max_towers), dtype=np.float32),
+        'w_0': np.zeros((n, max_towers), dtype=np.float32),
+        'switch_time': np.zeros(n, dtype=np.float32),
+        'speed': np.zeros((n, max_towers, 2), dtype=np.float32),
+    }
+    for i in range(n):
+        towers, agents = columns['num_towers'][i], columns['num_agents'][i]
+        x_limit, y_limit = columns['x_limit'][i], columns['y_limit'][i]
+        columns['tower_location'][i, :towers] = sample_points(rng, towers, x_limit, y_limit, config['ROUNDING'], config['MIN_TOWER_DISTANCE'])
+        columns['phi'][i, :towers] = np.round(uniform(rng, config['PHI'], towers), 1)
+        columns['dv_required'][i, :towers] = np.round(uniform(rng, config['DV_REQUIRED'], towers), 1)
+        columns['start_at'][i, :agents] = sample_points(rng, agents, x_limit, y_limit, config['ROUNDING'])
+        columns['arrival_at'][i, :agents] = sample_points(rng, agents, x_limit, y_limit, config['ROUNDING'])
+        if MOTION_TYPES[columns['motion'][i]] == 'circular':
+            columns['radius'][i, :towers] = uniform(rng, config['RADIUS'], towers)
+            columns['w'][i, :towers] = uniform(rng, config['W'], towers) * rng.choice([-1, 1], towers)
+            columns['w_0'][i, :towers] = rng.uniform(0, 2 * np.pi, towers)
+        elif MOTION_TYPES[columns['motion'][i]] == 'linear':
+            angle = rng.uniform(0, 2 * np.pi, towers)
+            columns['speed'][i, :towers] = uniform(rng, config['SPEED'], towers)[:, None] * np.stack([np.cos(angle), np.sin(angle)], axis=1)
+            columns['switch_time'][i] = uniform(rng, config['SWITCH_TIME'])
+    return columns
+
+def write(file, columns, distribution=None):
+    n = len(next(iter(columns.values())))
+    header = {'num_instances': n, 'distribution': distribution or {}, 'columns': {}}
+    offset = 0
+    for name, values in columns.items():
+        header['columns'][name] = {'dtype': values.dtype.str, 'shape': list(values.shape), 'offset': offset}
+        offset += -(-values.nbytes // ALIGNMENT) * ALIGNMENT
+    encoded = json.dumps(header).encode()
+    data_start = -(-(len(MAGIC) + 8 + len(encoded)) // ALIGNMENT) * ALIGNMENT
+    with open(file + '.tmp', 'wb') as f:
+        f.write(MAGIC)
+        f.write(len(encoded).to_bytes(8, 'little'))
+        f.write(encoded)
+        for name, values in columns.items():
+            f.seek(data_start + header['columns'][name]['offset'])
+            f.write(np.ascontiguousarray(values).tobytes())
+        f.truncate(data_start + offset)
+    os.replace(file + '.tmp', file)
+
+def read_header(file):
+    with open(file, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError('{} is not a scenario file'.format(file))
+        length = int.from_bytes(f.read(8), 'little')
+        header = json.loads(f.read(length))
+    header['data_start'] = -(-(len(MAGIC) + 8 + length) // ALIGNMENT) * ALIGNMENT
+    return header
+
+class Scenario_Reader():
+    def __init__(self, file) -> None:
+        self.file = file
+        self.header = read_header(file)
+        self.num_instances = self.header['num_instances']
+        self.distribution = self.header['distribution']
+        self.columns = {}
+        for name, column in self.header['columns'].items():
+            # read-only views of the file, pages are read on first access
+            self.columns[name] = np.memmap(file, dtype=np.dtype(column['dtype']), mode='r',
+                                           offset=self.header['data_start'] + column['offset'], shape=tuple(column['shape']))
+        self.max_towers = self.columns['tower_location'].shape[1]
+        self.max_agents = self.columns['start_at'].shape[1]
+
+    def __len__(self):
+        return self.num_instances
+
+    def batch(self, index):
+        # index: slice or sorted array of instances; a dict of in-memory arrays plus the padding masks
+        batch = {name: np.array(values[index]) for name, values in self.columns.items()}
+        batch['index'] = np.arange(self.num_instances)[index]
+        batch['tower_mask'] = np.arange(self.max_towers) < batch['num_towers'][:, None]
+        batch['agent_mask'] = np.arange(self.max_agents) < batch['num_agents'][:, None]
+        return batch
+
+    def batches(self, batch_size, shuffle=False, seed=None, drop_last=False):
+        order = np.random.default_rng(seed).permutation(self.num_instances) if shuffle else None
+        for start in range(0, self.num_instances, batch_size):
+            stop = min(start + batch_size, self.num_instances)
+            if drop_last and stop - start < batch_size:
+                break
+            yield self.batch(slice(start, stop) if order is None else np.sort(order[start:stop]))
+
+    def spec(self, i, action_type=None, max_episode_steps=None, phi_config_file=None, save_file=None, signal_map=True):
+        # instance i as an Env_Spec of environments/registry.py; its signal map is cached under <file name>_<i>,
+        # signal_map=False computes the rates per step instead of building a map for every instance
+        from environments import registry
+        towers, agents = int(self.columns['num_towers'][i]), int(self.columns['num_agents'][i])
+        motion_type = MOTION_TYPES[int(self.columns['motion'][i])]
+        motion = None
+        if motion_type == 'circular':
+            motion = {'target_move_type': 'circular', 'radius': as_list(self.columns['radius'][i, :towers]),
+                      'w': as_list(self.columns['w'][i, :towers]), 'w_0': as_list(self.columns['w_0'][i, :towers])}
+        elif motion_type == 'linear':
+            motion = {'target_move_type': 'linear', 'switch_time': as_list(self.columns['switch_time'][i]),
+                      'speed': as_list(self.columns['speed'][i, :towers])}
+        name = os.path.splitext(os.path.basename(self.file))[0]
+        return registry.Env_Spec(instance_name='{}_{}'.format(name, i), tower_location=as_list(self.columns['tower_location'][i, :towers]),
+            start_at=as_list(self.columns['start_at'][i, :agents]), arrival_at=as_list(self.columns['arrival_at'][i, :agents]),
+            dv_required=as_list(self.columns['dv_required'][i, :towers]), phi=as_list(self.columns['phi'][i, :towers]),
+            action_type=action_type or self.distribution.get('ACTION_TYPE', 'MA_Continuous'), motion=motion,
+            x_limit=int(self.columns['x_limit'][i]), y_limit=int(self.columns['y_limit'][i]),
+            phi_config_file=phi_config_file or self.distribution.get('PHI_CONFIG', registry.PHI_CONFIG), save_file=save_file, signal_map=signal_map,
+            max_episode_steps=max_episode_steps or self.distribution.get('MAX_EPISODE_STEPS', 100))
+
+    def summary(self):
+        counts = np.bincount(self.columns['motion'], minlength=len(MOTION_TYPES))
+        return {'instances': self.num_instances, 'max_towers': self.max_towers, 'max_agents': self.max_agents,
+                'towers': np.bincount(self.columns['num_towers']).tolist(), 'agents': np.bincount(self.columns['num_agents']).tolist(),
+                'motion': {name: int(count) for name, count in zip(MOTION_TYPES, counts)},
+                'mb': os.path.getsize(self.file) / 2**20}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='scenarios', description='procedural scenario sets')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    generate_parser = subparsers.add_parser('generate')
+    generate_parser.add_argument('--config', type=str, default='configs/config_scenarios.yaml')
+    generate_parser.add_argument('--num', type=int, default=None)
+    generate_parser.add_argument('--seed', type=int, default=None)
+    generate_parser.add_argument('--output', type=str, default='cache/scenarios/scenarios.scn')
+    info_parser = subparsers.add_parser('info')
+    info_parser.add_argument('file', type=str)
+    parsed_args = parser.parse_args()
+
+    if parsed_args.command == 'generate':
+        from utils import tools, io
+        config = tools.load_config(parsed_args.config)
+        columns = generate(config, num_instances=parsed_args.num, seed=parsed_args.seed)
+        io.mkdir(os.path.dirname(parsed_args.output) or '.')
+        write(parsed_args.output, columns, distribution=config)
+        logger.success('{} instances written to {}'.format(len(columns['x_limit']), parsed_args.output))
+    print(json.dumps(Scenario_Reader(parsed_args.output if parsed_args.command == 'generate' else parsed_args.file).summary(), indent=2))
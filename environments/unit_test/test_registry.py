@@ -0,0 +1,34 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.dirname(__file__) + '/../..'))
+from environments import registry
+
+def spec(name='test_registry'):
+    # no signal map, nothing is written to cache/map
+    return registry.Env_Spec(instance_name=name, tower_location=[[3, 1], [7, 5]], start_at=[[0, 1]], arrival_at=[[7, 9]],
+                             dv_required=[5, 3], action_type='MA_Continuous', signal_map=False)
+
+def test_resolve():
+    original = spec()
+    assert registry.resolve(original) is original
+    from_dict = registry.resolve(original.to_dict())
+    assert isinstance(from_dict, registry.Env_Spec) and from_dict.key() == original.key()
+    by_name = registry.resolve('trainerV3.MA_PPO.data.ma_env_list:config_5')
+    by_index = registry.resolve('trainerV3.MA_PPO.data.ma_env_list:0')
+    assert by_name.instance_name == 'config_5' and by_index.key() == by_name.key()
+
+def test_make_caches_by_spec():
+    built = registry.built()
+    env = registry.make(spec())
+    # the same instance through another spec object or its dict is the same environment
+    assert registry.make(spec()) is env
+    assert registry.make(spec().to_dict()) is env
+    assert registry.built() == built + 1
+    # another instance, or cached=False, builds a new one
+    assert registry.make(spec('test_registry_other')) is not env
+    assert registry.make(spec(), cached=False) is not env
+    assert registry.built() == built + 2
+
+if __name__ == '__main__':
+    test_resolve()
+    test_make_caches_by_spec()
+    print('registry resolve / make pass')
@@ -0,0 +1,49 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.dirname(__file__) + '/../..'))
+import tempfile
+import numpy as np
+from environments import scenarios
+from utils import tools
+
+def scenario_set(num_instances=25):
+    config = tools.load_config('configs/config_scenarios.yaml')
+    columns = scenarios.generate(config, num_instances=num_instances, seed=1)
+    file = tempfile.mkdtemp() + '/test.scn'
+    scenarios.write(file, columns, distribution=config)
+    return columns, file, config
+
+def test_write_read_lossless():
+    columns, file, config = scenario_set()
+    reader = scenarios.Scenario_Reader(file)
+    assert len(reader) == 25 and reader.distribution == config
+    assert sorted(reader.columns) == sorted(columns)
+    for name, values in columns.items():
+        assert reader.columns[name].dtype == values.dtype and np.array_equal(reader.columns[name], values)
+
+def test_batches_cover_the_set():
+    columns, file, _ = scenario_set()
+    reader = scenarios.Scenario_Reader(file)
+    for shuffle in [False, True]:
+        batches = list(reader.batches(batch_size=8, shuffle=shuffle, seed=0))
+        index = np.concatenate([batch['index'] for batch in batches])
+        assert sorted(index.tolist()) == list(range(25))
+        for batch in batches:
+            assert np.array_equal(batch['tower_location'], columns['tower_location'][batch['index']])
+            assert np.array_equal(batch['tower_mask'].sum(1), batch['num_towers'])
+
+def test_spec_matches_columns():
+    columns, file, _ = scenario_set()
+    reader = scenarios.Scenario_Reader(file)
+    for i in range(len(reader)):
+        spec = reader.spec(i, signal_map=False)
+        towers, agents = columns['num_towers'][i], columns['num_agents'][i]
+        assert np.allclose(spec.tower_location, columns['tower_location'][i, :towers])
+        assert np.allclose(spec.start_at, columns['start_at'][i, :agents])
+        assert np.allclose(spec.dv_required, columns['dv_required'][i, :towers])
+        assert (spec.motion or {}).get('target_move_type', 'stationary') == scenarios.MOTION_TYPES[columns['motion'][i]]
+
+if __name__ == '__main__':
+    test_write_read_lossless()
+    test_batches_cover_the_set()
+    test_spec_matches_columns()
+    print('scenario file round trips pass')
@@ -0,0 +1,45 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.dirname(__file__) + '/../..'))
+import tempfile
+import numpy as np
+from environments import scenarios, vector
+from utils import tools
+
+class args:
+    type_reward = 'Lagrangian'
+
+def vector_env(num_instances=3, num_envs=5):
+    config = tools.load_config('configs/config_scenarios.yaml')
+    file = tempfile.mkdtemp() + '/vector.scn'
+    scenarios.write(file, scenarios.generate(config, num_instances=num_instances, seed=2), distribution=config)
+    reader = scenarios.Scenario_Reader(file)
+    specs = [reader.spec(i, action_type='BangSingular', max_episode_steps=10, signal_map=False) for i in range(len(reader))]
+    return vector.Vector_Env(specs, num_envs=num_envs, seed=0)
+
+def test_slots_never_share_an_env():
+    venv = vector_env()
+    s, masks = venv.reset()
+    assert s.shape == (venv.num_envs, venv.observation_dim) and masks.shape == (venv.num_envs, venv.mask_dim)
+    rng = np.random.default_rng(0)
+    for _ in range(60):
+        _, _, _, done = venv.step(rng.uniform(-1, 1, size=(venv.num_envs, 2 * venv.max_agents)), args)
+        if done.any():
+            _, masks = venv.reset_done(done)
+        assert len(set(map(id, venv.envs))) == venv.num_envs
+        for slot, env in enumerate(venv.envs):
+            assert masks[slot, :venv.max_agents].sum() == env.board.agents.num_agents
+            assert masks[slot, venv.max_agents:].sum() == env.board.num_towers
+    # released copies are reused, at most one per slot holding an instance at the same time
+    copies = venv.envs + [env for free in venv.free.values() for env in free]
+    assert len(copies) <= venv.num_envs * len(venv.specs)
+    assert len(venv.pop_episodes()) > 0 and venv.pop_episodes() == []
+
+def test_run_episodes_covers_every_instance():
+    venv = vector_env(num_instances=3, num_envs=2)
+    results = venv.run_episodes(lambda s, masks: np.zeros((venv.num_envs, 2 * venv.max_agents)), args)
+    assert sorted(result['instance'] for result in results) == [0, 1, 2]
+
+if __name__ == '__main__':
+    test_slots_never_share_an_env()
+    test_run_episodes_covers_every_instance()
+    print('vector env passes')
@@ -1,4 +1,3 @@
-from tkinter import N
 import numpy as np
 import math
 
@@ -36,6 +35,8 @@ class Continuous():
         self.high = 1
         self.max_speed = 1
         self.max_angle = 360
+        # a move of up to max_speed takes one unit of time
+        self.time_scale = 1
 
     def get_action(self, action):
         r = action[0] * self.max_speed
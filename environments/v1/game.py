@@ -1,4 +1,3 @@
-from tkinter import N
 import numpy as np
 import random
 from utils.buffer import Info
@@ -1,5 +1,4 @@
-from environments.v1.game import Agent
-from environments.v1.tasks import Single_Task
+from environments import registry
 
 '''
     Easy Task to Show Convergence
@@ -15,16 +14,13 @@ class Instances:
         self.time_scale = 1
         self.max_episode_steps = 200
         print('using {}'.format(self.instance_name))
-        self.environment_list = []
+        self.environment_list = registry.Env_List()
 
     def add_mission(self, start_at, arrival_at, dv_required):
         print('adding {}'.format(self.instance_name))
-        task = Single_Task(x_limit=self.x_limit, y_limit=self.y_limit, tower_location=self.tower_location, 
-            config_name=self.phi_model_name, save_file_name=self.instance_name)
-        task.set_mission(start_at=start_at, arrival_at=arrival_at, dv_required=dv_required)
-        environment = Agent(task=task, max_episode_steps=self.max_episode_steps, time_scale=self.time_scale)
-
-        self.environment_list.append(environment)
+        self.environment_list.append(registry.Env_Spec(instance_name=self.instance_name, tower_location=self.tower_location, start_at=start_at, \
+            arrival_at=arrival_at, dv_required=dv_required, x_limit=self.x_limit, y_limit=self.y_limit, phi_config_file=self.phi_model_name, \
+            save_file=self.instance_name, control_time_scale=self.time_scale, max_episode_steps=self.max_episode_steps, version='v1'))
 
     def get_mission(self, index):
         return self.environment_list[index]
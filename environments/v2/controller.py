@@ -1,5 +1,7 @@
 import numpy as np
 import math
+import json
+from collections import OrderedDict
 
 class Obstacles_Avoidance():
     def __init__(self, x_limit, y_limit) -> None:
@@ -11,6 +13,56 @@ class Obstacles_Avoidance():
         self.board_info[0, :] = np.ones(x_limit)
         self.board_info[0, y_limit-1] = np.ones(x_limit)
 
+# compiled schedules, least recently used first; Targets hold on to their own, an evicted one is compiled again on
+# the next reset of a board with that motion
+MAX_SCHEDULES = 128
+_schedules = OrderedDict()
+
+class Motion_Schedule():
+    '''
+        Tower locations of a target motion at every substep of an episode, compiled once at reset: position(k) is
+        the location k substeps (update(time_scale) calls) after the reset, one array lookup. Schedules are cached per
+        motion (its key(): type, start and args) and substep time, so the slots of a vector env and the clones of an
+        environment with the same motion share one read-only table; at most MAX_SCHEDULES are kept. A table covers the
+        episode horizon and is compiled again for twice the length when an episode runs past it.
+    '''
+    def __init__(self, movement, time_scale, num_substeps) -> None:
+        self.movement = movement
+        self.time_scale = time_scale
+        self.table = movement.schedule(num_substeps, time_scale)
+        self.table.flags.writeable = False
+
+    @staticmethod
+    def compile(movement, time_scale, num_substeps):
+        key = (movement.key(), time_scale)
+        schedule = _schedules.get(key)
+        if schedule is None or len(schedule.table) <= num_substeps:
+            schedule = Motion_Schedule(movement, time_scale, num_substeps)
+            _schedules[key] = schedule
+        _schedules.move_to_end(key)
+        while len(_schedules) > MAX_SCHEDULES:
+            _schedules.popitem(last=False)
+        return schedule
+
+    def position(self, k):
+        if k >= len(self.table):
+            self.table = Motion_Schedule.compile(self.movement, self.time_scale, 2 * k).table
+        return self.table[k]
+
+    def __deepcopy__(self, memo):
+        # read only, copies of an environment keep the same table
+        return self
+
+def simulate(movement, num_substeps, time_scale):
+    # locations after 0 .. num_substeps updates of 'movement', the schedule of motions without a closed form
+    movement.reset()
+    table = [np.array(movement.locations, dtype=np.float64)]
+    for _ in range(num_substeps):
+        movement.update(time_scale)
+        table.append(np.array(movement.locations, dtype=np.float64))
+    movement.reset()
+    return np.array(table)
+
 class Target_Move_Circular():
     def __init__(self, centers, radius, w, w_0) -> None:
         self.centers = centers
@@ -34,48 +86,81 @@ class Target_Move_Circular():
         delta = np.transpose([d_x, d_y])
         self.locations = np.array(self.centers) + delta
 
+    def key(self):
+        return json.dumps(['circular', np.asarray(self.centers).tolist(), self.radius.tolist(), self.w.tolist(), self.w_0.tolist()])
+
+    def schedule(self, num_substeps, time_scale):
+        # set_position for all substeps at once, T summed like update() does
+        T = np.concatenate([[0.0], np.cumsum(np.full(num_substeps, time_scale))])[:, None]
+        d_y = self.radius*np.cos(self.w*T + self.w_0)
+        d_x = self.radius*np.sin(self.w*T + self.w_0)
+        return np.array(self.centers) + np.stack([d_x, d_y], axis=-1)
+
 class Target_Move_Linear():
     def __init__(self, start_at, switch_time, speed) -> None:
         self.start_at = start_at
-        self.speed = speed
+        self.speed = np.array(speed)
 
         self.location = np.array(start_at)
         self.switch_time = np.array(switch_time)
         self.current_speed = np.array(speed)
         self.T = 0
+        # Targets reads 'locations' like Target_Move_Circular
+        self.locations = self.location
 
     def update(self, time_scale):
         self.T += time_scale
         if self.T > self.switch_time:
             self.T = 0
             self.current_speed = - self.current_speed
-        self.location = self.location + time_scale * self.speed
+        self.location = self.location + time_scale * self.current_speed
+        self.locations = self.location
 
     def reset(self):
         self.T = 0
         self.current_speed = np.array(self.speed)
         self.location = np.array(self.start_at)
+        self.locations = self.location
 
     def set_position(self):
         self.location = self.T * self.speed + self.start_at
 
+    def key(self):
+        return json.dumps(['linear', np.asarray(self.start_at).tolist(), self.switch_time.tolist(), self.speed.tolist()])
+
+    def schedule(self, num_substeps, time_scale):
+        return simulate(self, num_substeps, time_scale)
+
 class Target_Controller():
-    def __init__(self, step_sizes, directives, intervals) -> None:
-        self.step_sizes = step_sizes
+    # piecewise motion: tower i moves along directives[i] ('N', 'W', 'E', 'S', or 'H' to hold), each for the time
+    # of the matching intervals[i] entry, at step_sizes[i] per time unit; the list starts over once it is through
+    def __init__(self, start_at, step_sizes, directives, intervals) -> None:
+        self.start_at = start_at
+        self.step_sizes = np.array(step_sizes, dtype=np.float64)
         self.directives = directives
         self.intervals = intervals
-        self.time = 0
+        self.ends = [np.cumsum(interval) for interval in intervals]
+        self.reset()
 
-    def update(self, tower_location):
-        location = np.zeros_like(tower_location)
-        for i in range(len(tower_location)):
-            tower = tower_location[i]
-            directive = self.directives[i]
-            directive_index = 1
-        self.time += 1
+    def update(self, time_scale):
+        velocity = np.zeros_like(self.locations)
+        for i in range(len(self.locations)):
+            # rounded, a sum of substep times lands just short of the interval ends
+            t = round(self.time, 9) % self.ends[i][-1]
+            directive = self.directives[i][int(np.searchsorted(self.ends[i], t, side='right'))]
+            velocity[i] = self.step_sizes[i] * self.lookup(directive)
+        self.time += time_scale
+        self.locations = self.locations + time_scale * velocity
 
     def reset(self):
         self.time = 0
+        self.locations = np.array(self.start_at, dtype=np.float64)
+
+    def key(self):
+        return json.dumps(['directives', np.asarray(self.start_at).tolist(), self.step_sizes.tolist(), self.directives, [np.asarray(interval).tolist() for interval in self.intervals]])
+
+    def schedule(self, num_substeps, time_scale):
+        return simulate(self, num_substeps, time_scale)
 
     def lookup(self, direction):
         if direction == 'N':
@@ -86,6 +171,8 @@ class Target_Controller():
             return np.array([1, 0])
         elif direction == 'S':
             return np.array([0, -1])
+        elif direction == 'H':
+            return np.array([0, 0])
 
 class Agent_Controller():
     def __init__(self, time_scale) -> None:
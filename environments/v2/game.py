@@ -1,6 +1,7 @@
 import numpy as np
 import math
 import random
+import copy
 from environments.v2 import models
 from environments.v2 import controller
 from utils.buffer import Info
@@ -8,13 +9,12 @@ from numpy import linalg as LNG
 from utils.tools import Timer
 from utils import io
 from loguru import logger
-import pygame
 
 timer = Timer()
 # NOTE: Discrete Position; Single Agent
 class Agent():
     def __init__(self, x_limit, y_limit, start_at, arrival_at, tower_location, dv_required, phi_config_file, save_file, rounding = 2, control_time_scale = 2,
-        action_type = 'Discrete', moving_target = 'stationary', max_episode_steps = 100):
+        action_type = 'Discrete', moving_target = 'stationary', max_episode_steps = 100, motion_args = None, phi_list = None, macro_hover = False):
         self.args = {}
         self.args['max_episode_steps'] = max_episode_steps
         self.args['x_limit'] = x_limit
@@ -29,6 +29,9 @@ class Agent():
         self.args['control_time_scale'] = control_time_scale
         self.args['action_type'] = action_type
         self.args['target_move_type'] = moving_target
+        self.args['phi_list'] = phi_list
+        # radius / w / w_0 of circular, switch_time / speed of linear or step_sizes / directives / intervals of directives target movement
+        self.args.update(motion_args or {})
 
         # self.reward_func = self.test_reward_function
         self._max_episode_steps = max_episode_steps
@@ -53,6 +56,8 @@ class Agent():
         
         self.reward = 0
         self.num_steps = 0
+        # an all-zero action (every agent stops) is run as one hover() macro-step
+        self.macro_hover = macro_hover
 
         self.window = None
         self.clock = None
@@ -75,6 +80,7 @@ class Agent():
 
     def close(self):
         if self.window is not None:
+            import pygame
             pygame.display.quit()
             pygame.quit()
 
@@ -82,7 +88,11 @@ class Agent():
         if verbose > 0:
             logger.debug('angular representation: {}'.format(action))
         action = self.action_space.get_action(action)
+        if self.macro_hover and not np.any(action) and not self.board.targets.is_moving:
+            return self.hover(args)
+        return self.transition(action, args)
 
+    def transition(self, action, args):
         self.num_steps += 1
 
         data_volume_collected, data_transmitting_rate_list, data_volume_left = self.board.update_agents(joint_actions=action)
@@ -93,6 +103,44 @@ class Agent():
                                     data_collected_t=data_volume_collected, 
                                     data_left_t=data_volume_left, data_collect_rate_t = data_transmitting_rate_list)
 
+        reward, done = self.get_reward(args, data_volume_left)
+        return self.end_step(reward, done, position)
+
+    def hover(self, args, max_steps=None):
+        # macro-step: every agent stays where it is until the first tower it drains is done (or the episode / max_steps
+        # runs out). The rates of a hovering agent under stationary towers are the same every step, so the steps
+        # before the last one only add them to the dv state, no substeps and no rate computation; the last step is a
+        # regular one (terminal reward, arrival penalties). Returns the reward summed over the steps taken, the
+        # number of steps is the change of num_steps.
+        stay = [[0.0, 0.0] for _ in range(self.board.agents.num_agents)]
+        if self.board.targets.is_moving:
+            return self.transition(stay, args)
+        rate = self.board.get_hover_rate()
+        dv_left = np.array(self.board.targets.dv_left)
+        draining = (rate > 0) & (dv_left > 0)
+        steps = self._max_episode_steps - self.num_steps
+        if draining.any():
+            steps = min(steps, int(np.ceil((dv_left[draining] / rate[draining]).min())))
+        if max_steps is not None:
+            steps = min(steps, max_steps)
+
+        total_reward = 0
+        position = self.board.get_all_agents_position().tolist()
+        for _ in range(max(steps, 1) - 1):
+            self.num_steps += 1
+            data_volume_collected, data_transmitting_rate_list, data_volume_left = self.board.targets.update_dv_state(rate)
+            self.running_info.store(position_t=position[:], action_t=stay, data_collected_t=data_volume_collected,
+                                    data_left_t=data_volume_left, data_collect_rate_t=data_transmitting_rate_list)
+            reward, done = self.get_reward(args, data_volume_left)
+            if done:
+                s, reward, done, position = self.end_step(reward, done, position)
+                return s, total_reward + reward, done, position
+            self.reward += reward
+            total_reward += reward
+        s, reward, done, position = self.transition(stay, args)
+        return s, total_reward + reward, done, position
+
+    def get_reward(self, args, data_volume_left):
         done = False 
 
         if args.type_reward == 'HER':
@@ -166,7 +214,9 @@ class Agent():
         else:
             logger.critical('Invalid Reward Type')
 
+        return reward, done
 
+    def end_step(self, reward, done, position):
         if done:
             # self.num_steps += np.linalg.norm(np.array(self.board.get_agent_position(0)) - np.array(self.board.get_agent_goal(0)))
             self.num_steps += np.linalg.norm(abs(self.board.get_all_agents_position() - self.board.get_all_agents_goal()), axis=1).sum()
@@ -181,6 +231,34 @@ class Agent():
     def get_state(self):
         return self.board.get_state()
 
+    def get_snapshot(self):
+        # the episode state as one record of models.snapshot_dtype: agents, targets and the phase of their motion, dv,
+        # step count, reward and the numpy RNG. restore() writes it back into this environment (or a clone of it)
+        snapshot = np.zeros((), dtype=self.board.snapshot_dtype)
+        self.board.get_snapshot(snapshot)
+        snapshot['num_steps'] = self.num_steps
+        snapshot['reward'] = self.reward
+        snapshot['reward_per_agent'] = np.ndim(self.reward) > 0
+        snapshot['timestamp'] = self.running_info.timestamp
+        _, snapshot['rng_key'], snapshot['rng_pos'], snapshot['rng_has_gauss'], snapshot['rng_gauss'] = np.random.get_state()
+        return snapshot
+
+    def restore(self, snapshot, rng=True):
+        # O(state): nothing is rebuilt. The trajectory log (running_info) is cut back to the snapshot step, so it
+        # stays right when branching from an earlier state of the current episode
+        self.board.restore(snapshot)
+        self.num_steps = snapshot['num_steps'].item()
+        self.reward = np.array(snapshot['reward']) if snapshot['reward_per_agent'] else snapshot['reward'][0].item()
+        self.running_info.truncate(snapshot['timestamp'])
+        if rng:
+            np.random.set_state(('MT19937', snapshot['rng_key'], int(snapshot['rng_pos']), int(snapshot['rng_has_gauss']), float(snapshot['rng_gauss'])))
+        return self.board.get_state()
+
+    def clone(self):
+        # NOTE: the signal map is read only, copies share the transmitting model instead of loading it again
+        memo = {id(self.board.transmitting_model): self.board.transmitting_model}
+        return copy.deepcopy(self, memo)
+
     def view(self):
         logger.info('data left = {} steps taken = {}'.format(np.array(self.board.targets.dv_required) - np.array(self.board.targets.dv_collected), self.num_steps))
         return self.running_info
@@ -197,6 +275,7 @@ class Agent():
             self._render_frame()
     
     def _render_frame(self):
+        import pygame
         color_wheel = ["#cc99ff50", "#ff99ff50", "#ffb36650", "#ff4d9450", "#80b3ff50"]
         if self.window is None:
             pygame.init()
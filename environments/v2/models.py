@@ -3,6 +3,17 @@ import math
 from environments.v2.transmission_model import Phi_dif_Model
 from environments.v2 import controller
 from utils.buffer import Info
+from utils import phases
+
+def snapshot_dtype(num_agents, num_towers):
+    # one record of the episode state of a Board and its game.Agent (game.Agent.get_snapshot), a few hundred bytes
+    # plus the 2.5kB numpy RNG state
+    return np.dtype([('agent_position', np.float64, (num_agents, 2)), ('agent_done', np.bool_, (num_agents,)),
+                     ('agent_dv_collected', np.float64, (num_agents, num_towers)), ('tower_location', np.float64, (num_towers, 2)),
+                     ('dv_collected', np.float64, (num_towers,)), ('dv_left', np.float64, (num_towers,)), ('dv_rate', np.float64, (num_towers,)),
+                     ('motion_substep', np.int64),
+                     ('num_steps', np.float64), ('reward', np.float64, (num_agents,)), ('reward_per_agent', np.bool_), ('timestamp', np.int64),
+                     ('rng_key', np.uint32, (624,)), ('rng_pos', np.int64), ('rng_has_gauss', np.int64), ('rng_gauss', np.float64)])
 
 class Agent_List():
     def __init__(self, num_tower, start_at, arrival_at) -> None:
@@ -36,13 +47,25 @@ class Agent_List():
     def is_done(self):
         return self.done.all()
 
+    def get_snapshot(self, snapshot):
+        snapshot['agent_position'] = self.current_position
+        snapshot['agent_done'] = self.done
+        snapshot['agent_dv_collected'] = self.dv_collected
+
+    def restore(self, snapshot):
+        self.current_position[:] = snapshot['agent_position']
+        self.done[:] = snapshot['agent_done']
+        self.dv_collected[:] = snapshot['agent_dv_collected']
+
     def get_state(self):
         return self.current_position.flatten()
 
 class Targets():
-    def __init__(self, tower_location, dv_required, args = None) -> None:
+    def __init__(self, tower_location, dv_required, args = None, num_agents = 1) -> None:
         self.start_at = tower_location
         self.dv_required = dv_required
+        # float64 copy for the per-substep updates, the values np.minimum / subtraction would convert dv_required to
+        self.dv_required_array = np.asarray(dv_required, dtype=np.float64)
         self.num_towers = len(tower_location)
 
         self.tower_location = np.array(self.start_at)
@@ -55,41 +78,106 @@ class Targets():
             print('The Target Moves Circular')
             self.is_moving = True 
             self.movement = controller.Target_Move_Circular(centers=tower_location, radius=args['radius'], w=args['w'], w_0=args['w_0'])
-            self.tower_location = self.movement.locations
         elif args['target_move_type'] == 'linear':
             print('The Target Moves Linear')
             self.is_moving = True
             self.movement = controller.Target_Move_Linear(start_at=tower_location, switch_time=args['switch_time'], speed=args['speed'])
+        elif args['target_move_type'] == 'directives':
+            print('The Target Follows Directives')
+            self.is_moving = True
+            self.movement = controller.Target_Controller(start_at=tower_location, step_sizes=args['step_sizes'], directives=args['directives'], intervals=args['intervals'])
         else:
             print('Target Is Stationary')
 
+        # moving towers read their location from a controller.Motion_Schedule, compiled for the substeps of
+        # max_episode_steps steps (Board.update_dv_status: 10 substeps of 1 / (10 * control_time_scale)). The substeps
+        # run per agent (update_agents calls update_dv_status for every agent that is not done), so an episode with
+        # every agent active to the end takes num_agents times as many
+        self.substep = 0
+        self.substep_time = 1.0 / (10 * args.get('control_time_scale', 1))
+        self.num_substeps = 10 * args.get('max_episode_steps', 100) * num_agents
+        if self.is_moving:
+            self.schedule = controller.Motion_Schedule.compile(self.movement, self.substep_time, self.num_substeps)
+            self.tower_location = self.schedule.position(0)
+
     def reset(self):
         self.tower_location = np.array(self.start_at)
         self.dv_collected = np.zeros(self.num_towers, dtype=np.float64)
         self.dv_left = np.array(self.dv_required, dtype=np.float64)
         self.dv_transmittion_rate = np.zeros(self.num_towers, dtype=np.float64)
         if self.is_moving:
-            self.movement.reset()
-            self.tower_location = self.movement.locations
+            self.substep = 0
+            self.schedule = controller.Motion_Schedule.compile(self.movement, self.substep_time, self.num_substeps)
+            self.tower_location = self.schedule.position(0)
 
     def update_position(self, time_scale):
         if self.is_moving:
-            self.movement.update(time_scale=time_scale)
-            self.tower_location = self.movement.locations
+            if time_scale != self.substep_time:
+                self.substep_time = time_scale
+                self.schedule = controller.Motion_Schedule.compile(self.movement, time_scale, self.num_substeps)
+            self.substep += 1
+            self.tower_location = self.schedule.position(self.substep)
         else:
             print('Target is not moving !!!!!!')
 
+    def get_snapshot(self, snapshot):
+        snapshot['tower_location'] = self.tower_location
+        snapshot['dv_collected'] = self.dv_collected
+        snapshot['dv_left'] = self.dv_left
+        snapshot['motion_substep'] = self.substep
+
+    def restore(self, snapshot):
+        self.dv_collected = np.array(snapshot['dv_collected'])
+        self.dv_left = np.array(snapshot['dv_left'])
+        if self.is_moving:
+            self.substep = int(snapshot['motion_substep'])
+            self.tower_location = self.schedule.position(self.substep)
+        else:
+            self.tower_location = np.array(snapshot['tower_location'])
+
     def update_dv_state(self, transmitting_rate_list):
-        dv_collected_updated = self.dv_collected + np.array(transmitting_rate_list)
-        dv_collected_updated = np.minimum(dv_collected_updated, self.dv_required)
+        dv_collected_updated = self.dv_collected + np.asarray(transmitting_rate_list)
+        dv_collected_updated = np.minimum(dv_collected_updated, self.dv_required_array)
 
         transmitting_rate = dv_collected_updated - self.dv_collected
-        self.dv_left = np.array(self.dv_required) - dv_collected_updated
+        self.dv_left = self.dv_required_array - dv_collected_updated
         self.dv_collected = dv_collected_updated
 
         return  self.dv_collected, transmitting_rate, self.dv_left
 
+class Tower_Grid():
+    # candidates of stationary towers per grid cell: the towers whose cutoff radius reaches into the cell, found once
+    # per visited cell. Cells are a quarter of the largest radius (at least MIN_CELL); each keeps the candidates that
+    # are still active, refreshed only after a tower finished (the 'version' of the active set changed)
+    MIN_CELL = 0.25
+
+    def __init__(self, tower_location, radius) -> None:
+        self.location = np.array(tower_location, dtype=np.float64)
+        self.radius = radius
+        self.cell = max(float(radius.max()) / 4, self.MIN_CELL)
+        self.cells = {}
+
+    def reach(self, x, y):
+        # towers within their radius of the closest point of cell (x, y)
+        low = np.array([x, y], dtype=np.float64) * self.cell
+        nearest = np.clip(self.location, low, low + self.cell)
+        return np.flatnonzero(np.linalg.norm(self.location - nearest, axis=1) <= self.radius)
+
+    def query(self, position, active, version):
+        key = (int(math.floor(position[0] / self.cell)), int(math.floor(position[1] / self.cell)))
+        entry = self.cells.get(key)
+        if entry is None:
+            entry = self.cells[key] = [self.reach(*key), None, None]
+        if entry[1] != version:
+            entry[1], entry[2] = version, entry[0][active[entry[0]]]
+        return entry[2]
+
 class Board():
+    # get_rates computes only the active / nearby towers on boards of at least CULL_MIN_TOWERS towers and while they
+    # are at most DENSE_SHARE of them; below that one call over every tower is cheaper than the indexing
+    CULL_MIN_TOWERS = 256
+    DENSE_SHARE = 0.5
+
     def __init__(self, x_limit, y_limit, start_at, arrival_at, tower_location, dv_required, phi_config_file, save_file, args = None, rounding = 2, control_time_scale = 2) -> None:
         self.x_limit = x_limit
         self.y_limit = y_limit
@@ -99,18 +187,71 @@ class Board():
         self.arrival_at = arrival_at
 
         self.num_towers = len(tower_location)
-        self.targets = Targets(tower_location=tower_location, dv_required=dv_required, args=args)
+        self.targets = Targets(tower_location=tower_location, dv_required=dv_required, args=args, num_agents=len(start_at))
 
         self.agents = Agent_List(num_tower=self.num_towers, start_at=start_at, arrival_at=arrival_at)
         self.transmitting_model = Phi_dif_Model(x_limit=x_limit, y_limit=y_limit, tower_position=tower_location, \
-            phi_config_file= phi_config_file, save_file=save_file, rounding=rounding)
+            phi_config_file= phi_config_file, save_file=save_file, rounding=rounding, phi_list=args.get('phi_list') if args else None)
         
         self.signal_range = self.transmitting_model.signal_range
+        # rates are computed for the active towers only (dv left) and, with a RATE_CUTOFF in the phi config and towers
+        # that do not move, only for the ones a Tower_Grid finds within their radius of the agent; see get_rates
+        self.cull = self.num_towers >= self.CULL_MIN_TOWERS
+        self.cutoff_radius = self.transmitting_model.cutoff_radius()
+        self.tower_grid = Tower_Grid(tower_location, self.cutoff_radius) if self.cull and self.cutoff_radius is not None and not self.targets.is_moving else None
+        self.reset_active()
+        self.snapshot_dtype = snapshot_dtype(self.agents.num_agents, self.num_towers)
         self.running_log = Info(board_structure=None, num_turrent=self.num_towers)
         
     def reset(self):
         self.agents.reset()
         self.targets.reset()
+        self.reset_active()
+
+    def reset_active(self):
+        self.active = np.array(self.targets.dv_left) > 0
+        self.active_towers = np.flatnonzero(self.active)
+        self.active_version = getattr(self, 'active_version', 0) + 1
+
+    def get_rates(self, position, time_ratio):
+        # rates of the towers to an agent at 'position' over one substep and the towers they were computed for. The
+        # dense call covers finished towers too (Targets.update_dv_state clips them to 0) and, with a cutoff, towers out
+        # of range, which keep their small rate
+        if not self.targets.is_moving and self.transmitting_model.signal_map is not None:
+            # one lookup for all towers, nothing to save
+            return np.asarray(self.transmitting_model.get_transmission_rate_stationary(agent_position=position, time_ratio=time_ratio)), self.active_towers
+        if not self.targets.is_moving:
+            position = np.round(position, self.transmitting_model.rounding)
+        towers = self.tower_grid.query(position, self.active, self.active_version) if self.tower_grid is not None else self.active_towers
+        if not self.cull or len(towers) > self.DENSE_SHARE * self.num_towers:
+            return self.transmitting_model.get_transmission_rate_dynamic(agent_position=position, tower_location=self.targets.tower_location,
+                time_ratio=time_ratio), self.active_towers
+        rates = np.zeros(self.num_towers, dtype=np.float64)
+        if len(towers):
+            rates[towers] = self.transmitting_model.get_transmission_rate_dynamic(agent_position=position, tower_location=self.targets.tower_location[towers],
+                time_ratio=time_ratio, towers=towers)
+        return rates, towers
+
+    def update_active(self, towers):
+        # towers finished by the last update leave the active set
+        if not self.cull:
+            return
+        finished = towers[self.targets.dv_left[towers] <= 0]
+        if len(finished):
+            self.active[finished] = False
+            self.active_towers = np.flatnonzero(self.active)
+            self.active_version += 1
+
+    def get_snapshot(self, snapshot):
+        self.agents.get_snapshot(snapshot)
+        self.targets.get_snapshot(snapshot)
+        snapshot['dv_rate'] = getattr(self, 'dv_transmittion_rate', 0)
+
+    def restore(self, snapshot):
+        self.agents.restore(snapshot)
+        self.targets.restore(snapshot)
+        self.reset_active()
+        self.dv_transmittion_rate = snapshot['dv_rate'].tolist()
 
     def update_agents(self, joint_actions):
         agent_collect_t = np.zeros((self.agents.num_agents, self.num_towers))
@@ -141,6 +282,16 @@ class Board():
 
         return dv_collected, cumulative_rate, dv_left
 
+    def get_hover_rate(self, communication_time_scale = 10):
+        # dv per step every tower gets from the agents staying at their positions (stationary towers), the sum of the
+        # substep rates of update_dv_status
+        time_ratio = 1.0/(communication_time_scale*self.control_time_scale)
+        rate = np.zeros(self.num_towers, dtype=np.float64)
+        for i in range(self.agents.num_agents):
+            if not self.agents.done[i]:
+                rate += communication_time_scale * self.get_rates(self.agents.current_position[i], time_ratio)[0]
+        return rate
+
     def update_dv_status(self, position, action, communication_time_scale = 10):
         d_action = np.array(action) / communication_time_scale
         position = np.array(position[:])
@@ -150,13 +301,12 @@ class Board():
             if self.targets.is_moving:
                 self.targets.update_position(1.0/(communication_time_scale*self.control_time_scale))
 
-                transmitting_rate_list = self.transmitting_model.get_transmission_rate_dynamic(agent_position=position, tower_location=self.targets.tower_location, \
-                    time_ratio=1.0/(communication_time_scale*self.control_time_scale))
-            else:
-                transmitting_rate_list = self.transmitting_model.get_transmission_rate_stationary(agent_position=position, time_ratio=1.0/(communication_time_scale*self.control_time_scale))
+            with phases.timers.phase('transmission'):
+                transmitting_rate_list, towers = self.get_rates(position, time_ratio=1.0/(communication_time_scale*self.control_time_scale))
             
             dv_collected, dv_transmittion_rate_step, dv_left = self.targets.update_dv_state(transmitting_rate_list)
-            cumulative_rate += np.array(dv_transmittion_rate_step)
+            self.update_active(towers)
+            cumulative_rate += dv_transmittion_rate_step
 
         self.dv_transmittion_rate = cumulative_rate.tolist()
         return dv_collected, cumulative_rate, dv_left
@@ -8,10 +8,11 @@ from tqdm import tqdm
 # config_name = "configs/config_trans_model_2_D_2"
 # save_file = "map/run1"
 class Phi_dif_Model():
-    def __init__(self, x_limit, y_limit, tower_position, phi_config_file, save_file, rounding = 0) -> None:
+    def __init__(self, x_limit, y_limit, tower_position, phi_config_file, save_file, rounding = 0, phi_list = None) -> None:
         self.phi_config_file = phi_config_file
         tools.mkdir('cache/map/')
-        self.save_file = 'cache/map/{}'.format(save_file)
+        # save_file None: no signal map, rates are computed at the rounded position when asked (generated instances)
+        self.save_file = 'cache/map/{}'.format(save_file) if save_file is not None else None
         Config = tools.load_config(self.phi_config_file)
 
         self.time_ratio = Config['TIME_RATIO']
@@ -19,8 +20,12 @@ class Phi_dif_Model():
         self.height = Config['HEIGHT']
         self.K = Config['K']
         self.N = Config['N']
-        self.Phi_list = np.array(Config['PHI_LIST'])
+        # per-tower phi of a generated instance instead of the PHI_LIST of the config; a config list longer than the
+        # towers is cut to them, the rates over all towers broadcast against it
+        self.Phi_list = np.array(Config['PHI_LIST'] if phi_list is None else phi_list)[:len(tower_position)]
         self.signal_range = Config['signal_range']
+        # towers whose rate is below RATE_CUTOFF (per unit time) may be skipped, see Board.get_rates (0: no cutoff)
+        self.rate_cutoff = Config.get('RATE_CUTOFF', 0)
 
         self.x_limit = x_limit
         self.y_limit = y_limit
@@ -28,6 +33,9 @@ class Phi_dif_Model():
         self.rounding = rounding
 
         self.tower_position = tower_position
+        if self.save_file is None:
+            self.signal_map = None
+            return
         try:
             self.signal_map = self.load_map()
         except:
@@ -35,6 +43,9 @@ class Phi_dif_Model():
         
 
     def get_transmission_rate_stationary(self, agent_position, time_ratio):
+        if self.signal_map is None:
+            position = np.round(agent_position, self.rounding)
+            return self.get_transmission_rate_dynamic(agent_position=position, tower_location=self.tower_position, time_ratio=time_ratio)
         x = round(agent_position[0], self.rounding)
         y = round(agent_position[1], self.rounding)
         if (x, y) not in self.signal_map:
@@ -51,16 +62,26 @@ class Phi_dif_Model():
         # return dv_collected_updated.tolist(),  transmitting_rate.tolist(), dv_left.tolist()
         return transmitting_rate_list
 
-    def get_transmission_rate_dynamic(self, agent_position, tower_location, time_ratio):
-        agent_position = np.array(agent_position)
-        tower_location = np.array(tower_location)
+    def get_transmission_rate_dynamic(self, agent_position, tower_location, time_ratio, towers=None):
+        # towers: indices of the towers in tower_location when it holds only some of them
+        agent_position = np.asarray(agent_position)
+        tower_location = np.asarray(tower_location)
 
         relative_distance = np.linalg.norm(agent_position - tower_location, axis=1)
-        data_transmitting_rate = self.Phi_list * self.B * np.log2(1 + self.K / (self.N * (relative_distance*relative_distance + pow(self.height, 2))))
+        phi = self.Phi_list if towers is None else self.Phi_list[towers]
+        data_transmitting_rate = phi * self.B * np.log2(1 + self.K / (self.N * (relative_distance*relative_distance + pow(self.height, 2))))
         data_transmitting_rate = time_ratio * data_transmitting_rate
 
         return data_transmitting_rate
     
+    def cutoff_radius(self):
+        # per tower, the distance past which its rate is below rate_cutoff; None without a cutoff
+        if not self.rate_cutoff:
+            return None
+        with np.errstate(divide='ignore'):
+            distance = self.K / (self.N * (np.power(2.0, self.rate_cutoff / (self.Phi_list * self.B)) - 1)) - pow(self.height, 2)
+        return np.sqrt(np.maximum(distance, 0))
+
     def init_signal_map(self):
         signal_map = {}
         x_position = np.arange(0, self.x_limit, self.precision, dtype=float)
@@ -0,0 +1,57 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.dirname(__file__) + '/../../..'))
+import numpy as np
+from environments import registry
+from environments.v2 import controller
+
+MAX_EPISODE_STEPS = 20
+
+def moving_spec(num_agents):
+    # circular towers that are never drained, agents that never arrive: the episode runs to max_episode_steps with
+    # every agent active, the most substeps an episode can take
+    return registry.Env_Spec(instance_name='test_motion_schedule_{}'.format(num_agents), tower_location=[[2.0, 2.0], [7.0, 7.0]],
+        start_at=[[1.0, 1.0 + i] for i in range(num_agents)], arrival_at=[[9.0, 9.0 - i] for i in range(num_agents)],
+        dv_required=[1e6, 1e6], action_type='MA_Continuous', max_episode_steps=MAX_EPISODE_STEPS, signal_map=False,
+        motion={'target_move_type': 'circular', 'radius': [0.5, 0.8], 'w': [0.1, -0.2], 'w_0': [0.0, 1.0]})
+
+def test_episode_stays_in_schedule(num_agents=3):
+    env = registry.make(moving_spec(num_agents)).clone()
+    env.reset()
+    targets = env.board.targets
+    table = targets.schedule.table
+    compiled = []
+    compile = controller.Motion_Schedule.__init__
+    def counting(self, *args):
+        compiled.append(args)
+        compile(self, *args)
+    controller.Motion_Schedule.__init__ = counting
+    try:
+        class args: type_reward = 'Lagrangian'
+        done = False
+        while not done and env.num_steps < MAX_EPISODE_STEPS:
+            _, _, done, _ = env.step(np.zeros(2 * num_agents), args)
+    finally:
+        controller.Motion_Schedule.__init__ = compile
+    assert env.num_steps == MAX_EPISODE_STEPS
+    assert targets.substep == 10 * MAX_EPISODE_STEPS * num_agents
+    assert not compiled and targets.schedule.table is table
+
+def test_schedule_cache_is_bounded():
+    max_schedules = controller.MAX_SCHEDULES
+    controller.MAX_SCHEDULES = 4
+    try:
+        motions = [controller.Target_Move_Circular(centers=[[5.0, 5.0]], radius=[1.0], w=[0.1 * (i + 1)], w_0=[0.0]) for i in range(6)]
+        first = controller.Motion_Schedule.compile(motions[0], 0.05, 10)
+        for movement in motions[1:]:
+            controller.Motion_Schedule.compile(movement, 0.05, 10)
+            # the first motion is used again and again, the others push each other out
+            assert controller.Motion_Schedule.compile(motions[0], 0.05, 10) is first
+        assert len(controller._schedules) == 4
+        assert controller._schedules.get((motions[1].key(), 0.05)) is None
+    finally:
+        controller.MAX_SCHEDULES = max_schedules
+
+if __name__ == '__main__':
+    test_episode_stays_in_schedule()
+    test_schedule_cache_is_bounded()
+    print('no recompile in a 3 agent episode, the schedule cache stays bounded')
@@ -0,0 +1,88 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.dirname(__file__) + '/../../..'))
+import tempfile
+import types
+import numpy as np
+from environments.v2 import models
+from utils import tools, io
+
+def phi_config(num_towers, cutoff):
+    config = tools.load_config('configs/config_trans_model_2_D_4.yaml')
+    config['PHI_LIST'] = [config['PHI_LIST'][i % len(config['PHI_LIST'])] for i in range(num_towers)]
+    config['RATE_CUTOFF'] = cutoff
+    output_dir = tempfile.mkdtemp() + '/'
+    io.save_config(output_dir=output_dir, args=config, name='phi')
+    return output_dir + 'phi.yaml'
+
+def motion(target_move_type, num_towers):
+    if target_move_type == 'circular':
+        return {'target_move_type': 'circular', 'radius': [0.5] * num_towers, 'w': [0.1] * num_towers, 'w_0': list(range(num_towers))}
+    if target_move_type == 'linear':
+        return {'target_move_type': 'linear', 'switch_time': 1, 'speed': [[0.2, -0.1]] * num_towers}
+    return {'target_move_type': 'stationary'}
+
+def board(num_agents, num_towers, target_move_type, cutoff=0):
+    rng = np.random.default_rng(num_towers)
+    # small data volumes, so that towers finish and the culled path runs on the large boards
+    return models.Board(x_limit=10, y_limit=10, start_at=[[1.0, 1.0 + i] for i in range(num_agents)], arrival_at=[[9.0, 9.0]] * num_agents,
+                        tower_location=np.round(rng.uniform(0.5, 9.5, size=(num_towers, 2)), 1).tolist(),
+                        dv_required=np.round(rng.uniform(0.01, 1, size=num_towers), 2).tolist(), phi_config_file=phi_config(num_towers, cutoff),
+                        save_file=None, rounding=1, control_time_scale=1, args=motion(target_move_type, num_towers))
+
+def dense_reference(board):
+    # every tower, every substep, as before the culling
+    def get_rates(self, position, time_ratio):
+        if not self.targets.is_moving:
+            position = np.round(position, self.transmitting_model.rounding)
+        return self.transmitting_model.get_transmission_rate_dynamic(agent_position=position, tower_location=self.targets.tower_location, time_ratio=time_ratio), None
+
+    def update_dv_state(self, transmitting_rate_list):
+        dv_collected_updated = self.dv_collected + np.array(transmitting_rate_list)
+        dv_collected_updated = np.minimum(dv_collected_updated, self.dv_required)
+        transmitting_rate = dv_collected_updated - self.dv_collected
+        self.dv_left = np.array(self.dv_required) - dv_collected_updated
+        self.dv_collected = dv_collected_updated
+        return self.dv_collected, transmitting_rate, self.dv_left
+
+    board.get_rates = types.MethodType(get_rates, board)
+    board.update_active = lambda towers: None
+    board.targets.update_dv_state = types.MethodType(update_dv_state, board.targets)
+    return board
+
+def test_no_cutoff_is_bit_identical():
+    for target_move_type in ['stationary', 'circular', 'linear']:
+        for num_agents in [1, 2]:
+            for num_towers in [5, 300]:
+                culled, reference = board(num_agents, num_towers, target_move_type), dense_reference(board(num_agents, num_towers, target_move_type))
+                assert culled.cull == (num_towers >= models.Board.CULL_MIN_TOWERS)
+                actions = np.random.default_rng(0).uniform(-0.5, 0.5, size=(40, num_agents, 2))
+                for joint_actions in actions:
+                    for result, expected in zip(culled.update_agents(joint_actions), reference.update_agents(joint_actions)):
+                        assert np.array_equal(result, expected)
+                    assert np.array_equal(culled.agents.current_position, reference.agents.current_position)
+                    assert np.array_equal(culled.targets.tower_location, reference.targets.tower_location)
+                    assert culled.dv_transmittion_rate == reference.dv_transmittion_rate
+                if culled.cull:
+                    # more than DENSE_SHARE of the towers finished, the last substeps computed the active ones only
+                    assert len(culled.active_towers) <= models.Board.DENSE_SHARE * num_towers
+
+def test_cutoff_only_drops_far_towers():
+    # with a cutoff the grid skips towers out of range of the agent's cell; every tower within range is computed and the
+    # computed ones get their exact rate
+    num_towers = 300
+    culled, reference = board(1, num_towers, 'stationary', cutoff=0.2), board(1, num_towers, 'stationary')
+    assert culled.tower_grid is not None
+    for position in np.random.default_rng(1).uniform(0, 10, size=(50, 2)):
+        rates, towers = culled.get_rates(position, time_ratio=0.1)
+        expected, _ = reference.get_rates(position, time_ratio=0.1)
+        computed = rates != 0
+        assert np.array_equal(rates[computed], expected[computed])
+        near = np.linalg.norm(culled.tower_grid.location - np.round(position, 1), axis=1) <= culled.cutoff_radius
+        assert computed[near].all()
+        if len(towers) <= models.Board.DENSE_SHARE * num_towers:
+            assert computed.sum() == len(towers) < num_towers
+
+if __name__ == '__main__':
+    test_no_cutoff_is_bit_identical()
+    test_cutoff_only_drops_far_towers()
+    print('rate culling matches the dense rates')
@@ -0,0 +1,149 @@
+import numpy as np
+from environments import registry
+
+'''
+    Vector environment over a set of different instances, for one goal-conditioned policy trained on all of them.
+
+    venv = vector.Vector_Env(specs, num_envs=16, seed=10)      # registry.Env_Spec list, e.g. scenarios.Scenario_Reader.spec(i)
+    s, masks = venv.reset()
+    s_, r, dw, done = venv.step(actions, args)                 # actions: (num_envs, action_dim) padded policy outputs
+    s, masks = venv.reset_done(done)                           # finished slots start the next instance of the set
+
+    Every slot holds its own v2 game.Agent (a copy of the registry one, so every instance is built once per process)
+    and the slots may differ in towers, agents, dv_required and goals. A copy a slot lets go of is kept and reset for
+    the next slot that loads its instance, so an instance is copied once per slot that holds it at the same time. The observation of a slot is padded to the
+    largest agent and tower count of the set: AGENT_FEATURES per agent (position, arrival) then TOWER_FEATURES per
+    tower (location, dv collected, dv required), zeros past the counts of its instance. masks holds 1 for the agents
+    and towers a slot has, agents first. Rewards and termination are the game.Agent ones of every slot; a slot is
+    also done when it reaches the max_episode_steps of its instance, that is not a 'dw' (no terminal state).
+    Finished slots take the next instance of a shuffled pass over the set, so a run cycles through all of it.
+'''
+
+AGENT_FEATURES = 4  # x, y, arrival x, arrival y
+TOWER_FEATURES = 4  # x, y, dv collected, dv required
+
+def observation_dim(max_agents, max_towers):
+    return AGENT_FEATURES * max_agents + TOWER_FEATURES * max_towers
+
+def unpad_action(action_type, action, num_agents, max_agents):
+    # the padded action of the policy cut to the agents of one instance
+    if action_type == 'BangSingular':
+        # angles of all agents, then speeds of all agents
+        return np.concatenate([action[:num_agents], action[max_agents:max_agents + num_agents]])
+    if action_type == 'MA_Continuous':
+        # (speed, angle) per agent
+        return action[:2 * num_agents]
+    # MA_Discrete: one joint index, the board only moves the agents it has
+    return action
+
+class Vector_Env():
+    def __init__(self, specs, num_envs, max_agents=None, max_towers=None, shuffle=True, seed=None) -> None:
+        self.specs = [registry.resolve(spec) for spec in specs]
+        action_types = set(spec.action_type for spec in self.specs)
+        if len(action_types) != 1:
+            raise ValueError('every instance of a vector env needs the same action type, got {}'.format(sorted(action_types)))
+        self.action_type = action_types.pop()
+        self.num_envs = num_envs
+        self.max_agents = max_agents or max(len(spec.start_at) for spec in self.specs)
+        self.max_towers = max_towers or max(len(spec.tower_location) for spec in self.specs)
+        self.observation_dim = observation_dim(self.max_agents, self.max_towers)
+        self.mask_dim = self.max_agents + self.max_towers
+        self.shuffle = shuffle
+        self.rng = np.random.default_rng(seed)
+
+        self.order = np.array([], dtype=np.int64)
+        self.position = 0
+        self.envs = [None] * num_envs
+        self.free = {}  # instance -> copies no slot holds
+        self.instances = np.zeros(num_envs, dtype=np.int64)
+        self.masks = np.zeros((num_envs, self.mask_dim), dtype=np.float32)
+        self.episodes = []
+
+    def next_instance(self):
+        if self.position >= len(self.order):
+            self.order = self.rng.permutation(len(self.specs)) if self.shuffle else np.arange(len(self.specs))
+            self.position = 0
+        self.position += 1
+        return int(self.order[self.position - 1])
+
+    def load(self, slot, instance):
+        # a copy of the registry environment, so slots of other vector envs (training and evaluation) and the same
+        # instance in two slots never share episode state; copies share the signal map
+        if self.envs[slot] is not None:
+            self.free.setdefault(int(self.instances[slot]), []).append(self.envs[slot])
+        free = self.free.get(instance)
+        env = free.pop() if free else registry.make(self.specs[instance]).clone()
+        self.envs[slot] = env
+        self.instances[slot] = instance
+        self.masks[slot] = 0
+        self.masks[slot, :env.board.agents.num_agents] = 1
+        self.masks[slot, self.max_agents:self.max_agents + env.board.num_towers] = 1
+        env.reset()
+
+    def observe(self, slot):
+        s = np.zeros(self.observation_dim)
+        if self.envs[slot] is None:
+            return s
+        board = self.envs[slot].board
+        agents = s[:AGENT_FEATURES * self.max_agents].reshape(self.max_agents, AGENT_FEATURES)
+        towers = s[AGENT_FEATURES * self.max_agents:].reshape(self.max_towers, TOWER_FEATURES)
+        n, t = board.agents.num_agents, board.num_towers
+        agents[:n, :2] = board.agents.current_position
+        agents[:n, 2:] = board.agents.arrival_at
+        towers[:t, :2] = board.targets.tower_location
+        towers[:t, 2] = board.targets.dv_collected
+        towers[:t, 3] = board.targets.dv_required
+        return s
+
+    def observations(self):
+        return np.stack([self.observe(slot) for slot in range(self.num_envs)])
+
+    def reset(self):
+        for slot in range(self.num_envs):
+            self.load(slot, self.next_instance())
+        return self.observations(), self.masks.copy()
+
+    def step(self, actions, args):
+        rewards = np.zeros(self.num_envs)
+        dw = np.zeros(self.num_envs, dtype=bool)
+        done = np.zeros(self.num_envs, dtype=bool)
+        for slot, env in enumerate(self.envs):
+            action = unpad_action(self.action_type, actions[slot], env.board.agents.num_agents, self.max_agents)
+            _, rewards[slot], dw[slot], _ = env.step(action, args)
+            done[slot] = dw[slot] or env.num_steps >= env._max_episode_steps
+        return self.observations(), rewards, dw, done
+
+    def reset_done(self, done):
+        for slot in np.flatnonzero(done):
+            env = self.envs[slot]
+            self.episodes.append({'instance': int(self.instances[slot]), 'reward': float(env.reward), 'steps': float(env.num_steps),
+                                  'solved': bool(env.board.is_dv_collection_done())})
+            self.load(slot, self.next_instance())
+        return self.observations(), self.masks.copy()
+
+    def pop_episodes(self):
+        # episodes finished since the last call
+        episodes, self.episodes = self.episodes, []
+        return episodes
+
+    def run_episodes(self, act, args):
+        # one episode of every instance, num_envs at a time; act(s, masks) -> padded actions. No exploration or
+        # instance sampling here: the evaluation pass of a training run
+        results = []
+        for start in range(0, len(self.specs), self.num_envs):
+            slots = list(range(min(self.num_envs, len(self.specs) - start)))
+            for slot in slots:
+                self.load(slot, start + slot)
+            active = np.zeros(self.num_envs, dtype=bool)
+            active[slots] = True
+            while active.any():
+                actions = act(self.observations(), self.masks.copy())
+                for slot in np.flatnonzero(active):
+                    env = self.envs[slot]
+                    action = unpad_action(self.action_type, actions[slot], env.board.agents.num_agents, self.max_agents)
+                    _, _, terminal, _ = env.step(action, args)
+                    if terminal or env.num_steps >= env._max_episode_steps:
+                        active[slot] = False
+                        results.append({'instance': start + slot, 'reward': float(env.reward), 'steps': float(env.num_steps),
+                                        'solved': bool(env.board.is_dv_collection_done())})
+        return results
@@ -143,6 +143,20 @@ class DDPGAgent:
         self.target_actor.load_state_dict(actor_parameters)
         self.target_critic.load_state_dict(critic_parameters)
 
+    def state_dict(self):
+        # full training state for resume snapshots, the replay memory is saved separately
+        return {'actor': self.actor.state_dict(), 'critic': self.critic.state_dict(),
+                'target_actor': self.target_actor.state_dict(), 'target_critic': self.target_critic.state_dict(),
+                'actor_optimizer': self.actor.optimizer.state_dict(), 'critic_optimizer': self.critic.optimizer.state_dict()}
+
+    def load_state_dict(self, state):
+        self.actor.load_state_dict(state['actor'])
+        self.critic.load_state_dict(state['critic'])
+        self.target_actor.load_state_dict(state['target_actor'])
+        self.target_critic.load_state_dict(state['target_critic'])
+        self.actor.optimizer.load_state_dict(state['actor_optimizer'])
+        self.critic.optimizer.load_state_dict(state['critic_optimizer'])
+
     def save_model(self):
         """
         Saves the values at the checkpoint
@@ -1,5 +1,5 @@
-from environments.instances.v1.determistic import Test_Environment_Continuous, Test_Environment_Eval_Continuous
-from utils import monitor, tools
+from environments.v1.instances.v1.archieved.determistic import Test_Environment_Continuous, Test_Environment_Eval_Continuous
+from utils import monitor, tools, snapshot
 from trainer.DDPG_HER import ddpg
 from loguru import logger
 import numpy as np
@@ -42,7 +42,9 @@ class GameAgent():
 
         return episode_reward_sum, env
 
-    def train(self, n_games):
+    def train(self, n_games, early_stop=None, snapshot_freq=0, resume=False):
+        # early_stop: monitor.Plateau_Detector, ends training once the evaluations stall
+        # snapshot_freq: episodes between resume snapshots (0: off), resume: continue from the latest snapshot
         best_num_steps = float('inf')
         num_steps = []
 
@@ -55,7 +57,20 @@ class GameAgent():
         # env.mode = 'CNN'
         # ddqn = DDQN_CNN(env=env)
         best_model = None
-        for i in range(n_games):
+
+        snapshots = snapshot.Snapshot(output_dir + 'snapshot/') if snapshot_freq or resume else None
+        resume_state = snapshots.load_state() if resume else None
+        start_episode = 0
+        if resume_state is not None:
+            self.agent.load_state_dict(resume_state['agent'])
+            snapshots.restore_buffers(resume_state, buffers={'memory': self.agent.memory})
+            tracker.restore(resume_state['monitor']['rewards'], resume_state['monitor']['steps'])
+            best_num_steps = resume_state['best_num_steps']
+            best_model = self.agent if best_num_steps < float('inf') else None
+            snapshot.set_rng_state(resume_state['rng'])
+            start_episode = resume_state['episode'] + 1
+
+        for i in range(start_episode, n_games):
             logger.info('Start Episode: %s' % i)
             s = self.env.reset()
             # episode_reward_sum = 0
@@ -101,7 +116,7 @@ class GameAgent():
 
             if i % 50 == 0 or n_games - i < 100:
                 eval_rewards, test_env = self.evaluate_with_model(env=self.evaluate_env, model=self.agent)
-                tracker.store(eval_rewards)
+                tracker.store(eval_rewards, test_env.num_steps)
                 logger.success('Episode %s Rewards: %s' % (i, round(eval_rewards, 2)))
                 test_env.view()
 
@@ -117,6 +132,15 @@ class GameAgent():
                     
             
             self.timer.stop()
+            if early_stop is not None and early_stop.should_stop(i, tracker):
+                break
+            if snapshot_freq and (i + 1) % snapshot_freq == 0:
+                snapshots.save(i, {'episode': i, 'agent': self.agent.state_dict(), 'best_num_steps': best_num_steps,
+                                   'monitor': {'rewards': tracker.rewards, 'steps': tracker.steps}, 'rng': snapshot.rng_state()},
+                               buffers={'memory': self.agent.memory})
+
+        if snapshots is not None:
+            snapshots.clear()
 
         x = [i+1 for i in range(n_games)]
         # tools.plot_curve(x, episode_rewards, 'results/' + env_type + '/rewards.png')
@@ -82,4 +82,25 @@ class SAC(object):
 
         # Softly update target networks
         for param, target_param in zip(self.critic.parameters(), self.critic_target.parameters()):
-            target_param.data.copy_(self.TAU * param.data + (1 - self.TAU) * target_param.data)
\ No newline at end of file
+            target_param.data.copy_(self.TAU * param.data + (1 - self.TAU) * target_param.data)
+
+    def state_dict(self):
+        # full training state for resume snapshots, the replay memory is saved separately
+        state = {'actor': self.actor.state_dict(), 'critic': self.critic.state_dict(), 'critic_target': self.critic_target.state_dict(),
+                 'actor_optimizer': self.actor_optimizer.state_dict(), 'critic_optimizer': self.critic_optimizer.state_dict()}
+        if self.adaptive_alpha:
+            state['log_alpha'] = self.log_alpha
+            state['alpha_optimizer'] = self.alpha_optimizer.state_dict()
+        return state
+
+    def load_state_dict(self, state):
+        self.actor.load_state_dict(state['actor'])
+        self.critic.load_state_dict(state['critic'])
+        self.critic_target.load_state_dict(state['critic_target'])
+        self.actor_optimizer.load_state_dict(state['actor_optimizer'])
+        self.critic_optimizer.load_state_dict(state['critic_optimizer'])
+        if self.adaptive_alpha:
+            with torch.no_grad():
+                self.log_alpha.copy_(state['log_alpha'])  # in place, alpha_optimizer holds this tensor
+            self.alpha_optimizer.load_state_dict(state['alpha_optimizer'])
+            self.alpha = self.log_alpha.exp()
@@ -1,5 +1,5 @@
-from environments.instances.determistic import Test_Environment_Continuous, Test_Environment_Eval_Continuous
-from utils import monitor, tools
+from environments.v1.instances.v1.archieved.determistic import Test_Environment_Continuous, Test_Environment_Eval_Continuous
+from utils import monitor, tools, snapshot
 from trainer.SAC.sac import SAC
 from trainer.SAC.HERMemory import HindsightExperienceReplayMemory
 from loguru import logger
@@ -28,19 +28,22 @@ class Agent():
         episode_reward = 0
         while not done:
             a = model.choose_action(s, deterministic=True)  # We use the deterministic policy during the evaluating
-            s_, r, done, _ = env.step(a, type_reward='default')
+            s_, r, done, _ = env.step(a, type_reward='Default')
+            # the v1 environment only ends once every tower is emptied, the step limit ends the episode here
+            done = done or env.num_steps >= self.max_episode_steps
             episode_reward += r
             s = s_
         print(episode_reward)
 
         return episode_reward, env
 
-    def train(self, max_train_steps):
+    def train(self, max_train_steps, early_stop=None, snapshot_freq=0, resume=False):
+        # early_stop: monitor.Plateau_Detector (ends training once the evaluations stall) or monitor.Target_Detector
+        # snapshot_freq: steps between resume snapshots (0: off), resume: continue from the latest snapshot
         output_dir = self.output_dir + '_train_sac/'
         best_num_steps = float('inf')
         best_model = None
 
-        max_train_steps = 3e6  # Maximum number of training steps
         random_steps = 25e3  # Take the random actions in the beginning for the better exploration
         evaluate_freq = 5e3  # Evaluate the policy every 'evaluate_freq' steps
         evaluate_num = 0  # Record the number of evaluations
@@ -49,18 +52,30 @@ class Agent():
         replay_buffer = HindsightExperienceReplayMemory(memory_size=memory_size, input_dims=self.state_dim, n_actions=self.action_dim)
         tracker = monitor.Learning_Monitor(output_dir=output_dir, name='sac', log=['ddpg'])
 
-        while total_steps < max_train_steps:
+        snapshots = snapshot.Snapshot(output_dir + 'snapshot/') if snapshot_freq or resume else None
+        resume_state = snapshots.load_state() if resume else None
+        if resume_state is not None:
+            self.agent.load_state_dict(resume_state['agent'])
+            snapshots.restore_buffers(resume_state, buffers={'replay_buffer': replay_buffer})
+            tracker.restore(resume_state['monitor']['rewards'], resume_state['monitor']['steps'])
+            total_steps, evaluate_num, best_num_steps = resume_state['total_steps'], resume_state['evaluate_num'], resume_state['best_num_steps']
+            best_model = self.agent if best_num_steps < float('inf') else None
+            snapshot.set_rng_state(resume_state['rng'])
+
+        stopped = False
+        while total_steps < max_train_steps and not stopped:
             s = self.env.reset()
             episode_steps = 0
             done = False
             goal = self.env.goal
-            while not done:
+            while not done and not stopped:
                 episode_steps += 1
                 if total_steps < random_steps:  # Take the random actions in the beginning for the better exploration
                     a = self.env.action_space.sample()
                 else:
                     a = self.agent.choose_action(s)
-                s_, r, done, _ = self.env.step(a, type_reward='default')
+                s_, r, done, _ = self.env.step(a, type_reward='Default')
+                done = done or episode_steps >= self.max_episode_steps
 
                 # When dead or win or reaching the max_episode_steps, done will be Ture, we need to distinguish them;
                 # dw means dead or win,there is no next state s';
@@ -80,22 +95,32 @@ class Agent():
                     evaluate_num += 1
                     evaluate_reward, test_env = self.evaluate_with_model(env=self.evaluate_env, model=self.agent)
                     print("evaluate_num:{} \t evaluate_reward:{}".format(evaluate_num, evaluate_reward))
-                    tracker.store(evaluate_reward)
+                    tracker.store(evaluate_reward, test_env.num_steps)
 
                     if test_env.num_steps < best_num_steps:
                         logger.warning('best num step: {}'.format(test_env.num_steps))
                         best_num_steps = test_env.num_steps
                         best_model = self.agent
 
+                    if early_stop is not None and early_stop.should_stop(total_steps, tracker):
+                        stopped = True
+
                 total_steps += 1
 
+                if snapshot_freq and total_steps % snapshot_freq == 0:
+                    snapshots.save(total_steps, {'agent': self.agent.state_dict(), 'total_steps': total_steps, 'evaluate_num': evaluate_num,
+                                                 'best_num_steps': best_num_steps, 'monitor': {'rewards': tracker.rewards, 'steps': tracker.steps},
+                                                 'rng': snapshot.rng_state()}, buffers={'replay_buffer': replay_buffer})
+
+        if snapshots is not None:
+            snapshots.clear()
         tracker.plot_average_learning_curve(50)
         tracker.plot_learning_curve()
         tracker.dump_to_file()
         tracker.save_log()
 
-        eval_rewards, test_env = self.evaluate_with_model(env=self.evaluate_env, model=best_model)
+        eval_rewards, test_env = self.evaluate_with_model(env=self.evaluate_env, model=best_model or self.agent)
         logger.success('Best Rewards: %s' % (round(eval_rewards, 2)))
-        stats = test_env.view()
-        stats.save(output_dir)
+        # NOTE: Info.save plots per-agent paths of the v2 boards, the single-agent v1 path is only logged
+        test_env.view()
         # best_model.save_models(mode='Default')
\ No newline at end of file
@@ -2,7 +2,7 @@ import sys, os
 sys.path.append(os.path.abspath(os.path.dirname(__file__) + '/../..'))
 
 from trainerV2.DDQN_MA.scripts import HER_Batch_Trainer
-from utils import graph, tools
+from utils import graph, tools, io, monitor
 from loguru import logger
 
 def init_working_dir():
@@ -18,6 +18,19 @@ def her_ddqn():
     # agent = PHER_Batch_Trainer.GameAgent(config=config, network='MLP')
     agent.batch_train('Default')
 
+def train_job(params):
+    # NOTE: entry point of utils/scheduler.py, one (instance, seed) of HER_Batch_Trainer.batch_train per job
+    init_working_dir()
+    config = tools.load_config(params.get('config', "configs/config_ddqn_2.yaml"))
+    agent = HER_Batch_Trainer.GameAgent(config=config, network='MLP')
+    env = [env for env in HER_Batch_Trainer.env_list if env.instance_name == params['instance']][0]
+    env.state_mode = agent.network
+    output_dir = io.mkdir('{}/{}'.format(agent.output_dir, env.instance_name))
+    target = monitor.Target_Detector(**params['target']) if params.get('target') else None
+    best_rewards = agent.train_model(env=env.environment, n_games=params.get('n_games', HER_Batch_Trainer.n_game), pre_output_dir=output_dir,
+                                     seeds=[params['seed']], early_stop=target)
+    return {'best_reward': float(best_rewards), 'total_steps': agent.total_steps, **(target.result() if target else {})}
+
 if __name__ == '__main__':
     tools.set_logger_level(3)
     init_working_dir()
@@ -1,7 +1,7 @@
 from trainerV2.DDQN_MA.data.env_list import env_list
 from trainerV2.DDQN_MA.scripts.HER_ddqn import DDQN
 from utils import tools, io
-from utils import monitor
+from utils import monitor, snapshot, checkpoint, profiler, memory
 import sys
 from loguru import logger
 from datetime import datetime
@@ -56,22 +56,49 @@ class GameAgent():
 
         return episode_reward_sum, env
 
-    def train_model(self, n_games, env, pre_output_dir, env_type='Default',):
+    def train_model(self, n_games, env, pre_output_dir, env_type='Default', seeds=random_seed, early_stop=None):
+        # early_stop: asked with should_stop(env steps, tracker) after every episode, e.g. monitor.Target_Detector
         logger.warning('Training {} Mode'.format(env_type))
-        for seed in range(len(random_seed)):
-            tools.setup_seed(random_seed[seed])
+        for seed in range(len(seeds)):
+            tools.setup_seed(seeds[seed])
             best_num_steps = float('inf')
             best_rewards = -float('inf')
-            output_dir = io.mkdir(pre_output_dir +  '/seed_{}/ddqn_ma/'.format(random_seed[seed]))
+            output_dir = io.mkdir(pre_output_dir +  '/seed_{}/ddqn_ma/'.format(seeds[seed]))
 
             tracker = monitor.Learning_Monitor(output_dir=output_dir, name='ddqn_random_seed_{}'.format(seed), log=['ddqn', env_type], args=self.config)
+            early_stop_config = self.config.get('EARLY_STOP') or {}
+            plateau = monitor.Plateau_Detector(**{key.lower(): value for key, value in early_stop_config.items()}) if early_stop_config.get('PATIENCE', 0) else None
+            if self.config.get('PROFILE_SECONDS', 0):
+                profiler.install(output_dir, seconds=self.config['PROFILE_SECONDS'])
 
             # logger.warning('Using {} Environment'.format(env.status_tracker.name))
             env.state_mode = self.network
             self.config['AGENT']['output_dir'] = output_dir
+            accountant = memory.Memory_Accountant(budget_gb=self.config.get('MEMORY_BUDGET_GB'))
             ddqn = DDQN(env=env, config = self.config['AGENT'], network_config=self.config['NETWORK'])
+            accountant.track('memory', ddqn.memory)
+            accountant.track_agent('ddqn', ddqn)
+            accountant.track_env('env', env)
+            accountant.check()
             best_model = None
-            for i in range(n_games):
+            test_env = env
+
+            snapshot_freq = self.config.get('SNAPSHOT_FREQ', 0)
+            snapshots = snapshot.Snapshot(output_dir + 'snapshot/') if snapshot_freq or self.config.get('RESUME', False) else None
+            resume_state = snapshots.load_state() if snapshots is not None and self.config.get('RESUME', False) else None
+            start_episode = 0
+            self.total_steps = 0
+            evaluations = 0
+            if resume_state is not None:
+                ddqn.load_state_dict(resume_state['ddqn'])
+                snapshots.restore_buffers(resume_state, buffers={'memory': ddqn.memory})
+                tracker.restore(resume_state['monitor']['rewards'], resume_state['monitor']['steps'])
+                best_rewards, best_num_steps = resume_state['best_rewards'], resume_state['best_num_steps']
+                snapshot.set_rng_state(resume_state['rng'])
+                start_episode = resume_state['episode'] + 1
+                self.total_steps = resume_state.get('total_steps', 0)
+
+            for i in range(start_episode, n_games):
                 logger.info('Start Episode: %s' % i)
                 # episode_reward_sum = 0
                 self.timer.start()
@@ -96,6 +123,7 @@ class GameAgent():
                         args = type('', (), {})()
                         args.type_reward = 'HER'
                         s_, r, done, _ = env.step(action = a, args = args)
+                        self.total_steps += 1
 
                         ddqn.store_transition(s, a, r, s_, done, goal)
                         transitions.append((s, a, r, s_))
@@ -108,14 +136,14 @@ class GameAgent():
                         if ddqn.learn_step_counter != 0 and ddqn.learn_step_counter % result_saving_iter == 0:
                             eval_rewards, test_env = self.evaluate_with_model(env=env, model=ddqn, type_reward='HER')
                             logger.success('Episode %s Rewards: %s' % (i, round(eval_rewards, 2)))
-                            tracker.store(eval_rewards)
+                            tracker.store(eval_rewards, test_env.num_steps)
                             stats = test_env.view()
                             stats.final_reward = eval_rewards
                             tools.mkdir(output_dir + 'tmp_case')
                             stats.save(sub_dir = output_dir + 'tmp_case', plot = True)
                             if eval_rewards > best_rewards:
                                 best_rewards = eval_rewards
-                                ddqn.save_models(mode=env_type)
+                                ddqn.save_models(mode=env_type, step=ddqn.learn_step_counter, reward=eval_rewards)
 
                                 _, test_env = self.evaluate_with_model(env=env, model=ddqn, type_reward='HER')
                                 logger.warning('best num step: {}'.format(test_env.num_steps))
@@ -137,11 +165,11 @@ class GameAgent():
                                 if ddqn.learn_step_counter != 0 and ddqn.learn_step_counter % result_saving_iter == 0:
                                     eval_rewards, test_env = self.evaluate_with_model(env=env, model=ddqn, type_reward='HER')
                                     logger.success('Episode %s Rewards: %s' % (i, round(eval_rewards, 2)))
-                                    tracker.store(eval_rewards)
+                                    tracker.store(eval_rewards, test_env.num_steps)
 
                                     if eval_rewards > best_rewards:
                                         best_rewards = eval_rewards
-                                        ddqn.save_models(mode=env_type)
+                                        ddqn.save_models(mode=env_type, step=ddqn.learn_step_counter, reward=eval_rewards)
 
                                         _, test_env = self.evaluate_with_model(env=env, model=ddqn, type_reward='HER')
                                         logger.warning('best num step: {}'.format(test_env.num_steps))
@@ -156,13 +184,13 @@ class GameAgent():
                             if ddqn.learn_step_counter != 0 and ddqn.learn_step_counter % result_saving_iter == 0:
                                 eval_rewards, test_env = self.evaluate_with_model(env=env, model=ddqn, type_reward='HER')
                                 logger.success('Episode %s Rewards: %s' % (i, round(eval_rewards, 2)))
-                                tracker.store(eval_rewards)
+                                tracker.store(eval_rewards, test_env.num_steps)
                                 stats = test_env.view()
                                 tools.mkdir(output_dir + 'tmp_case')
                                 stats.save(sub_dir = output_dir + 'tmp_case', plot = True)
                                 if eval_rewards > best_rewards:
                                     best_rewards = eval_rewards
-                                    ddqn.save_models(mode=env_type)
+                                    ddqn.save_models(mode=env_type, step=ddqn.learn_step_counter, reward=eval_rewards)
 
                                     # _, test_env = self.evaluate_with_model(env=env, model=ddqn, type_reward='HER')
                                     logger.warning('best num step: {}'.format(test_env.num_steps))
@@ -172,19 +200,35 @@ class GameAgent():
 
                 '''
                 eval_rewards, test_env = self.evaluate_with_model(env=env, model=ddqn, type_reward='HER')
-                tracker.store(eval_rewards)
+                tracker.store(eval_rewards, test_env.num_steps)
                 logger.success('Episode %s Rewards: %s' % (i, round(eval_rewards, 2)))
                 stats = test_env.view()
 
                 if test_env.num_steps < best_num_steps:
                     logger.warning('best num step: {}'.format(test_env.num_steps))
                     best_num_steps = test_env.num_steps
-                    ddqn.save_models(mode=env_type)
+                    ddqn.save_models(mode=env_type, step=ddqn.learn_step_counter, reward=eval_rewards)
                     stats = test_env.view()
                     stats.save(sub_dir = output_dir, plot = False)
                 '''
                 
                 self.timer.stop()
+                if len(tracker.rewards) > evaluations:
+                    evaluations = len(tracker.rewards)
+                    report = accountant.report()
+                    logger.info('memory: {} MiB projected, {} MiB resident'.format(round(report['projected'], 1), round(report['process_rss'], 1)))
+                if plateau is not None and plateau.should_stop(ddqn.learn_step_counter, tracker):
+                    break
+                if early_stop is not None and early_stop.should_stop(self.total_steps, tracker):
+                    break
+                if snapshots is not None and snapshot_freq and (i + 1) % snapshot_freq == 0:
+                    snapshots.save(i, {'episode': i, 'total_steps': self.total_steps, 'ddqn': ddqn.state_dict(), 'best_rewards': best_rewards, 'best_num_steps': best_num_steps,
+                                       'monitor': {'rewards': tracker.rewards, 'steps': tracker.steps}, 'rng': snapshot.rng_state()},
+                                   buffers={'memory': ddqn.memory})
+
+            checkpoint.flush()
+            if snapshots is not None:
+                snapshots.clear()
 
             x = [i+1 for i in range(n_games)]
             # tools.plot_curve(x, episode_rewards, 'results/' + env_type + '/rewards.png')
@@ -193,6 +237,7 @@ class GameAgent():
             tracker.dump_to_file()
             tracker.save_log()
             test_env.save_task_info(output_dir)
+        return best_rewards
         # ddqn = ddqn.load_models(mode=env_type)
         # eval_rewards, test_env = self.evaluate_with_model(env=env, model=ddqn)
         # logger.success('Best Rewards: %s' % (round(eval_rewards, 2)))
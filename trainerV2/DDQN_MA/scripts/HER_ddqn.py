@@ -1,4 +1,5 @@
 from loguru import logger
+from utils import tools, checkpoint
 import torch
 import torch.nn as nn
 import numpy as np
@@ -120,9 +121,23 @@ class DDQN(object):
         self.optimizer.step()
         self.decrement_epsilon()
 
-    def save_models(self, mode):
-        self.eval_net.save_checkpoint(mode=mode)
-        self.target_net.save_checkpoint(mode=mode)
+    def state_dict(self):
+        # full training state for resume snapshots, the replay memory is saved separately
+        return {'eval_net': self.eval_net.state_dict(), 'target_net': self.target_net.state_dict(), 'optimizer': self.optimizer.state_dict(),
+                'epsilon': self.epsilon, 'learn_step_counter': self.learn_step_counter, 'memory_counter': self.memory_counter}
+
+    def load_state_dict(self, state):
+        self.eval_net.load_state_dict(state['eval_net'])
+        self.target_net.load_state_dict(state['target_net'])
+        self.optimizer.load_state_dict(state['optimizer'])
+        self.epsilon = state['epsilon']
+        self.learn_step_counter = state['learn_step_counter']
+        self.memory_counter = state['memory_counter']
+
+    def save_models(self, mode, step = None, reward = None):
+        # written off-thread; a newer best of the same run replaces a save that is still waiting
+        files = {tools.checkpoint_path(network.checkpoint_file, mode): network.state_dict() for network in [self.eval_net, self.target_net]}
+        checkpoint.writer().save(self.output_dir + mode, files, step=step, reward=reward)
 
     def load_models(self, mode, checkpoints = None):
         self.eval_net.load_checkpoint(mode=mode)
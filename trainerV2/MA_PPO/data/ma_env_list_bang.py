@@ -1,7 +1,7 @@
-from environments.v2.game import Agent
+from environments import registry
 # from environments.v1.tasks import Single_Task
 
-class Instances:
+class Instances(registry.Instance):
     def __init__(self, instance_name, tower_location, start_at, arrival_at, dv_required) -> None:
         self.instance_name = instance_name
         self.phi_model_name = 'configs/config_trans_model_2_D_4.yaml'
@@ -10,9 +10,10 @@ class Instances:
         self.time_scale = 1
         self.max_episode_steps = 100
         print('using {}'.format(instance_name))
-        self.environment = Agent(x_limit=self.x_limit, y_limit=self.y_limit, start_at=start_at, arrival_at=arrival_at, \
-            tower_location=tower_location, dv_required=dv_required, control_time_scale=self.time_scale, \
-            phi_config_file = self.phi_model_name, save_file=instance_name, action_type ='BangSingular')
+        # nothing is built here, registry.make builds the environment on the first use of self.environment
+        super().__init__(registry.Env_Spec(instance_name=instance_name, tower_location=tower_location, start_at=start_at, arrival_at=arrival_at, \
+            dv_required=dv_required, action_type='BangSingular', x_limit=self.x_limit, y_limit=self.y_limit, phi_config_file=self.phi_model_name, \
+            control_time_scale=self.time_scale, max_episode_steps=self.max_episode_steps))
         
 
 # e1 = Instances(instance_name='config_1', tower_location=[[3, 1], [6, 7], [8, 2], [1, 6], [3, 9]],\
@@ -0,0 +1,52 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.dirname(__file__) + '/../..'))
+
+from trainerV2.MA_PPO.scripts.PPO_continuous_main import PPO_GameAgent
+from trainerV2.MA_PPO.data.ma_env_list import env_list
+from utils import tools
+from utils import io
+import numpy as np
+
+SEED = 10
+config_name = 'config_5'
+vanilla_model_name = 'Aug18-21_02-ppo_stationary_vanilla'
+robust_model_name = 'Aug23-04_49-ppo_stationary_robust_KL' ## for performance
+
+vanilla_model_dir = 'cache/results/{}/seed_{}/{}/model/'.format(config_name, SEED, vanilla_model_name)
+robust_model_dir = 'cache/results/{}/seed_{}/{}/model/'.format(config_name, SEED, robust_model_name)
+output_dir = 'cache/results/{}/seed_{}/ppo_stationary_evaluation/'.format(config_name, SEED)
+
+## NOTE: tolerance is in units of the action mean (angle fraction for MA_Continuous); 0.01 ~ 3.6 degrees
+TOLERANCE = 0.01
+## NOTE: deltas are in the input units of the actor (normalized states with use_state_norm), like args.delta of evaluate_robust
+MAX_DELTA = 0.2
+## a few points of the evaluate_robust_radius.py sweep to cross-check the certified radius against rollouts
+check_deltas = [0.01, 0.05, 0.1, 0.2]
+
+if __name__ == "__main__":
+    tools.setup_seed(10)
+    args = tools.load_config("configs/config_ppo_default.yaml")
+    args = tools.dict2class(args)
+    args.delta = 0
+    args.adv_lr = 0.005
+    args.type_reward = 'Lagrangian'
+    tools.mkdir(output_dir)
+
+    summary = []
+    for name, model_dir in [('vanilla', vanilla_model_dir), ('robust', robust_model_dir)]:
+        dirs = {'actor': model_dir, 'critic': model_dir}
+        PPO_agent = PPO_GameAgent(args=args, output_dir=model_dir, train_mode=False)
+        radius, steps, checks = PPO_agent.evaluate_certified(env=env_list[0].environment, dirs=dirs, tolerance=TOLERANCE,
+                                                              max_delta=MAX_DELTA, check_deltas=check_deltas)
+
+        for delta, sound, observed, certified in checks:
+            # Monte-Carlo rollouts at the same noise level, as in evaluate_robust_radius.py
+            args.delta = delta
+            _, _, _, mc_steps, mc_var_steps, _ = PPO_agent.evaluate_robust(env=env_list[0].environment, dirs=dirs, noise_type='random', seed=1000, plot=False)
+            summary.append([name, TOLERANCE, round(radius.min(), 4), round(radius.mean(), 4), steps, delta, sound,
+                            round(observed, 4), round(certified, 4), round(mc_steps, 4), round(mc_var_steps, 4)])
+        args.delta = 0
+
+    header = ['model', 'tolerance', 'min_radius', 'mean_radius', 'clean_steps', 'delta', 'sound',
+              'observed_deviation', 'certified_deviation', 'mc_steps', 'mc_var_steps']
+    io.save_csv(output_dir=output_dir, name='certified_radius', headers=header, logs=summary)
@@ -4,7 +4,7 @@ sys.path.append(os.path.abspath(os.path.dirname(__file__) + '/../..'))
 from trainerV2.MA_PPO.scripts.PPO_continuous_main import PPO_GameAgent
 # from scripts.continuous.test_moving import env_list
 from trainerV2.MA_PPO.data.ma_env_list import env_list
-from utils import tools
+from utils import tools, registry
 from utils import io
 
 SEED = 10
@@ -58,3 +58,4 @@ if __name__ == "__main__":
         header = ['mode', 'final rewards', 'var_reward', 'min_reward', 'final steps', 'var_steps', 'max_steps','model_dir', 'adv_dir', 'perturb']
     # io.save_log(output_dir=output_dir, logs=summary)
     io.save_csv(output_dir=output_dir, name='evaluation_result', headers=header, logs=summary)
+    print(registry.models.summary())
@@ -1,10 +1,8 @@
 import sys, os
 sys.path.append(os.path.abspath(os.path.dirname(__file__) + '/../..'))
 
-from trainerV2.MA_PPO.scripts.PPO_continuous_main import PPO_GameAgent
 # from scripts.continuous.test_moving import env_list
-from trainerV2.MA_PPO.data.ma_env_list import env_list
-from utils import tools, graph
+from utils import tools, graph, eval_pool
 from utils import io
 import numpy as np
 
@@ -18,6 +16,7 @@ vanilla_model_dir = 'cache/results/{}/seed_{}/{}/model/'.format(config_name, SEE
 robust_model_dir = 'cache/results/{}/seed_{}/{}/model/'.format(config_name, SEED, robust_model_name)
 adv_model_dir = 'cache/results/{}/seed_{}/{}/model/'.format(config_name, SEED, robust_model_name)
 output_dir = 'cache/results/{}/seed_{}/ppo_stationary_evaluation/'.format(config_name, SEED)
+WORKERS = 4
 
 if __name__ == "__main__":
     tools.setup_seed(10)
@@ -30,40 +29,24 @@ if __name__ == "__main__":
     
     # output_dir = output_dir + 'delta_{}/'.format(args.delta)
     noise_level = np.linspace(0.0, 0.2, num=101)
-    vanilla_mean = []
-    vanilla_std = []
-    robust_mean = []
-    robust_std = []
-
-    for i in range(len(noise_level)):
-        print('vanilla {}'.format(i))
-        dirs = {}
-        dirs['actor'] = vanilla_model_dir
-        dirs['critic'] = vanilla_model_dir
-
-        args.delta = noise_level[i]
-        PPO_agent = PPO_GameAgent(args=args, output_dir=vanilla_model_dir, train_mode=False)
-        reward, var_reward, min_reward, step, var_steps, max_steps = PPO_agent.evaluate_robust(env=env_list[0].environment, dirs=dirs, noise_type='random',  seed = 1000, plot=False)
-        vanilla_mean.append(step)
-        vanilla_std.append(var_steps)
-        print(step, var_steps)
-
-    for i in range(len(noise_level)):
-        print('robust {}'.format(i))
-        dirs = {}
-        dirs['actor'] = robust_model_dir
-        dirs['critic'] = robust_model_dir
-
-        args.delta = noise_level[i]
-        PPO_agent = PPO_GameAgent(args=args, output_dir=robust_model_dir, train_mode=False)
-        reward, var_reward, min_reward, step, var_steps, max_steps = PPO_agent.evaluate_robust(env=env_list[0].environment, dirs=dirs, noise_type='random',  seed = 1000, plot=False)
-        robust_mean.append(step)
-        robust_std.append(var_steps)
-        print(step, var_steps)
-
+    # every (model, noise level) is a task of the pre-warmed pool, workers keep the env and both models loaded
+    tasks = []
+    for model_dir in [vanilla_model_dir, robust_model_dir]:
+        for i in range(len(noise_level)):
+            tasks.append({'dirs': {'actor': model_dir, 'critic': model_dir}, 'env': 'trainerV2.MA_PPO.data.ma_env_list:0',
+                          'noise': {'type': 'random', 'delta': float(noise_level[i])}, 'seed': 1000, 'output_dir': model_dir,
+                          'args': {'adv_lr': args.adv_lr, 'type_reward': args.type_reward}})
+    with eval_pool.Eval_Pool(workers=WORKERS, preload=['trainerV2.MA_PPO.data.ma_env_list:0']) as pool:
+        results = pool.map(tasks)
+    for task, result in zip(tasks, results):
+        if 'error' in result:
+            sys.exit('{} delta {} failed:\n{}'.format(task['dirs']['actor'], task['noise']['delta'], result['error']))
+    vanilla_mean = [result['steps'] for result in results[:len(noise_level)]]
+    vanilla_std = [result['var_steps'] for result in results[:len(noise_level)]]
+    robust_mean = [result['steps'] for result in results[len(noise_level):]]
+    robust_std = [result['var_steps'] for result in results[len(noise_level):]]
 
     graph.plot_robust_radius(name_arr=['non-smooth', 'smooth'], noise_level=noise_level, mean_arr=[np.array(vanilla_mean), np.array(robust_mean)], std_arr=[np.array(vanilla_std), np.array(robust_std)])
         #summary.append('mode: {}, final rewards: {}, var_reward: {}, final steps: {}, var_steps:{}, model_dir: {}, adv_dir: {}, perturb:{}'
         #    .format(mode, round(reward, 4), round(var_reward, 4), round(step, 4), round(var_steps, 4), eval_info[mode]['model_dir'], eval_info[mode]['adv_model'], args.delta))
-        
-        
\ No newline at end of file
+    print(eval_pool.summary(results))
@@ -4,7 +4,7 @@ sys.path.append(os.path.abspath(os.path.dirname(__file__) + '/../..'))
 from trainerV2.Robust_PPO.scripts.PPO_continuous_main import PPO_GameAgent
 # from scripts.continuous.test_moving import env_list
 from trainerV2.MA_PPO.data.ma_env_list import env_list
-from utils import tools
+from utils import tools, registry
 from utils import io
 
 SEED = 10
@@ -45,4 +45,5 @@ if __name__ == "__main__":
         summary.append('mode: {}, final rewards: {}, var_reward: {}, final steps: {}, var_steps:{}, model_dir: {}, adv_dir: {}, perturb:{}'
             .format(mode, round(reward, 4), round(var_reward, 4), round(step, 4), round(var_steps, 4), eval_info[mode]['model_dir'], eval_info[mode]['adv_model'], args.delta))
         
-    io.save_log(output_dir=output_dir, logs=summary)
\ No newline at end of file
+    io.save_log(output_dir=output_dir, logs=summary)
+    print(registry.models.summary())
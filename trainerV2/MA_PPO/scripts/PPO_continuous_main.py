@@ -1,9 +1,8 @@
 import numpy as np
-from torch.utils.tensorboard import SummaryWriter
 from trainerV2.MA_PPO.scripts.normalization import Normalization, RewardScaling
 from trainerV2.MA_PPO.scripts.replaybuffer import ReplayBuffer
 from trainerV2.MA_PPO.scripts.ppo_continuous import PPO_continuous
-from utils import tools, monitor
+from utils import tools, monitor, bounds, registry, metrics
 from loguru import logger
 from datetime import datetime
 
@@ -19,9 +18,9 @@ class PPO_GameAgent():
         self.output_dir = output_dir
 
         if train_mode and not debug:
-            self.running_summary = SummaryWriter(log_dir='cache/runs/' + '{}-{}-{}'.format(current_time, args.run_name, args.seed))
+            self.running_summary = metrics.summary_writer(log_dir='cache/runs/' + '{}-{}-{}'.format(current_time, args.run_name, args.seed))
         elif debug:
-            self.running_summary = SummaryWriter(log_dir='cache/runs/' + 'debug')
+            self.running_summary = metrics.summary_writer(log_dir='cache/runs/' + 'debug')
 
         if train_mode:
             self.output_dir = output_dir + '{}-{}'.format(current_time, args.run_name) + '/'
@@ -56,6 +55,7 @@ class PPO_GameAgent():
 
             agent = PPO_continuous(args, load_model=load_model, chkpt_dir=self.output_dir + '/model/')
             state_norm = Normalization(shape=args.state_dim)  # Trick 2:state normalization
+            state_norm.load_checkpoint(self.output_dir + '/model/state_norm')
             if args.use_reward_norm:  # Trick 3:reward normalization
                 reward_norm = Normalization(shape=1)
             elif args.use_reward_scaling:  # Trick 4:reward scaling
@@ -95,7 +95,7 @@ class PPO_GameAgent():
                     tools.mkdir(self.output_dir+'/best_case/')
                     self.best_reward = evaluate_reward / times
                     stats.save(sub_dir = self.output_dir+'/best_case/', plot = True)
-                    agent.save_models()
+                    agent.save_models(state_norm=state_norm)
 
                 if self.eval_times % 20 == 0:
                     tools.mkdir(self.output_dir+'/tmp_case/')
@@ -120,13 +120,10 @@ class PPO_GameAgent():
         args.max_episode_steps = env._max_episode_steps
         args.use_orthogonal_init = False
 
-        agent = PPO_continuous(args, chkpt_dir=self.output_dir + '/model/')
-        agent.actor.load_checkpoint(chkpt_dir=dirs['actor'])
-        agent.critic.load_checkpoint(chkpt_dir=dirs['critic'])
-        if noise_type == 'adv':
-            agent.adv_net.load_checkpoint(chkpt_dir=dirs['adv_net'])
+        # loaded once per process, later modes / noise levels of the same run reuse the cached agent
+        agent = registry.models.ppo_agent(PPO_continuous, args, dirs, load_adv=noise_type == 'adv')
 
-        state_norm = Normalization(shape=args.state_dim)  # Trick 2:state normalization
+        state_norm = registry.models.state_norm(Normalization, dirs['actor'] + 'state_norm', args.state_dim)  # Trick 2:state normalization
         if args.use_reward_norm:  # Trick 3:reward normalization
             reward_norm = Normalization(shape=1)
         elif args.use_reward_scaling:  # Trick 4:reward scaling
@@ -179,6 +176,46 @@ class PPO_GameAgent():
            
         return evaluate_reward / times, np.std(np.array(episode_rewards)), np.min(np.array(episode_rewards)), np.mean(np.array(episode_steps)), np.var(np.array(episode_steps)), np.max(np.array(episode_steps))
 
+    def evaluate_certified(self, env, dirs, tolerance, max_delta = 1.0, check_deltas = [], num_samples = 100, one_sided = True):
+        # NOTE: certified counterpart of evaluate_robust: one clean episode, then interval bounds over all visited states.
+        # With use_state_norm the states are normalized by the saved state_norm first, so the radius (like the noise
+        # of evaluate_robust) is measured in normalized input units, the space the actor sees
+        args = self.args
+        args.state_dim = len(env.get_state())
+        args.action_dim = env.action_space.shape
+        args.max_action = float(env.action_space.high)
+        args.num_agents = env.board.agents.num_agents
+        args.max_episode_steps = env._max_episode_steps
+        args.use_orthogonal_init = False
+
+        agent = PPO_continuous(args, chkpt_dir=self.output_dir + '/model/')
+        agent.actor.load_checkpoint(chkpt_dir=dirs['actor'])
+        state_norm = registry.models.state_norm(Normalization, dirs['actor'] + 'state_norm', args.state_dim)
+
+        states = []
+        s = env.reset()
+        if args.use_state_norm:
+            s = state_norm(s, update=False)
+        done = False
+        while not done and env.num_steps < 200:
+            states.append(s)
+            a = agent.evaluate(s)
+            s, r, done, position = env.step(a, args)
+            if args.use_state_norm:
+                s = state_norm(s, update=False)
+
+        radius = bounds.certified_radius(agent.actor, states, tolerance=tolerance, max_delta=max_delta, one_sided=one_sided)
+        logger.success('certified radius over {} states: min {} mean {}'.format(len(states), radius.min(), radius.mean()))
+
+        checks = []
+        for delta in check_deltas:
+            check = bounds.monte_carlo_check(agent.actor, states, delta, num_samples=num_samples, one_sided=one_sided)
+            if not check['sound']:
+                logger.critical('monte carlo sample escaped the certified bounds at delta {}'.format(delta))
+            checks.append([delta, check['sound'], check['observed_deviation'].max(), check['certified_deviation'].max()])
+
+        return radius, env.num_steps, checks
+
     def main(self, args, env):
         self.total_eval = args.max_train_steps / args.evaluate_freq
         self.best_num_steps = float('inf')
@@ -220,9 +257,12 @@ class PPO_GameAgent():
 
         self.learning_monitor = monitor.Learning_Monitor(output_dir=self.output_dir+'/logs/', name='ppo', args=args)
         self.learning_monitor.save_log()
+        self.metrics = metrics.Metrics_Sink(self.running_summary, log_file=self.output_dir + '/logs/metrics.jsonl')
+        self.plateau = monitor.plateau_detector(args)
 
         self.timer.start()
-        while total_steps < args.max_train_steps:
+        self.stopped = False
+        while total_steps < args.max_train_steps and not self.stopped:
             s = env.reset()
             if args.use_state_norm:
                 s = state_norm(s)
@@ -230,7 +270,7 @@ class PPO_GameAgent():
                 reward_scaling.reset()
             episode_steps = 0
             done = False
-            while not done:
+            while not done and not self.stopped:
                 episode_steps += 1
                 a, a_logprob = agent.choose_action(s)  # Action and the corresponding log probability
                 if args.policy_dist == "Beta":
@@ -273,20 +313,20 @@ class PPO_GameAgent():
                     evaluate_reward, steps = self.evaluate_policy(args, env, agent, state_norm)
                     evaluate_rewards.append(evaluate_reward)
                     self.learning_monitor.store(evaluate_reward, steps)
-                    self.running_summary.add_scalar('info/rewards', evaluate_reward, total_steps)
-                    self.running_summary.add_scalar('info/best_steps', self.best_num_steps, total_steps)
-                    self.running_summary.add_scalar('info/best_rewards', self.best_reward, total_steps)
-                    self.running_summary.add_scalar('info/average_rewards', self.learning_monitor.average(50), total_steps)
-
-                    self.running_summary.add_scalar('adv_loss/adv_loss', agent.adv_loss, total_steps)
-                    self.running_summary.add_histogram("layer1.bias", agent.adv_net.fc1.bias, total_steps)
-                    self.running_summary.add_histogram("conv1.weight", agent.adv_net.fc1.weight, total_steps)
-                    self.running_summary.add_histogram("conv2.bias", agent.adv_net.fc2.bias, total_steps)
-                    self.running_summary.add_histogram("conv2.weight", agent.adv_net.fc2.weight, total_steps)
+                    self.metrics.scalar('info/rewards', evaluate_reward, total_steps)
+                    self.metrics.scalar('info/best_steps', self.best_num_steps, total_steps)
+                    self.metrics.scalar('info/best_rewards', self.best_reward, total_steps)
+                    self.metrics.scalar('info/average_rewards', self.learning_monitor.average(50), total_steps)
+                    if agent.train_adv:
+                        self.metrics.scalar('adv_loss/adv_loss', agent.adv_loss, total_steps)
+                        self.metrics.histograms('adv_net', agent.adv_net, total_steps)
                     logger.success("evaluate_reward:{}".format(evaluate_reward))
                     # agent.actor.save_checkpoint(mode='tmp')
                     # agent.critic.save_checkpoint(mode='tmp')
+                    if self.plateau is not None and self.plateau.should_stop(total_steps, self.learning_monitor):
+                        self.stopped = True
                     self.timer.start()
+        self.metrics.close()
         self.learning_monitor.plot_average_learning_curve(50)
         self.learning_monitor.plot_learning_curve()
         self.learning_monitor.plot_steps_curve()
@@ -3,7 +3,7 @@ import torch.nn.functional as F
 from torch.utils.data.sampler import BatchSampler, SubsetRandomSampler
 import torch.nn as nn
 from torch.distributions import Beta, Normal
-from utils import tools
+from utils import tools, checkpoint
 import os
 from trainerV2.Robust_PPO.scripts import adversarial
 
@@ -328,11 +328,12 @@ class PPO_continuous():
         for p in self.optimizer_critic.param_groups:
             p['lr'] = lr_c_now
             
-    def save_models(self, mode = 'Default'):
-        self.actor.save_checkpoint(mode=mode)
-        self.critic.save_checkpoint(mode=mode)
-        if self.train_adv:
-            self.adv_net.save_checkpoint(mode=mode)
+    def save_models(self, mode = 'Default', state_norm = None):
+        # one background job for the networks and the state normalizer they were evaluated with (utils/checkpoint.py)
+        networks = [self.actor, self.critic] + ([self.adv_net] if self.train_adv else [])
+        files = {tools.checkpoint_path(network.checkpoint_file, mode): network.state_dict() for network in networks}
+        pickled = {os.path.join(os.path.dirname(self.actor.checkpoint_file), 'state_norm'): state_norm.state_dict()} if state_norm is not None else {}
+        checkpoint.writer().save(os.path.dirname(self.actor.checkpoint_file) + mode, files, pickled=pickled)
 
     def load_models(self, mode = 'Default'):
         self.actor.load_checkpoint(mode=mode)
@@ -1,9 +1,8 @@
 import numpy as np
-from torch.utils.tensorboard import SummaryWriter
 from trainer.PPO.normalization import Normalization, RewardScaling
 from trainer.PPO.replaybuffer import ReplayBuffer
 from trainerV2.PPO.ppo_continuous import PPO_continuous
-from utils import tools, monitor
+from utils import tools, monitor, metrics
 from loguru import logger
 from datetime import datetime
 
@@ -15,7 +14,7 @@ class PPO_GameAgent():
         now = datetime.now()
         current_time = now.strftime("%H_%M_%S")
         
-        self.running_summary = SummaryWriter(log_dir=self.output_dir+'/runs/' + 'ppo_{}'.format(current_time))
+        self.running_summary = metrics.summary_writer(log_dir=self.output_dir+'/runs/' + 'ppo_{}'.format(current_time))
         tools.setup_seed(args.random_seed)
         tools.mkdir(output_dir+'/model/')
         tools.mkdir(output_dir+'/logs/')
@@ -1,4 +1,4 @@
-from environments.v2.game import Agent
+from environments import registry
 # from environments.v1.tasks import Single_Task
 
 class Instances:
@@ -11,15 +11,13 @@ class Instances:
         self.time_scale = 1
         self.max_episode_steps = 100
         print('using {}'.format(self.instance_name))
-        self.environment_list = []
+        self.environment_list = registry.Env_List()
 
     def add_mission(self, start_at, arrival_at, dv_required):
         print('adding {}'.format(self.instance_name))
-        environment = Agent(x_limit=self.x_limit, y_limit=self.y_limit, start_at=start_at, arrival_at=arrival_at, \
-            tower_location=self.tower_location, dv_required=dv_required, control_time_scale=self.time_scale, \
-                phi_config_file = self.phi_model_name, save_file=self.instance_name, action_type ='Continuous')
-
-        self.environment_list.append(environment)
+        self.environment_list.append(registry.Env_Spec(instance_name=self.instance_name, tower_location=self.tower_location, start_at=start_at, \
+            arrival_at=arrival_at, dv_required=dv_required, action_type='Continuous', x_limit=self.x_limit, y_limit=self.y_limit, \
+            phi_config_file=self.phi_model_name, control_time_scale=self.time_scale, max_episode_steps=self.max_episode_steps))
 
     def get_mission(self, index):
         return self.environment_list[index]
@@ -1,9 +1,8 @@
 import numpy as np
-from torch.utils.tensorboard import SummaryWriter
 from trainerV2.Robust_PPO.scripts.normalization import Normalization, RewardScaling
 from trainerV2.Robust_PPO.scripts.replaybuffer import ReplayBuffer
 from trainerV2.Robust_PPO.scripts.ppo_continuous import PPO_continuous
-from utils import tools, monitor
+from utils import tools, monitor, registry, metrics
 from loguru import logger
 from datetime import datetime
 
@@ -18,9 +17,9 @@ class PPO_GameAgent():
         self.output_dir = output_dir
 
         if train_mode and not debug:
-            self.running_summary = SummaryWriter(log_dir='cache/runs/' + '{}-{}-{}'.format(current_time, args.run_name, args.seed))
+            self.running_summary = metrics.summary_writer(log_dir='cache/runs/' + '{}-{}-{}'.format(current_time, args.run_name, args.seed))
         elif debug:
-            self.running_summary = SummaryWriter(log_dir='cache/runs/' + 'debug')
+            self.running_summary = metrics.summary_writer(log_dir='cache/runs/' + 'debug')
 
         if train_mode:
             self.output_dir = output_dir + '{}-{}'.format(current_time, args.run_name) + '/'
@@ -55,6 +54,7 @@ class PPO_GameAgent():
 
             agent = PPO_continuous(args, load_model=load_model, chkpt_dir=self.output_dir + '/model/')
             state_norm = Normalization(shape=args.state_dim)  # Trick 2:state normalization
+            state_norm.load_checkpoint(self.output_dir + '/model/state_norm')
             if args.use_reward_norm:  # Trick 3:reward normalization
                 reward_norm = Normalization(shape=1)
             elif args.use_reward_scaling:  # Trick 4:reward scaling
@@ -94,7 +94,7 @@ class PPO_GameAgent():
                 if evaluate_reward / times > self.best_reward:
                     self.best_reward = evaluate_reward / times
                     stats.save(sub_dir = self.output_dir, plot = True)
-                    agent.save_models()
+                    agent.save_models(state_norm=state_norm)
         
         return evaluate_reward / times
 
@@ -114,13 +114,10 @@ class PPO_GameAgent():
         args.max_episode_steps = env._max_episode_steps
         args.use_orthogonal_init = False
 
-        agent = PPO_continuous(args, chkpt_dir=self.output_dir + '/model/')
-        agent.actor.load_checkpoint(chkpt_dir=dirs['actor'])
-        agent.critic.load_checkpoint(chkpt_dir=dirs['critic'])
-        if noise_type == 'adv':
-            agent.adv_net.load_checkpoint(chkpt_dir=dirs['adv_net'])
+        # loaded once per process, later modes / noise levels of the same run reuse the cached agent
+        agent = registry.models.ppo_agent(PPO_continuous, args, dirs, load_adv=noise_type == 'adv')
 
-        state_norm = Normalization(shape=args.state_dim)  # Trick 2:state normalization
+        state_norm = registry.models.state_norm(Normalization, dirs['actor'] + 'state_norm', args.state_dim)  # Trick 2:state normalization
         if args.use_reward_norm:  # Trick 3:reward normalization
             reward_norm = Normalization(shape=1)
         elif args.use_reward_scaling:  # Trick 4:reward scaling
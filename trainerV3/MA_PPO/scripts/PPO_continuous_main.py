@@ -1,27 +1,38 @@
 import numpy as np
-from torch.utils.tensorboard import SummaryWriter
 from trainerV3.MA_PPO.scripts.normalization import Normalization, RewardScaling
 from trainerV3.MA_PPO.scripts.replaybuffer import ReplayBuffer
 from trainerV3.MA_PPO.scripts.ppo_continuous import PPO_continuous
-from utils import tools, monitor
+from utils import tools, monitor, snapshot, checkpoint, metrics, phases, profiler, memory
 from loguru import logger
 from datetime import datetime
 
 class PPO_GameAgent():
-    def __init__(self, args, output_dir, train_mode=True, debug = False) -> None:
+    def __init__(self, args, output_dir, train_mode=True, debug = False, early_stop = None, pbt = None) -> None:
         self.args = args
         self.timer = tools.Timer()
         self.eval_times = 0
+        self.early_stop = early_stop  # asked with should_stop(total_steps, learning_monitor, model_dir) after every evaluation
+        self.pbt = pbt  # pbt.PBT_Member, may replace the agent state with a better member after an evaluation
         
         now = datetime.now()
         current_time = now.strftime("%b%d-%H_%M")
+        self.snapshot = None
+        self.resume_state = None
+        if train_mode and (getattr(args, 'snapshot_freq', 0) or getattr(args, 'resume', False)):
+            self.snapshot = snapshot.Snapshot(output_dir + 'snapshot/{}/'.format(args.run_name))
+        if self.snapshot is not None and getattr(args, 'resume', False):
+            # a resumed run continues in its original run directory
+            self.resume_state = self.snapshot.load_state()
+            if self.resume_state is not None:
+                current_time = self.resume_state['current_time']
+        self.current_time = current_time
        
         self.output_dir = output_dir
 
         if train_mode and not debug:
-            self.running_summary = SummaryWriter(log_dir='cache/runs/' + '{}-{}-{}'.format(current_time, args.run_name, args.seed))
+            self.running_summary = metrics.summary_writer(log_dir='cache/runs/' + '{}-{}-{}'.format(current_time, args.run_name, args.seed))
         elif debug:
-            self.running_summary = SummaryWriter(log_dir='cache/runs/' + 'debug')
+            self.running_summary = metrics.summary_writer(log_dir='cache/runs/' + 'debug')
 
         if train_mode:
             self.output_dir = output_dir + '{}-{}'.format(current_time, args.run_name) + '/'
@@ -32,6 +43,33 @@ class PPO_GameAgent():
     def train(self, env):
         self.main(args=self.args, env=env)
 
+    def save_snapshot(self, total_steps, evaluate_num, agent, replay_buffer, state_norm, reward_norm, reward_scaling):
+        state = {'current_time': self.current_time, 'total_steps': total_steps, 'evaluate_num': evaluate_num, 'eval_times': self.eval_times,
+                 'best_reward': self.best_reward, 'best_num_steps': self.best_num_steps, 'agent': agent.state_dict(),
+                 'state_norm': state_norm.state_dict(),
+                 'reward_norm': reward_norm.state_dict() if reward_norm is not None else None,
+                 'reward_scaling': reward_scaling.state_dict() if reward_scaling is not None else None,
+                 'monitor': {'rewards': self.learning_monitor.rewards, 'steps': self.learning_monitor.steps},
+                 'rng': snapshot.rng_state()}
+        self.snapshot.save(total_steps, state, buffers={'replay_buffer': replay_buffer})
+
+    def restore_snapshot(self, state, agent, replay_buffer, state_norm, reward_norm, reward_scaling):
+        agent.load_state_dict(state['agent'])
+        state_norm.load_state_dict(state['state_norm'])
+        if reward_norm is not None:
+            reward_norm.load_state_dict(state['reward_norm'])
+        if reward_scaling is not None:
+            reward_scaling.load_state_dict(state['reward_scaling'])
+        self.snapshot.restore_buffers(state, buffers={'replay_buffer': replay_buffer})
+        if replay_buffer.count > 0:
+            # the interrupted episode ends at the last stored transition
+            replay_buffer.done[replay_buffer.count - 1] = 1
+        self.learning_monitor.restore(state['monitor']['rewards'], state['monitor']['steps'])
+        self.eval_times = state['eval_times']
+        self.best_reward, self.best_num_steps = state['best_reward'], state['best_num_steps']
+        snapshot.set_rng_state(state['rng'])
+        return state['total_steps'], state['evaluate_num']
+
     def evaluate(self, env):
         args = self.args
         args.state_dim = len(env.get_state())
@@ -42,7 +80,7 @@ class PPO_GameAgent():
         
         self.evaluate_policy(args=args, env=env, display=True, load_model=True)
 
-    def evaluate_policy(self, args, env, agent=None, state_norm=None, load_model=None, display=False):
+    def evaluate_policy(self, args, env, agent=None, state_norm=None, load_model=None, display=False, total_steps=None):
         if load_model != None:
             logger.success('evaluation mode {}'.format(load_model))
             # logger.success('environment name {}'.format(env.name))
@@ -56,6 +94,7 @@ class PPO_GameAgent():
 
             agent = PPO_continuous(args, load_model=load_model, chkpt_dir=self.output_dir + '/model/')
             state_norm = Normalization(shape=args.state_dim)  # Trick 2:state normalization
+            state_norm.load_checkpoint(self.output_dir + '/model/state_norm')
             if args.use_reward_norm:  # Trick 3:reward normalization
                 reward_norm = Normalization(shape=1)
             elif args.use_reward_scaling:  # Trick 4:reward scaling
@@ -95,7 +134,7 @@ class PPO_GameAgent():
                     tools.mkdir(self.output_dir+'/best_case/')
                     self.best_reward = evaluate_reward / times
                     stats.save(sub_dir = self.output_dir+'/best_case/', plot = True)
-                    agent.save_models()
+                    agent.save_models(step=total_steps, reward=self.best_reward, state_norm=state_norm)
 
                 if self.eval_times % 20 == 0:
                     tools.mkdir(self.output_dir+'/tmp_case/')
@@ -127,6 +166,7 @@ class PPO_GameAgent():
             agent.adv_net.load_checkpoint(chkpt_dir=dirs['adv_net'])
 
         state_norm = Normalization(shape=args.state_dim)  # Trick 2:state normalization
+        state_norm.load_checkpoint(dirs['actor'] + 'state_norm')
         if args.use_reward_norm:  # Trick 3:reward normalization
             reward_norm = Normalization(shape=1)
         elif args.use_reward_scaling:  # Trick 4:reward scaling
@@ -206,6 +246,8 @@ class PPO_GameAgent():
         evaluate_rewards = []  # Record the rewards during the evaluating
         total_steps = 0  # Record the total steps during the training
 
+        # made before the buffers and networks so they are counted by size, not in the startup RSS
+        self.memory = memory.Memory_Accountant(budget_gb=getattr(args, 'memory_budget_gb', None))
         replay_buffer = ReplayBuffer(args)
         agent = PPO_continuous(args, chkpt_dir=self.output_dir + '/model/', train_adv=args.train_adv)
 
@@ -213,6 +255,7 @@ class PPO_GameAgent():
         # writer = SummaryWriter(log_dir='runs/PPO_continuous/env_{}_{}_number_{}_seed_{}'.format(env_name, args.policy_dist, number, seed))
         
         state_norm = Normalization(shape=args.state_dim)  # Trick 2:state normalization
+        reward_norm = reward_scaling = None
         if args.use_reward_norm:  # Trick 3:reward normalization
             reward_norm = Normalization(shape=1)
         elif args.use_reward_scaling:  # Trick 4:reward scaling
@@ -220,9 +263,22 @@ class PPO_GameAgent():
 
         self.learning_monitor = monitor.Learning_Monitor(output_dir=self.output_dir+'/logs/', name='ppo', args=args)
         self.learning_monitor.save_log()
+        self.metrics = metrics.Metrics_Sink(self.running_summary, log_file=self.output_dir + '/logs/metrics.jsonl')
+        self.plateau = monitor.plateau_detector(args)
+        phases.timers.enable(getattr(args, 'profile_phases', False))
+        profile_at_step = getattr(args, 'profile_at_step', None)
+        if getattr(args, 'profile_seconds', 0):
+            profiler.install(self.output_dir + '/logs/', seconds=args.profile_seconds)
+        self.memory.track('replay_buffer', replay_buffer)
+        self.memory.track_agent('ppo', agent)
+        self.memory.track_env('env', env)
+        self.memory.check()
+        if self.resume_state is not None:
+            total_steps, evaluate_num = self.restore_snapshot(self.resume_state, agent, replay_buffer, state_norm, reward_norm, reward_scaling)
 
+        self.stopped = False
         self.timer.start()
-        while total_steps < args.max_train_steps:
+        while total_steps < args.max_train_steps and not self.stopped:
             s = env.reset()
             if args.use_state_norm:
                 s = state_norm(s)
@@ -230,16 +286,21 @@ class PPO_GameAgent():
                 reward_scaling.reset()
             episode_steps = 0
             done = False
-            while not done:
+            while not done and not self.stopped:
                 episode_steps += 1
                 # s = [[0., 1., 0., 1., 0., 1., 0., 0., 0., 0.], [0., 1., 0., 1., 0., 1., 0., 0., 0., 0.]]
-                a, a_logprob = agent.choose_action(s)  # Action and the corresponding log probability
+                with phases.timers.phase('action'):
+                    a, a_logprob = agent.choose_action(s)  # Action and the corresponding log probability
                 if args.policy_dist == "Beta":
                     action = 2 * (a - 0.5) * args.max_action  # [0,1]->[-max,max]
                 else:
                     action = a
 
-                s_, r, done, _ = env.step(action, args)
+                with phases.timers.phase('env_step'):
+                    s_, r, done, _ = env.step(action, args)
+                phases.timers.count('steps')
+                if total_steps == profile_at_step:
+                    profiler.start()
 
                 if args.use_state_norm:
                     s_ = state_norm(s_)
@@ -257,13 +318,16 @@ class PPO_GameAgent():
                     dw = False
 
                 # Take the 'action'，but store the original 'a'（especially for Beta）
-                replay_buffer.store(s, a, a_logprob, r, s_, dw, done)
+                with phases.timers.phase('buffer_store'):
+                    replay_buffer.store(s, a, a_logprob, r, s_, dw, done)
                 s = s_
                 total_steps += 1
 
                 # When the number of transitions in buffer reaches batch_size,then update
                 if replay_buffer.count == args.batch_size:
-                    agent.update(replay_buffer, total_steps)
+                    with phases.timers.phase('update'):
+                        agent.update(replay_buffer, total_steps)
+                    phases.timers.count('updates')
                     replay_buffer.count = 0
 
                 # Evaluate the policy every 'evaluate_freq' steps
@@ -271,23 +335,42 @@ class PPO_GameAgent():
                     self.timer.stop()
                     logger.success("evaluate_num:{} left: {} - {}%".format(evaluate_num, self.total_eval - evaluate_num, (self.total_eval - evaluate_num)/self.total_eval*100))
                     evaluate_num += 1
-                    evaluate_reward = self.evaluate_policy(args, env, agent, state_norm)
+                    with phases.timers.phase('evaluation'):
+                        evaluate_reward = self.evaluate_policy(args, env, agent, state_norm, total_steps=total_steps)
                     evaluate_rewards.append(evaluate_reward)
-                    self.learning_monitor.store(evaluate_reward)
-                    self.running_summary.add_scalar('info/rewards', evaluate_reward, total_steps)
-                    self.running_summary.add_scalar('info/best_steps', self.best_num_steps, total_steps)
-                    self.running_summary.add_scalar('info/best_rewards', self.best_reward, total_steps)
-                    self.running_summary.add_scalar('info/average_rewards', self.learning_monitor.average(50), total_steps)
-
-                    self.running_summary.add_scalar('adv_loss/adv_loss', agent.adv_loss, total_steps)
-                    self.running_summary.add_histogram("layer1.bias", agent.adv_net.fc1.bias, total_steps)
-                    self.running_summary.add_histogram("conv1.weight", agent.adv_net.fc1.weight, total_steps)
-                    self.running_summary.add_histogram("conv2.bias", agent.adv_net.fc2.bias, total_steps)
-                    self.running_summary.add_histogram("conv2.weight", agent.adv_net.fc2.weight, total_steps)
+                    self.learning_monitor.store(evaluate_reward, env.num_steps)
+                    self.metrics.scalar('info/rewards', evaluate_reward, total_steps)
+                    self.metrics.scalar('info/best_steps', self.best_num_steps, total_steps)
+                    self.metrics.scalar('info/best_rewards', self.best_reward, total_steps)
+                    self.metrics.scalar('info/average_rewards', self.learning_monitor.average(50), total_steps)
+                    if agent.train_adv:
+                        self.metrics.scalar('adv_loss/adv_loss', agent.adv_loss, total_steps)
+                        self.metrics.histograms('adv_net', agent.adv_net, total_steps)
+                    if phases.timers.enabled:
+                        self.metrics.scalars('perf', phases.timers.report(), total_steps)
+                    self.metrics.scalars('memory', self.memory.report(), total_steps)
                     logger.success("evaluate_reward:{}".format(evaluate_reward))
                     # agent.actor.save_checkpoint(mode='tmp')
                     # agent.critic.save_checkpoint(mode='tmp')
+                    if self.early_stop is not None and self.early_stop.should_stop(total_steps, self.learning_monitor, self.output_dir + '/model/'):
+                        self.stopped = True
+                    if self.plateau is not None and self.plateau.should_stop(total_steps, self.learning_monitor):
+                        self.stopped = True
+                    if self.pbt is not None and self.pbt.step(total_steps, self.learning_monitor, agent, state_norm, reward_scaling):
+                        self.metrics.scalars('pbt/hyperparameters', self.pbt.get_hyperparameters(agent), total_steps)
                     self.timer.start()
+
+                if self.snapshot is not None and args.snapshot_freq and total_steps % args.snapshot_freq == 0:
+                    with phases.timers.phase('artifact_io'):
+                        self.save_snapshot(total_steps, evaluate_num, agent, replay_buffer, state_norm, reward_norm, reward_scaling)
+        with phases.timers.phase('artifact_io'):
+            checkpoint.flush()
+            if self.snapshot is not None:
+                self.snapshot.clear()
+        if phases.timers.enabled:
+            phases.timers.dump(self.output_dir + '/logs/phases.json')
+        self.total_steps = total_steps
+        self.metrics.close()
         self.learning_monitor.plot_average_learning_curve(50)
         self.learning_monitor.plot_learning_curve()
         self.learning_monitor.dump_to_file()
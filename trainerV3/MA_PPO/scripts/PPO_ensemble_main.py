@@ -0,0 +1,177 @@
+import numpy as np
+from trainerV3.MA_PPO.scripts.normalization import Normalization, RewardScaling
+from trainerV3.MA_PPO.scripts.replaybuffer import Ensemble_ReplayBuffer
+from trainerV3.MA_PPO.scripts.ppo_ensemble import PPO_ensemble
+from utils import tools, monitor, metrics
+from loguru import logger
+from datetime import datetime
+
+class PPO_EnsembleAgent():
+    '''
+        Trains one PPO_continuous learner per seed in a single process: every seed has its own copy of the
+        environment, normalizers, monitor, tensorboard run and output directory (laid out as in train_ppo_vanilla.py),
+        while the networks of all seeds are updated together by PPO_ensemble.
+    '''
+    def __init__(self, args, seeds, output_dir) -> None:
+        self.args = args
+        self.seeds = seeds
+        self.num_members = len(seeds)
+        self.timer = tools.Timer()
+
+        now = datetime.now()
+        current_time = now.strftime("%b%d-%H_%M")
+        self.args.run_info = '{}_{}'.format(current_time, args.run_name)
+
+        self.output_dirs = []
+        self.running_summaries = []
+        for seed in seeds:
+            member_dir = output_dir + 'seed_{}/'.format(seed) + '{}-{}'.format(current_time, args.run_name) + '/'
+            tools.mkdir(member_dir+'/model/')
+            tools.mkdir(member_dir+'/logs/')
+            self.output_dirs.append(member_dir)
+            self.running_summaries.append(metrics.summary_writer(log_dir='cache/runs/' + '{}-{}-{}'.format(current_time, args.run_name, seed)))
+
+    def train(self, env):
+        self.main(args=self.args, env=env)
+
+    def evaluate_policy(self, args, envs, agent, state_norms):
+        # all members are evaluated in lockstep so the policy forward stays batched
+        times = 3
+        evaluate_reward = np.zeros(self.num_members)
+        num_steps = np.zeros(self.num_members)
+        for _ in range(times):
+            s = [env.reset() for env in envs]
+            if args.use_state_norm:
+                s = [state_norms[i](s[i], update=False) for i in range(self.num_members)]
+            active = np.ones(self.num_members, dtype=bool)
+            while active.any():
+                a = agent.evaluate(np.array(s))  # We use the deterministic policy during the evaluating
+                for i in np.flatnonzero(active):
+                    s_, r, done, _ = envs[i].step(a[i], args)
+                    if args.use_state_norm:
+                        s_ = state_norms[i](s_, update=False)
+                    evaluate_reward[i] += r
+                    s[i] = s_
+                    active[i] = not done and envs[i].num_steps < 200
+            num_steps += [min(env.num_steps, 200) for env in envs]
+
+        evaluate_reward = evaluate_reward / times
+        for i in range(self.num_members):
+            stats = envs[i].view()
+            if envs[i].num_steps < self.best_num_steps[i]:
+                self.best_num_steps[i] = envs[i].num_steps
+            if evaluate_reward[i] > self.best_reward[i]:
+                tools.mkdir(self.output_dirs[i]+'/best_case/')
+                self.best_reward[i] = evaluate_reward[i]
+                stats.save(sub_dir = self.output_dirs[i]+'/best_case/', plot = True)
+                agent.save_models(i, state_norm=state_norms[i])
+
+        return evaluate_reward, num_steps / times
+
+    def main(self, args, env):
+        self.total_eval = args.max_train_steps / args.evaluate_freq
+        self.best_num_steps = np.full(self.num_members, float('inf'))
+        self.best_reward = np.full(self.num_members, -float('inf'))
+
+        logger.success('total {} evals for {} seeds'.format(self.total_eval, self.num_members))
+        logger.success(env.action_type)
+
+        args.state_dim = len(env.get_state())
+        args.action_dim = env.action_space.shape
+        args.max_action = float(env.action_space.high)
+        args.max_episode_steps = env._max_episode_steps  # Maximum number of steps per episode
+        args.num_agents = env.board.agents.num_agents
+        if getattr(args, 'train_adv', False):
+            logger.critical('adversarial training is not supported by the ensemble trainer')
+
+        envs = [env.clone() for _ in range(self.num_members)]
+        eval_envs = [env.clone() for _ in range(self.num_members)]
+
+        evaluate_num = 0  # Record the number of evaluations
+        total_steps = 0  # Record the total steps during the training (per seed)
+
+        replay_buffer = Ensemble_ReplayBuffer(args, self.num_members)
+        agent = PPO_ensemble(args, seeds=self.seeds, chkpt_dirs=[output_dir + '/model/' for output_dir in self.output_dirs])
+
+        state_norms = [Normalization(shape=args.state_dim) for _ in range(self.num_members)]  # Trick 2:state normalization
+        if args.use_reward_norm:  # Trick 3:reward normalization
+            reward_norms = [Normalization(shape=1) for _ in range(self.num_members)]
+        elif args.use_reward_scaling:  # Trick 4:reward scaling
+            reward_scalings = [RewardScaling(shape=1, gamma=args.gamma) for _ in range(self.num_members)]
+
+        learning_monitors = []
+        self.metrics = []
+        for i in range(self.num_members):
+            args.seed = self.seeds[i]
+            learning_monitor = monitor.Learning_Monitor(output_dir=self.output_dirs[i]+'/logs/', name='ppo', args=args)
+            learning_monitor.save_log()
+            learning_monitors.append(learning_monitor)
+            self.metrics.append(metrics.Metrics_Sink(self.running_summaries[i], log_file=self.output_dirs[i] + '/logs/metrics.jsonl'))
+
+        s = [envs[i].reset() for i in range(self.num_members)]
+        if args.use_state_norm:
+            s = [state_norms[i](s[i]) for i in range(self.num_members)]
+        episode_steps = np.zeros(self.num_members, dtype=int)
+
+        self.timer.start()
+        while total_steps < args.max_train_steps:
+            a, a_logprob = agent.choose_action(np.array(s))  # Action and the corresponding log probability of every seed
+            s_, r = [None] * self.num_members, np.zeros(self.num_members)
+            dw, done = np.zeros(self.num_members, dtype=bool), np.zeros(self.num_members, dtype=bool)
+            for i in range(self.num_members):
+                episode_steps[i] += 1
+                s_[i], r[i], done[i], _ = envs[i].step(a[i], args)
+                if args.use_state_norm:
+                    s_[i] = state_norms[i](s_[i])
+                # the normalizers return shape (1,) arrays
+                if args.use_reward_norm:
+                    r[i] = reward_norms[i](r[i]).item()
+                elif args.use_reward_scaling:
+                    r[i] = reward_scalings[i](r[i]).item()
+                # dw means dead or win,there is no next state s'
+                dw[i] = done[i] and episode_steps[i] != args.max_episode_steps
+
+            replay_buffer.store(np.array(s), a, a_logprob, r, np.array(s_), dw, done)
+            total_steps += 1
+
+            # every seed runs its own episodes; finished streams restart independently
+            for i in range(self.num_members):
+                if done[i]:
+                    s_[i] = envs[i].reset()
+                    if args.use_state_norm:
+                        s_[i] = state_norms[i](s_[i])
+                    if args.use_reward_scaling:
+                        reward_scalings[i].reset()
+                    episode_steps[i] = 0
+            s = s_
+
+            # When the number of transitions in buffer reaches batch_size,then update
+            if replay_buffer.count == args.batch_size:
+                agent.update(replay_buffer, total_steps)
+                replay_buffer.count = 0
+
+            # Evaluate the policies every 'evaluate_freq' steps
+            if total_steps % args.evaluate_freq == 0:
+                self.timer.stop()
+                logger.success("evaluate_num:{} left: {} - {}%".format(evaluate_num, self.total_eval - evaluate_num, (self.total_eval - evaluate_num)/self.total_eval*100))
+                evaluate_num += 1
+                evaluate_rewards, steps = self.evaluate_policy(args, eval_envs, agent, state_norms)
+                for i in range(self.num_members):
+                    learning_monitors[i].store(evaluate_rewards[i], steps[i])
+                    self.metrics[i].scalar('info/rewards', evaluate_rewards[i], total_steps)
+                    self.metrics[i].scalar('info/steps', steps[i], total_steps)
+                    self.metrics[i].scalar('info/best_steps', self.best_num_steps[i], total_steps)
+                    self.metrics[i].scalar('info/best_rewards', self.best_reward[i], total_steps)
+                    self.metrics[i].scalar('info/average_rewards', learning_monitors[i].average(50), total_steps)
+                logger.success("evaluate_rewards:{}".format(evaluate_rewards))
+                self.timer.start()
+
+        self.total_steps = total_steps
+        for metrics_sink in self.metrics:
+            metrics_sink.close()
+        for learning_monitor in learning_monitors:
+            learning_monitor.plot_average_learning_curve(50)
+            learning_monitor.plot_learning_curve()
+            learning_monitor.plot_steps_curve()
+            learning_monitor.dump_to_file()
+        self.timer.stop()
@@ -0,0 +1,183 @@
+import numpy as np
+from trainerV3.MA_PPO.scripts.normalization import Normalization, RewardScaling
+from trainerV3.MA_PPO.scripts.replaybuffer import Vector_ReplayBuffer
+from trainerV3.MA_PPO.scripts.ppo_continuous import PPO_continuous
+from environments import registry
+from environments.vector import Vector_Env
+from utils import tools, monitor, checkpoint, metrics, phases, memory
+from loguru import logger
+from datetime import datetime
+
+class PPO_MultiAgent():
+    '''
+        Trains one PPO_continuous policy on a whole set of instances: num_envs slots of a vector env
+        (environments/vector.py) each run an instance of the set, the networks read the padded observation through
+        their masked input path. Every evaluation runs one deterministic episode of each evaluation instance; the
+        monitor records the mean reward and steps over them, the best model is the one with the best mean reward.
+    '''
+    def __init__(self, args, output_dir, debug = False, early_stop = None) -> None:
+        self.args = args
+        self.timer = tools.Timer()
+        self.early_stop = early_stop  # asked with should_stop(total_steps, learning_monitor, model_dir) after every evaluation
+
+        now = datetime.now()
+        current_time = now.strftime("%b%d-%H_%M")
+        self.current_time = current_time
+        if not debug:
+            self.running_summary = metrics.summary_writer(log_dir='cache/runs/' + '{}-{}-{}'.format(current_time, args.run_name, args.seed))
+        else:
+            self.running_summary = metrics.summary_writer(log_dir='cache/runs/' + 'debug')
+
+        self.output_dir = output_dir + '{}-{}'.format(current_time, args.run_name) + '/'
+        self.args.run_info = '{}_{}'.format(current_time, args.run_name)
+        tools.mkdir(self.output_dir+'/model/')
+        tools.mkdir(self.output_dir+'/logs/')
+
+    def train(self, specs, eval_specs=None):
+        self.main(args=self.args, specs=specs, eval_specs=eval_specs if eval_specs is not None else specs)
+
+    def evaluate_policy(self, args, eval_env, agent, state_norm, total_steps):
+        def act(s, masks):
+            if args.use_state_norm:
+                s = state_norm(s, update=False)  # During the evaluating,update=False
+            return agent.evaluate_actions(s, masks)  # We use the deterministic policy during the evaluating
+
+        results = eval_env.run_episodes(act, args)
+        evaluate_reward = float(np.mean([result['reward'] for result in results]))
+        num_steps = float(np.mean([result['steps'] for result in results]))
+        solved = float(np.mean([result['solved'] for result in results]))
+        if num_steps < self.best_num_steps:
+            self.best_num_steps = num_steps
+        if evaluate_reward > self.best_reward:
+            self.best_reward = evaluate_reward
+            agent.save_models(step=total_steps, reward=self.best_reward, state_norm=state_norm)
+        return evaluate_reward, num_steps, solved
+
+    def main(self, args, specs, eval_specs):
+        self.total_eval = args.max_train_steps / args.evaluate_freq
+        self.best_num_steps = float('inf')
+        self.best_reward = -float('inf')
+
+        specs, eval_specs = [registry.resolve(spec) for spec in specs], [registry.resolve(spec) for spec in eval_specs]
+        # padded to the largest instance of both sets, the networks see one layout
+        max_agents = max(len(spec.start_at) for spec in specs + eval_specs)
+        max_towers = max(len(spec.tower_location) for spec in specs + eval_specs)
+        venv = Vector_Env(specs, num_envs=args.num_envs, max_agents=max_agents, max_towers=max_towers, seed=args.seed)
+        eval_env = Vector_Env(eval_specs, num_envs=args.num_envs, max_agents=max_agents, max_towers=max_towers, shuffle=False)
+
+        logger.success('total {} evals'.format(self.total_eval))
+        logger.success('trainning on {} instances, {} slots, evaluating on {}'.format(len(venv.specs), args.num_envs, len(eval_env.specs)))
+        logger.success(venv.action_type)
+
+        s, masks = venv.reset()
+        env = venv.envs[0]
+        args.state_dim = venv.observation_dim
+        args.mask_dim = venv.mask_dim
+        args.max_agents = max_agents
+        args.max_towers = max_towers
+        args.num_agents = max_agents
+        args.action_dim = env.action_space.shape
+        args.max_action = float(env.action_space.high)
+        args.max_episode_steps = env._max_episode_steps  # Maximum number of steps per episode
+        if getattr(args, 'train_adv', False):
+            logger.critical('adversarial training is not supported by the multi-instance trainer')
+        args.train_adv = False
+
+        logger.trace("state_dim={}".format(args.state_dim))
+        logger.trace("max_agents={} max_towers={}".format(max_agents, max_towers))
+
+        evaluate_num = 0  # Record the number of evaluations
+        total_steps = 0  # Record the total steps during the training (of all slots)
+        next_evaluation = args.evaluate_freq
+
+        self.memory = memory.Memory_Accountant(budget_gb=getattr(args, 'memory_budget_gb', None))
+        replay_buffer = Vector_ReplayBuffer(args, args.num_envs)
+        agent = PPO_continuous(args, chkpt_dir=self.output_dir + '/model/', train_adv=False)
+
+        state_norm = Normalization(shape=args.state_dim)  # Trick 2:state normalization
+        reward_norm = reward_scaling = None
+        if args.use_reward_norm:  # Trick 3:reward normalization
+            reward_norm = Normalization(shape=1)
+        elif args.use_reward_scaling:  # Trick 4:reward scaling
+            reward_scaling = RewardScaling(shape=1, gamma=args.gamma, num_envs=args.num_envs)
+
+        self.learning_monitor = monitor.Learning_Monitor(output_dir=self.output_dir+'/logs/', name='ppo', args=args)
+        self.learning_monitor.save_log()
+        self.metrics = metrics.Metrics_Sink(self.running_summary, log_file=self.output_dir + '/logs/metrics.jsonl')
+        phases.timers.enable(getattr(args, 'profile_phases', False))
+        self.memory.track('replay_buffer', replay_buffer)
+        self.memory.track_agent('ppo', agent)
+        self.memory.check()
+
+        if args.use_state_norm:
+            s = state_norm(s)
+        self.stopped = False
+        self.timer.start()
+        while total_steps < args.max_train_steps and not self.stopped:
+            with phases.timers.phase('action'):
+                a, a_logprob = agent.choose_actions(s, masks)  # Actions and the corresponding log probabilities of every slot
+
+            with phases.timers.phase('env_step'):
+                s_, r, dw, done = venv.step(a, args)
+            phases.timers.count('steps', args.num_envs)
+
+            if args.use_state_norm:
+                s_ = state_norm(s_)
+            if args.use_reward_norm:
+                r = reward_norm(r.reshape(-1, 1)).reshape(-1)
+            elif args.use_reward_scaling:
+                r = reward_scaling(r).reshape(-1)
+
+            # s_ of a finished slot is its last state, the slot starts its next instance after the store
+            with phases.timers.phase('buffer_store'):
+                replay_buffer.store(s, a, a_logprob, r, s_, dw, done, masks)
+            s = s_
+            total_steps += args.num_envs
+            if done.any():
+                s, masks = venv.reset_done(done)
+                if args.use_state_norm:
+                    s = state_norm(s)
+                if args.use_reward_scaling:
+                    reward_scaling.reset(done)
+                for episode in venv.pop_episodes():
+                    self.metrics.scalar('train/episode_reward', episode['reward'], total_steps)
+
+            if replay_buffer.count == replay_buffer.steps:
+                with phases.timers.phase('update'):
+                    agent.update_vector(replay_buffer, total_steps)
+                phases.timers.count('updates')
+                replay_buffer.count = 0
+
+            # Evaluate the policy every 'evaluate_freq' steps
+            if total_steps >= next_evaluation:
+                next_evaluation += args.evaluate_freq
+                self.timer.stop()
+                logger.success("evaluate_num:{} left: {} - {}%".format(evaluate_num, self.total_eval - evaluate_num, (self.total_eval - evaluate_num)/self.total_eval*100))
+                evaluate_num += 1
+                with phases.timers.phase('evaluation'):
+                    evaluate_reward, num_steps, solved = self.evaluate_policy(args, eval_env, agent, state_norm, total_steps)
+                self.learning_monitor.store(evaluate_reward, num_steps)
+                self.metrics.scalar('info/rewards', evaluate_reward, total_steps)
+                self.metrics.scalar('info/steps', num_steps, total_steps)
+                self.metrics.scalar('info/solved', solved, total_steps)
+                self.metrics.scalar('info/best_steps', self.best_num_steps, total_steps)
+                self.metrics.scalar('info/best_rewards', self.best_reward, total_steps)
+                self.metrics.scalar('info/average_rewards', self.learning_monitor.average(50), total_steps)
+                if phases.timers.enabled:
+                    self.metrics.scalars('perf', phases.timers.report(), total_steps)
+                self.metrics.scalars('memory', self.memory.report(), total_steps)
+                logger.success("evaluate_reward:{} steps:{} solved:{}".format(evaluate_reward, num_steps, solved))
+                if self.early_stop is not None and self.early_stop.should_stop(total_steps, self.learning_monitor, self.output_dir + '/model/'):
+                    self.stopped = True
+                self.timer.start()
+
+        with phases.timers.phase('artifact_io'):
+            checkpoint.flush()
+        if phases.timers.enabled:
+            phases.timers.dump(self.output_dir + '/logs/phases.json')
+        self.total_steps = total_steps
+        self.metrics.close()
+        self.learning_monitor.plot_average_learning_curve(50)
+        self.learning_monitor.plot_learning_curve()
+        self.learning_monitor.dump_to_file()
+        self.timer.stop()
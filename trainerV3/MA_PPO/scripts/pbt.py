@@ -0,0 +1,112 @@
+import os
+import random
+import torch
+from loguru import logger
+from utils import io
+
+'''
+    Population based training for PPO_GameAgent, run as one job per member through utils/scheduler.py.
+
+    Every 'interval' env steps a member writes its full training state (networks, optimizers, normalizers and
+    hyperparameters) to <pbt_dir>/<job>/checkpoint.pt and its score to <pbt_dir>/population.json. A member in the
+    bottom 'quantile' of the population then copies the state of a member from the top 'quantile' (exploit) and
+    multiplies every perturbed hyperparameter by one of 'perturb_factors' (explore), clamped to its 'bounds'. Members
+    only talk through files, so local processes and a shared disk are enough; the exploit history of a member is in
+    <pbt_dir>/<job>/history.json and is picked up again when the member resumes.
+'''
+
+HYPERPARAMETERS = ['lr_a', 'lr_c', 'entropy_coef', 'epsilon']
+# [low, high] every explored value is clamped to; a PPO clip past 1 or a large entropy bonus no longer train
+BOUNDS = {'lr_a': [1e-6, 1e-2], 'lr_c': [1e-6, 1e-2], 'entropy_coef': [0.0, 0.1], 'epsilon': [0.05, 0.5]}
+
+class PBT_Member():
+    def __init__(self, dir, job, interval=5e4, quantile=0.25, perturb_factors=[0.8, 1.2], hyperparameters=HYPERPARAMETERS, window=10, bounds=None) -> None:
+        self.pbt_dir = dir + '/'
+        self.job = job
+        self.interval = interval
+        self.quantile = quantile
+        self.perturb_factors = perturb_factors
+        self.hyperparameters = hyperparameters
+        self.window = window
+        self.bounds = dict(BOUNDS, **(bounds or {}))
+        self.next_ready = interval
+        self.member_dir = io.mkdir(self.pbt_dir + job + '/')
+        self.checkpoint_file = self.member_dir + 'checkpoint.pt'
+        self.random = random.Random(job)
+        self.history = io.load_json(self.member_dir + 'history.json', default=[])
+
+    def get_hyperparameters(self, agent):
+        return {name: getattr(agent, name) for name in self.hyperparameters}
+
+    def set_hyperparameters(self, agent, hyperparameters, total_steps):
+        for name, value in hyperparameters.items():
+            setattr(agent, name, value)
+        if agent.use_lr_decay:
+            agent.lr_decay(total_steps)
+        else:
+            for p in agent.optimizer_actor.param_groups:
+                p['lr'] = agent.lr_a
+            for p in agent.optimizer_critic.param_groups:
+                p['lr'] = agent.lr_c
+
+    def save(self, agent, state_norm, reward_scaling, total_steps):
+        checkpoint = {
+            'actor': agent.actor.state_dict(),
+            'critic': agent.critic.state_dict(),
+            'optimizer_actor': agent.optimizer_actor.state_dict(),
+            'optimizer_critic': agent.optimizer_critic.state_dict(),
+            'state_norm': state_norm.state_dict(),
+            'reward_scaling': reward_scaling.state_dict() if reward_scaling is not None else None,
+            'hyperparameters': self.get_hyperparameters(agent),
+            'total_steps': total_steps,
+        }
+        torch.save(checkpoint, self.checkpoint_file + '.tmp')
+        os.replace(self.checkpoint_file + '.tmp', self.checkpoint_file)
+
+    def load(self, checkpoint_file, agent, state_norm, reward_scaling):
+        checkpoint = torch.load(checkpoint_file, map_location=agent.actor.device, weights_only=False)
+        agent.actor.load_state_dict(checkpoint['actor'])
+        agent.critic.load_state_dict(checkpoint['critic'])
+        agent.optimizer_actor.load_state_dict(checkpoint['optimizer_actor'])
+        agent.optimizer_critic.load_state_dict(checkpoint['optimizer_critic'])
+        state_norm.load_state_dict(checkpoint['state_norm'])
+        if reward_scaling is not None and checkpoint['reward_scaling'] is not None:
+            reward_scaling.load_state_dict(checkpoint['reward_scaling'])
+        return checkpoint['hyperparameters']
+
+    def explore(self, hyperparameters):
+        explored = {}
+        for name, value in hyperparameters.items():
+            value = value * self.random.choice(self.perturb_factors)
+            if name in self.bounds:
+                value = min(max(value, self.bounds[name][0]), self.bounds[name][1])
+            explored[name] = value
+        return explored
+
+    def step(self, total_steps, learning_monitor, agent, state_norm, reward_scaling=None):
+        # returns True when the member was replaced by a perturbed copy of a better one
+        if total_steps < self.next_ready:
+            return False
+        self.next_ready += self.interval
+
+        score = float(learning_monitor.average(self.window))
+        self.save(agent, state_norm, reward_scaling, total_steps)
+        with io.file_lock(self.pbt_dir + 'lock'):
+            population = io.load_json(self.pbt_dir + 'population.json', default={})
+            population[self.job] = {'score': score, 'total_steps': total_steps, 'checkpoint': self.checkpoint_file,
+                                    'hyperparameters': self.get_hyperparameters(agent), 'history': self.history}
+            io.dump_json(self.pbt_dir + 'population.json', population)
+
+        ranked = sorted(population, key=lambda job: population[job]['score'])
+        num_members = max(int(len(ranked) * self.quantile), 1)
+        bottom, top = ranked[:num_members], ranked[-num_members:]
+        if len(ranked) < 2 or self.job not in bottom or self.job in top:
+            return False
+
+        donor = self.random.choice(top)
+        hyperparameters = self.explore(self.load(population[donor]['checkpoint'], agent, state_norm, reward_scaling))
+        self.set_hyperparameters(agent, hyperparameters, total_steps)
+        self.history.append({'total_steps': total_steps, 'donor': donor, 'hyperparameters': hyperparameters})
+        io.dump_json(self.member_dir + 'history.json', self.history)
+        logger.warning('pbt: {} ({}) copies {} ({}) -> {}'.format(self.job, round(score, 2), donor, round(population[donor]['score'], 2), hyperparameters))
+        return True
@@ -3,7 +3,8 @@ import torch.nn.functional as F
 from torch.utils.data.sampler import BatchSampler, SubsetRandomSampler
 import torch.nn as nn
 from torch.distributions import Beta, Normal, Categorical
-from utils import tools
+from utils import tools, checkpoint
+from utils.set_encoder import Set_Encoder
 import os
 from trainerV2.Robust_PPO.scripts import adversarial
 
@@ -13,18 +14,26 @@ def orthogonal_init(layer, gain=1.0):
     nn.init.orthogonal_(layer.weight, gain=gain)
     nn.init.constant_(layer.bias, 0)
 
+def masked_encoder(args, activate_func):
+    # multi-instance runs (environments/vector.py) set max_agents / max_towers: the padded observation and its
+    # masks go through a Set_Encoder before the first layer
+    if getattr(args, 'max_towers', None) is None:
+        return None
+    return Set_Encoder(max_agents=args.max_agents, max_towers=args.max_towers, activate_func=activate_func)
+
 class Actor_Gaussian(nn.Module):
     def __init__(self, args, name='actor_gaussian', chkpt_dir='cache/model/ppo'):
         super(Actor_Gaussian, self).__init__()
         self.device = args.device
         self.max_action = args.max_action
         self.num_agents = args.num_agents
-        self.fc1 = nn.Linear(args.state_dim, args.hidden_width)
+        self.activate_func = [nn.ReLU(), nn.Tanh()][args.use_tanh]  # Trick10: use tanh
+        self.encoder = masked_encoder(args, self.activate_func)
+        self.fc1 = nn.Linear(args.state_dim if self.encoder is None else self.encoder.out_dim, args.hidden_width)
         self.fc2 = nn.Linear(args.hidden_width, args.hidden_width)
         self.mean_layer = nn.Linear(args.hidden_width, self.num_agents)
         self.log_std = nn.Parameter(torch.zeros(1, self.num_agents))  # We use 'nn.Parameter' to train log_std automatically
         self.prob_layer = nn.Linear(args.hidden_width, 2*self.num_agents)
-        self.activate_func = [nn.ReLU(), nn.Tanh()][args.use_tanh]  # Trick10: use tanh
 
         self.name = name
         self.checkpoint_file = os.path.join(chkpt_dir, name)
@@ -37,8 +46,10 @@ class Actor_Gaussian(nn.Module):
             orthogonal_init(self.fc2)
             orthogonal_init(self.mean_layer, gain=0.01)
 
-    def forward(self, s):
+    def forward(self, s, masks=None):
         s = torch.tensor(s).to(self.device)
+        if self.encoder is not None:
+            s = self.encoder(s, torch.as_tensor(masks).to(self.device))
         s = self.activate_func(self.fc1(s))
         s = self.activate_func(self.fc2(s))
         # mean = self.max_action * torch.tanh(self.mean_layer(s))  # [-1,1]->[-max_action,max_action]
@@ -48,14 +59,14 @@ class Actor_Gaussian(nn.Module):
         probs = (torch.tanh(self.prob_layer(s)) + 1).reshape(-1, self.num_agents, 2)
         return mean.cpu(), probs.cpu()
 
-    def evaluate(self, s):
-        mean, probs = self.forward(s)
+    def evaluate(self, s, masks=None):
+        mean, probs = self.forward(s, masks)
         speed = torch.argmax(probs, dim=2)
         return torch.cat([mean, speed], dim=-1)
 
 
-    def get_dist(self, s):
-        mean, probs = self.forward(s)
+    def get_dist(self, s, masks=None):
+        mean, probs = self.forward(s, masks)
         log_std = self.log_std.expand_as(mean).cpu()  # To make 'log_std' have the same dimension as 'mean'
         std = torch.exp(log_std)  # The reason we train the 'log_std' is to ensure std=exp(log_std)>0
         # for i in range(self.num_agents):
@@ -84,10 +95,11 @@ class Critic(nn.Module):
     def __init__(self, args, name='critic', chkpt_dir='model/ppo'):
         super(Critic, self).__init__()
         self.device = args.device
-        self.fc1 = nn.Linear(args.state_dim, args.hidden_width)
+        self.activate_func = [nn.ReLU(), nn.Tanh()][args.use_tanh]  # Trick10: use tanh
+        self.encoder = masked_encoder(args, self.activate_func)
+        self.fc1 = nn.Linear(args.state_dim if self.encoder is None else self.encoder.out_dim, args.hidden_width)
         self.fc2 = nn.Linear(args.hidden_width, args.hidden_width)
         self.fc3 = nn.Linear(args.hidden_width, 1)
-        self.activate_func = [nn.ReLU(), nn.Tanh()][args.use_tanh]  # Trick10: use tanh
 
         self.checkpoint_file = os.path.join(chkpt_dir, name)
         self.num_checkpoints = 0
@@ -100,8 +112,10 @@ class Critic(nn.Module):
             orthogonal_init(self.fc2)
             orthogonal_init(self.fc3)
 
-    def forward(self, s):
+    def forward(self, s, masks=None):
         s = torch.tensor(s).to(self.device)
+        if self.encoder is not None:
+            s = self.encoder(s, torch.as_tensor(masks).to(self.device))
         s = self.activate_func(self.fc1(s))
         s = self.activate_func(self.fc2(s))
         v_s = self.fc3(s)
@@ -189,6 +203,21 @@ class PPO_continuous():
                 a_logprob = torch.cat([dir_dist.log_prob(a_dir), speed_dist.log_prob(a_speed)], dim=-1)  # The log probability density of the action
         return a.numpy().flatten(), a_logprob.numpy().flatten()
 
+    def choose_actions(self, s, masks=None):
+        # one row per slot of a vector env
+        s = torch.tensor(s, dtype=torch.float)
+        with torch.no_grad():
+            dir_dist, speed_dist = self.actor.get_dist(s, masks)
+            a_dir = torch.clamp(dir_dist.sample(), 0, self.max_action)  # [0,max]
+            a_speed = speed_dist.sample()
+            a = torch.cat([a_dir, a_speed], dim=-1)
+            a_logprob = torch.cat([dir_dist.log_prob(a_dir), speed_dist.log_prob(a_speed)], dim=-1)
+        return a.numpy(), a_logprob.numpy()
+
+    def evaluate_actions(self, s, masks=None):
+        with torch.no_grad():
+            return self.actor.evaluate(torch.tensor(s, dtype=torch.float), masks).numpy()
+
     def guassian_kl(self, u1, sigma1, u2, sigma2):
         loss = torch.div(torch.square(u1 - u2) + torch.square(sigma1) - torch.square(sigma2), 2*torch.square(sigma2)) + torch.log(torch.div(sigma2,sigma1))
         return torch.mean(loss, dim=1).unsqueeze(dim=1)
@@ -239,16 +268,30 @@ class PPO_continuous():
             # perturb = self.adv_net(s)
             # perturb_state = s + perturb
         
+        self.optimize(s, a, a_logprob, adv, v_target)
+
+        if self.use_lr_decay:  # Trick 6:learning rate Decay
+            self.lr_decay(total_steps)
+
+    def optimize(self, s, a, a_logprob, adv, v_target, masks=None):
+        # masks: agent and tower masks of a vector env rollout, the actions of padded agents count neither in the
+        # ratios nor in the entropy
+        action_masks = None if masks is None else masks[:, :self.actor.num_agents].repeat(1, 2)
         # Optimize policy for K epochs:
         for _ in range(self.K_epochs):
             # Random sampling and no repetition. 'False' indicates that training will continue even if the number of samples in the last time is less than mini_batch_size
-            for index in BatchSampler(SubsetRandomSampler(range(self.batch_size)), self.mini_batch_size, False):
-                dist_now_angle, dist_now_speed = self.actor.get_dist(s[index])
-                dist_entropy = torch.cat([dist_now_angle.entropy(), dist_now_speed.entropy()], dim=1).sum(1, keepdim=True)  # shape(mini_batch_size X 1)
+            for index in BatchSampler(SubsetRandomSampler(range(len(s))), self.mini_batch_size, False):
+                masks_index = None if masks is None else masks[index]
+                dist_now_angle, dist_now_speed = self.actor.get_dist(s[index], masks_index)
+                entropy = torch.cat([dist_now_angle.entropy(), dist_now_speed.entropy()], dim=1)
                 a_angle, a_speed = a[index].chunk(2, dim=1)
                 a_logprob_now = torch.cat([dist_now_angle.log_prob(a_angle), dist_now_speed.log_prob(a_speed)], dim=1)
+                a_logprob_old = a_logprob[index]
+                if action_masks is not None:
+                    entropy, a_logprob_now, a_logprob_old = entropy * action_masks[index], a_logprob_now * action_masks[index], a_logprob_old * action_masks[index]
+                dist_entropy = entropy.sum(1, keepdim=True)  # shape(mini_batch_size X 1)
                 # a/b=exp(log(a)-log(b))  In multi-dimensional continuous action space，we need to sum up the log_prob
-                ratios = torch.exp(a_logprob_now.sum(1, keepdim=True) - a_logprob[index].sum(1, keepdim=True))  # shape(mini_batch_size X 1)
+                ratios = torch.exp(a_logprob_now.sum(1, keepdim=True) - a_logprob_old.sum(1, keepdim=True))  # shape(mini_batch_size X 1)
 
                 surr1 = ratios * adv[index]  # Only calculate the gradient of 'a_logprob_now' in ratios
                 surr2 = torch.clamp(ratios, 1 - self.epsilon, 1 + self.epsilon) * adv[index]
@@ -268,7 +311,7 @@ class PPO_continuous():
                     self.optimizer_actor.step()
                 ''' 
 
-                v_s = self.critic(s[index])
+                v_s = self.critic(s[index], masks_index)
                 critic_loss = F.mse_loss(v_target[index], v_s)
                 # Update critic
                 self.optimizer_critic.zero_grad()
@@ -280,6 +323,26 @@ class PPO_continuous():
             # self.actor.save_checkpoint(mode=self.env_type)
             # self.critic.save_checkpoint(mode=self.env_type)
 
+    def update_vector(self, replay_buffer, total_steps):
+        # rollout of a vector env stored (steps, num_envs): GAE runs along the steps of every slot
+        s, a, a_logprob, r, s_, dw, done, masks = replay_buffer.numpy_to_tensor()
+        steps, num_envs = r.shape
+        flat = lambda x: x.reshape(steps * num_envs, *x.shape[2:])
+        with torch.no_grad():
+            vs = self.critic(flat(s), flat(masks)).view(steps, num_envs)
+            vs_ = self.critic(flat(s_), flat(masks)).view(steps, num_envs)
+            deltas = r + self.gamma * (1.0 - dw) * vs_ - vs
+            adv = torch.zeros_like(deltas)
+            gae = torch.zeros(num_envs)
+            for t in reversed(range(steps)):
+                gae = deltas[t] + self.gamma * self.lamda * gae * (1.0 - done[t])
+                adv[t] = gae
+            v_target = (adv + vs).view(-1, 1)
+            adv = adv.view(-1, 1)
+            if self.use_adv_norm:  # Trick 1:advantage normalization
+                adv = ((adv - adv.mean()) / (adv.std() + 1e-5))
+
+        self.optimize(flat(s), flat(a), flat(a_logprob), adv, v_target, flat(masks))
         if self.use_lr_decay:  # Trick 6:learning rate Decay
             self.lr_decay(total_steps)
 
@@ -291,11 +354,34 @@ class PPO_continuous():
         for p in self.optimizer_critic.param_groups:
             p['lr'] = lr_c_now
             
-    def save_models(self, mode = 'Default'):
-        self.actor.save_checkpoint(mode=mode)
-        self.critic.save_checkpoint(mode=mode)
+    def state_dict(self):
+        # full training state for resume snapshots
+        state = {'actor': self.actor.state_dict(), 'critic': self.critic.state_dict(),
+                 'optimizer_actor': self.optimizer_actor.state_dict(), 'optimizer_critic': self.optimizer_critic.state_dict(),
+                 'lr_a': self.lr_a, 'lr_c': self.lr_c, 'entropy_coef': self.entropy_coef, 'epsilon': self.epsilon}
         if self.train_adv:
-            self.adv_net.save_checkpoint(mode=mode)
+            state['adv_net'] = self.adv_net.state_dict()
+            state['optimizer_adv'] = self.adv_net.optimizer.state_dict()
+        return state
+
+    def load_state_dict(self, state):
+        self.actor.load_state_dict(state['actor'])
+        self.critic.load_state_dict(state['critic'])
+        self.optimizer_actor.load_state_dict(state['optimizer_actor'])
+        self.optimizer_critic.load_state_dict(state['optimizer_critic'])
+        self.lr_a, self.lr_c = state['lr_a'], state['lr_c']
+        self.entropy_coef, self.epsilon = state['entropy_coef'], state['epsilon']
+        if self.train_adv and 'adv_net' in state:
+            self.adv_net.load_state_dict(state['adv_net'])
+            self.adv_net.optimizer.load_state_dict(state['optimizer_adv'])
+
+    def save_models(self, mode = 'Default', step = None, reward = None, state_norm = None):
+        # written off-thread; a newer best of the same run replaces a save that is still waiting. The state normalizer
+        # the model was evaluated with goes in the same job, to <model dir>/state_norm
+        networks = [self.actor, self.critic] + ([self.adv_net] if self.train_adv else [])
+        files = {tools.checkpoint_path(network.checkpoint_file, mode): network.state_dict() for network in networks}
+        pickled = {os.path.join(os.path.dirname(self.actor.checkpoint_file), 'state_norm'): state_norm.state_dict()} if state_norm is not None else {}
+        checkpoint.writer().save(os.path.dirname(self.actor.checkpoint_file) + mode, files, pickled=pickled, step=step, reward=reward)
 
     def load_models(self, mode = 'Default'):
         self.actor.load_checkpoint(mode=mode)
@@ -0,0 +1,199 @@
+import copy
+import numpy as np
+import torch
+from torch.distributions import Normal, Categorical
+from torch.func import functional_call, stack_module_state, vmap
+from trainerV3.MA_PPO.scripts.ppo_continuous import Actor_Gaussian, Critic
+from utils import tools, checkpoint
+import os
+
+# NOTE: S independent PPO_continuous learners (one per seed) whose parameters are stacked along a leading
+# dimension. Forward passes of all members run as one vmapped functional_call, the losses of all members are
+# summed and back-propagated once. Members never share parameters, so the gradients, the Adam moments and the
+# per member gradient clipping are exactly those of S separate runs.
+
+class Ensemble_Actor(Actor_Gaussian):
+    # same parameters (and state_dict keys) as Actor_Gaussian, without the tensor conversion / device moves that vmap cannot trace
+    def forward(self, s):
+        s = self.activate_func(self.fc1(s))
+        s = self.activate_func(self.fc2(s))
+        mean = 1/2 * (self.max_action * torch.tanh(self.mean_layer(s)) + self.max_action) # [-1,1]->[0,max_action]
+        probs = (torch.tanh(self.prob_layer(s)) + 1).reshape(s.shape[:-1] + (self.num_agents, 2))
+        return mean, probs
+
+class Ensemble_Critic(Critic):
+    def forward(self, s):
+        s = self.activate_func(self.fc1(s))
+        s = self.activate_func(self.fc2(s))
+        return self.fc3(s)
+
+class Stacked_Modules():
+    def __init__(self, modules) -> None:
+        self.modules = modules
+        self.params, self.buffers = stack_module_state(modules)
+        self.base = copy.deepcopy(modules[0]).to('meta')
+
+    def __call__(self, s):
+        # s: (num_members, batch, ...) -> outputs with the same leading member dimension
+        def call_member(params, buffers, x):
+            return functional_call(self.base, (params, buffers), (x,))
+        return vmap(call_member)(self.params, self.buffers, s)
+
+    def parameters(self):
+        return list(self.params.values())
+
+    def member_state_dict(self, i):
+        state_dict = {name: param[i].detach().clone() for name, param in self.params.items()}
+        state_dict.update({name: buffer[i].clone() for name, buffer in self.buffers.items()})
+        return state_dict
+
+    def load_member_state_dict(self, i, state_dict):
+        with torch.no_grad():
+            for name, param in self.params.items():
+                param[i].copy_(state_dict[name])
+
+def clip_grad_norm_per_member(parameters, max_norm):
+    # torch.nn.utils.clip_grad_norm_ for every member separately (Trick 7)
+    grads = [p.grad for p in parameters if p.grad is not None]
+    norms = torch.stack([g.reshape(g.shape[0], -1).norm(dim=1) for g in grads]).norm(dim=0)
+    scale = torch.clamp(max_norm / (norms + 1e-6), max=1.0)
+    for g in grads:
+        g.mul_(scale.reshape((-1,) + (1,) * (g.dim() - 1)))
+
+class PPO_ensemble():
+    def __init__(self, args, seeds, chkpt_dirs):
+        self.num_members = len(seeds)
+        self.max_action = args.max_action
+        self.batch_size = args.batch_size
+        self.mini_batch_size = args.mini_batch_size
+        self.max_train_steps = args.max_train_steps
+        self.lr_a = args.lr_a  # Learning rate of actor
+        self.lr_c = args.lr_c  # Learning rate of critic
+        self.gamma = args.gamma  # Discount factor
+        self.lamda = args.lamda  # GAE parameter
+        self.epsilon = args.epsilon  # PPO clip parameter
+        self.K_epochs = args.K_epochs  # PPO parameter
+        self.entropy_coef = args.entropy_coef  # Entropy coefficient
+        self.use_grad_clip = args.use_grad_clip
+        self.use_lr_decay = args.use_lr_decay
+        self.use_adv_norm = args.use_adv_norm
+        self.device = args.device
+
+        actors, critics = [], []
+        self.generators = []
+        for seed, chkpt_dir in zip(seeds, chkpt_dirs):
+            # same initialization order as PPO_continuous after tools.setup_seed(seed)
+            tools.setup_seed(seed)
+            actors.append(Ensemble_Actor(args, chkpt_dir=chkpt_dir))
+            critics.append(Ensemble_Critic(args, chkpt_dir=chkpt_dir))
+            generator = torch.Generator()
+            generator.manual_seed(seed)
+            self.generators.append(generator)
+
+        self.actor = Stacked_Modules(actors)
+        self.critic = Stacked_Modules(critics)
+
+        eps = 1e-5 if args.set_adam_eps else 1e-8  # Trick 9: set Adam epsilon=1e-5
+        self.optimizer_actor = torch.optim.Adam(self.actor.parameters(), lr=self.lr_a, eps=eps)
+        self.optimizer_critic = torch.optim.Adam(self.critic.parameters(), lr=self.lr_c, eps=eps)
+
+    def to_tensor(self, x):
+        return torch.as_tensor(np.array(x), dtype=torch.float).to(self.device)
+
+    def get_dist(self, s):
+        mean, probs = self.actor(s)
+        log_std = self.actor.params['log_std'].expand_as(mean)  # (num_members, 1, num_agents)
+        return Normal(mean, torch.exp(log_std)), Categorical(probs)
+
+    def evaluate(self, s):  # s: (num_members, state_dim); deterministic actions of every member
+        with torch.no_grad():
+            mean, probs = self.actor(self.to_tensor(s).unsqueeze(1))
+            speed = torch.argmax(probs, dim=-1)
+            a = torch.cat([mean, speed], dim=-1)
+        return a.squeeze(1).cpu().numpy()
+
+    def choose_action(self, s):
+        with torch.no_grad():
+            mean, probs = self.actor(self.to_tensor(s).unsqueeze(1))
+            mean, probs = mean.squeeze(1).cpu(), probs.squeeze(1).cpu()
+            std = torch.exp(self.actor.params['log_std'].squeeze(1)).cpu()
+            probs = probs / probs.sum(dim=-1, keepdim=True)
+
+            # every member draws from its own generator so its samples only depend on its own seed
+            a_dir = torch.stack([torch.normal(mean[i], std[i], generator=self.generators[i]) for i in range(self.num_members)])
+            a_speed = torch.stack([torch.multinomial(probs[i], 1, generator=self.generators[i]).squeeze(-1) for i in range(self.num_members)])
+            a_dir = torch.clamp(a_dir, 0, self.max_action) # [0,max]
+
+            a = torch.cat([a_dir, a_speed.float()], dim=-1)
+            a_logprob = torch.cat([Normal(mean, std).log_prob(a_dir), Categorical(probs).log_prob(a_speed)], dim=-1)
+        return a.numpy(), a_logprob.numpy()
+
+    def update(self, replay_buffer, total_steps):
+        s, a, a_logprob, r, s_, dw, done = replay_buffer.numpy_to_tensor(self.device)  # (num_members, batch_size, ...)
+        adv = torch.zeros_like(r)
+        gae = torch.zeros_like(r[:, 0])
+        with torch.no_grad():  # adv and v_target have no gradient
+            vs = self.critic(s)
+            vs_ = self.critic(s_)
+            deltas = r + self.gamma * (1.0 - dw) * vs_ - vs
+            for t in reversed(range(self.batch_size)):
+                gae = deltas[:, t] + self.gamma * self.lamda * gae * (1.0 - done[:, t])
+                adv[:, t] = gae
+            v_target = adv + vs
+            if self.use_adv_norm:  # Trick 1:advantage normalization
+                adv = ((adv - adv.mean(dim=1, keepdim=True)) / (adv.std(dim=1, keepdim=True) + 1e-5))
+
+        members = torch.arange(self.num_members).unsqueeze(1)
+        for _ in range(self.K_epochs):
+            order = torch.stack([torch.randperm(self.batch_size, generator=g) for g in self.generators])
+            for start in range(0, self.batch_size, self.mini_batch_size):
+                index = order[:, start:start + self.mini_batch_size]
+                dist_now_angle, dist_now_speed = self.get_dist(s[members, index])
+                dist_entropy = torch.cat([dist_now_angle.entropy(), dist_now_speed.entropy()], dim=-1).sum(-1, keepdim=True)
+                a_angle, a_speed = a[members, index].chunk(2, dim=-1)
+                a_logprob_now = torch.cat([dist_now_angle.log_prob(a_angle), dist_now_speed.log_prob(a_speed)], dim=-1)
+                ratios = torch.exp(a_logprob_now.sum(-1, keepdim=True) - a_logprob[members, index].sum(-1, keepdim=True))
+
+                surr1 = ratios * adv[members, index]
+                surr2 = torch.clamp(ratios, 1 - self.epsilon, 1 + self.epsilon) * adv[members, index]
+                actor_loss = -torch.min(surr1, surr2) - self.entropy_coef * dist_entropy # Trick 5: policy entropy
+
+                # per member mean, summed over members: gradients stay independent
+                self.optimizer_actor.zero_grad()
+                actor_loss.mean(dim=(1, 2)).sum().backward()
+                if self.use_grad_clip:  # Trick 7: Gradient clip
+                    clip_grad_norm_per_member(self.actor.parameters(), 0.5)
+                self.optimizer_actor.step()
+
+                v_s = self.critic(s[members, index])
+                critic_loss = ((v_target[members, index] - v_s) ** 2).mean(dim=(1, 2)).sum()
+                self.optimizer_critic.zero_grad()
+                critic_loss.backward()
+                if self.use_grad_clip:  # Trick 7: Gradient clip
+                    clip_grad_norm_per_member(self.critic.parameters(), 0.5)
+                self.optimizer_critic.step()
+
+        if self.use_lr_decay:  # Trick 6:learning rate Decay
+            self.lr_decay(total_steps)
+
+    def lr_decay(self, total_steps):
+        lr_a_now = self.lr_a * (1 - total_steps / self.max_train_steps)
+        lr_c_now = self.lr_c * (1 - total_steps / self.max_train_steps)
+        for p in self.optimizer_actor.param_groups:
+            p['lr'] = lr_a_now
+        for p in self.optimizer_critic.param_groups:
+            p['lr'] = lr_c_now
+
+    def save_models(self, i, mode = 'Default', state_norm = None):
+        # member checkpoints use the Actor_Gaussian / Critic file names, so PPO_continuous can load them directly; written
+        # off-thread in one job with the member's state normalizer, like PPO_continuous.save_models
+        actor, critic = self.actor.modules[i], self.critic.modules[i]
+        files = {tools.checkpoint_path(actor.checkpoint_file, mode): self.actor.member_state_dict(i),
+                 tools.checkpoint_path(critic.checkpoint_file, mode): self.critic.member_state_dict(i)}
+        pickled = {os.path.join(os.path.dirname(actor.checkpoint_file), 'state_norm'): state_norm.state_dict()} if state_norm is not None else {}
+        checkpoint.writer().save(os.path.dirname(actor.checkpoint_file) + mode, files, pickled=pickled)
+
+    def load_models(self, i, mode = 'Default'):
+        actor, critic = self.actor.modules[i], self.critic.modules[i]
+        self.actor.load_member_state_dict(i, tools.load_network_params(mode=mode, checkpoint_file=actor.checkpoint_file))
+        self.critic.load_member_state_dict(i, tools.load_network_params(mode=mode, checkpoint_file=critic.checkpoint_file))
@@ -33,3 +33,76 @@ class ReplayBuffer:
         done = torch.tensor(self.done, dtype=torch.float)
 
         return s, a, a_logprob, r, s_, dw, done
+
+
+class Ensemble_ReplayBuffer:
+    # one rollout storage per ensemble member, stacked along the first dimension
+    def __init__(self, args, num_members):
+        self.s = np.zeros((num_members, args.batch_size, args.state_dim))
+        self.a = np.zeros((num_members, args.batch_size, args.action_dim * args.num_agents))
+        self.a_logprob = np.zeros((num_members, args.batch_size, args.action_dim * args.num_agents))
+        self.r = np.zeros((num_members, args.batch_size, 1))
+        self.s_ = np.zeros((num_members, args.batch_size, args.state_dim))
+        self.dw = np.zeros((num_members, args.batch_size, 1))
+        self.done = np.zeros((num_members, args.batch_size, 1))
+        self.count = 0
+
+    def store(self, s, a, a_logprob, r, s_, dw, done):
+        self.s[:, self.count] = s
+        self.a[:, self.count] = a
+        self.a_logprob[:, self.count] = a_logprob
+        self.r[:, self.count] = np.reshape(r, (-1, 1))
+        self.s_[:, self.count] = s_
+        self.dw[:, self.count] = np.reshape(dw, (-1, 1))
+        self.done[:, self.count] = np.reshape(done, (-1, 1))
+        self.count += 1
+
+    def numpy_to_tensor(self, device='cpu'):
+        s = torch.tensor(self.s, dtype=torch.float).to(device)
+        a = torch.tensor(self.a, dtype=torch.float).to(device)
+        a_logprob = torch.tensor(self.a_logprob, dtype=torch.float).to(device)
+        r = torch.tensor(self.r, dtype=torch.float).to(device)
+        s_ = torch.tensor(self.s_, dtype=torch.float).to(device)
+        dw = torch.tensor(self.dw, dtype=torch.float).to(device)
+        done = torch.tensor(self.done, dtype=torch.float).to(device)
+
+        return s, a, a_logprob, r, s_, dw, done
+
+
+class Vector_ReplayBuffer:
+    # rollout storage of a vector env (environments/vector.py), one column per slot: batch_size // num_envs steps
+    # of all slots, with the agent and tower masks of every observation
+    def __init__(self, args, num_envs):
+        self.steps = args.batch_size // num_envs
+        self.s = np.zeros((self.steps, num_envs, args.state_dim))
+        self.a = np.zeros((self.steps, num_envs, args.action_dim * args.num_agents))
+        self.a_logprob = np.zeros((self.steps, num_envs, args.action_dim * args.num_agents))
+        self.r = np.zeros((self.steps, num_envs))
+        self.s_ = np.zeros((self.steps, num_envs, args.state_dim))
+        self.dw = np.zeros((self.steps, num_envs))
+        self.done = np.zeros((self.steps, num_envs))
+        self.masks = np.zeros((self.steps, num_envs, args.mask_dim))
+        self.count = 0
+
+    def store(self, s, a, a_logprob, r, s_, dw, done, masks):
+        self.s[self.count] = s
+        self.a[self.count] = a
+        self.a_logprob[self.count] = a_logprob
+        self.r[self.count] = np.reshape(r, -1)
+        self.s_[self.count] = s_
+        self.dw[self.count] = dw
+        self.done[self.count] = done
+        self.masks[self.count] = masks
+        self.count += 1
+
+    def numpy_to_tensor(self, device='cpu'):
+        s = torch.tensor(self.s, dtype=torch.float).to(device)
+        a = torch.tensor(self.a, dtype=torch.float).to(device)
+        a_logprob = torch.tensor(self.a_logprob, dtype=torch.float).to(device)
+        r = torch.tensor(self.r, dtype=torch.float).to(device)
+        s_ = torch.tensor(self.s_, dtype=torch.float).to(device)
+        dw = torch.tensor(self.dw, dtype=torch.float).to(device)
+        done = torch.tensor(self.done, dtype=torch.float).to(device)
+        masks = torch.tensor(self.masks, dtype=torch.float).to(device)
+
+        return s, a, a_logprob, r, s_, dw, done, masks
@@ -1,9 +1,8 @@
 import numpy as np
-from torch.utils.tensorboard import SummaryWriter
 from trainerV2.MA_PPO.scripts.normalization import Normalization, RewardScaling
 from trainerV2.MA_PPO.scripts.replaybuffer import ReplayBuffer
 from trainerV2.MA_PPO.scripts.ppo_continuous import PPO_continuous
-from utils import tools, monitor
+from utils import tools, monitor, metrics
 from loguru import logger
 from datetime import datetime
 
@@ -19,9 +18,9 @@ class PPO_GameAgent():
         self.output_dir = output_dir
 
         if train_mode and not debug:
-            self.running_summary = SummaryWriter(log_dir='cache/runs/' + '{}-{}-{}'.format(current_time, args.run_name, args.seed))
+            self.running_summary = metrics.summary_writer(log_dir='cache/runs/' + '{}-{}-{}'.format(current_time, args.run_name, args.seed))
         elif debug:
-            self.running_summary = SummaryWriter(log_dir='cache/runs/' + 'debug')
+            self.running_summary = metrics.summary_writer(log_dir='cache/runs/' + 'debug')
 
         if train_mode:
             self.output_dir = output_dir + '{}-{}'.format(current_time, args.run_name) + '/'
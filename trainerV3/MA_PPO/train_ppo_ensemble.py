@@ -0,0 +1,30 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.dirname(__file__) + '/../..'))
+
+from trainerV3.MA_PPO.scripts.PPO_ensemble_main import PPO_EnsembleAgent
+from trainerV3.MA_PPO.data.ma_env_list import env_list
+from utils import tools
+import argparse
+
+# NOTE: all seeds of one instance are trained in a single process, results land in the same
+# cache/results/<instance>/seed_<seed>/ folders as train_ppo_vanilla.py
+SEEDS = [10, 20, 30, 40, 50, 66, 88, 120, 240, 360, 245, 670, 890]
+RUN_NAME = 'ppo_stationary_vanilla_ensemble'
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog='EnsemblePPO', description='train one policy per seed in a single process')
+    parser.add_argument('--seeds', type=int, nargs='+', default=SEEDS)
+    parsed_args = parser.parse_args()
+
+    args = tools.load_config("configs/config_ppo_ma.yaml")
+    args = tools.dict2class(args)
+    args.train_adv = False
+    args.delta = 0
+    args.run_name = RUN_NAME
+    args.type_reward = 'Lagrangian'
+
+    for i in range(len(env_list)):
+        save_dir = 'cache/results/{}/'.format(env_list[i].instance_name)
+        tools.mkdir(save_dir)
+        PPO_agent = PPO_EnsembleAgent(args=args, seeds=parsed_args.seeds, output_dir=save_dir)
+        PPO_agent.train(env_list[i].environment)
@@ -0,0 +1,63 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.dirname(__file__) + '/../..'))
+
+from trainerV3.MA_PPO.scripts.PPO_multi_main import PPO_MultiAgent
+from environments import registry, scenarios
+from utils import tools, monitor
+import argparse
+import importlib
+
+# NOTE: one policy for a whole set of instances, a scenario file of environments/scenarios.py (the last
+# eval_instances instances are held out for the evaluations) or an env_list module (trained and evaluated on all of it)
+SEED = 10
+RUN_NAME = 'ppo_multi_instance'
+CONFIG = "configs/config_ppo_ma.yaml"
+SCENARIOS = 'cache/scenarios/train.scn'
+
+def load_specs(source, eval_instances, max_episode_steps=None):
+    if source.endswith('.scn'):
+        reader = scenarios.Scenario_Reader(source)
+        # no signal map per generated instance, the rates are computed per step
+        specs = [reader.spec(i, action_type='BangSingular', max_episode_steps=max_episode_steps, signal_map=False) for i in range(len(reader))]
+        eval_instances = min(eval_instances, len(specs) - 1)
+        return specs[:len(specs) - eval_instances], specs[len(specs) - eval_instances:]
+    env_list = importlib.import_module(source).env_list
+    specs = [registry.resolve('{}:{}'.format(source, i)) for i in range(len(env_list))]
+    return specs, specs
+
+def train_job(params):
+    # NOTE: entry point of utils/scheduler.py like train_ppo_vanilla.train_job, 'scenarios' replaces 'instance'
+    params = dict(params)
+    target_spec = params.pop('target', None)
+    args = tools.load_config(params.pop('config', CONFIG))
+    args = tools.dict2class(args)
+    args.train_adv = False
+    args.delta = 0
+    args.run_name = RUN_NAME
+    args.type_reward = 'Lagrangian'
+    source = params.pop('scenarios', SCENARIOS)
+    for key, value in params.items():
+        setattr(args, key, value)
+
+    specs, eval_specs = load_specs(source, args.eval_instances, getattr(args, 'max_episode_steps', None))
+    name = os.path.splitext(os.path.basename(source))[0]
+    save_dir = 'cache/results/{}/seed_{}/'.format(name, args.seed)
+    tools.mkdir(save_dir)
+    tools.setup_seed(args.seed)
+    target = monitor.Target_Detector(**target_spec) if target_spec else None
+    PPO_agent = PPO_MultiAgent(args=args, output_dir=save_dir, early_stop=target)
+    PPO_agent.train(specs, eval_specs)
+    return {'best_reward': float(PPO_agent.best_reward), 'best_num_steps': float(PPO_agent.best_num_steps), 'total_steps': PPO_agent.total_steps,
+            'stopped': PPO_agent.stopped, 'output_dir': PPO_agent.output_dir, **(target.result() if target else {})}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog='MultiPPO', description='train one policy on a set of instances')
+    parser.add_argument('--scenarios', type=str, default=SCENARIOS, help='scenario file (.scn) or env_list module')
+    parser.add_argument('--num_envs', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=SEED)
+    parsed_args = parser.parse_args()
+
+    params = {'scenarios': parsed_args.scenarios, 'seed': parsed_args.seed}
+    if parsed_args.num_envs:
+        params['num_envs'] = parsed_args.num_envs
+    train_job(params)
@@ -2,32 +2,52 @@ import sys, os
 sys.path.append(os.path.abspath(os.path.dirname(__file__) + '/../..'))
 
 from trainerV3.MA_PPO.scripts.PPO_continuous_main import PPO_GameAgent
+from trainerV3.MA_PPO.scripts.pbt import PBT_Member
 # from scripts.continuous.test_moving import env_list
 # from trainerV2.MA_PPO.data.ma_env import env_list
 from trainerV3.MA_PPO.data.ma_env_list import env_list
-from utils import tools
+from utils import tools, asha, monitor
 
 # 10, 15, 243, 10030, 255000
 SEED = 10
 RUN_NAME = 'ppo_stationary_vanilla'
+CONFIG = "configs/config_ppo_ma.yaml"
 
-if __name__ == "__main__":
-    args = tools.load_config("configs/config_ppo_ma.yaml")
+def train_job(params):
+    # NOTE: entry point of utils/scheduler.py, params holds one (instance, seed, ...) combination of a sweep spec;
+    # every other key overrides the matching field of the config
+    params = dict(params)
+    asha_spec = params.pop('asha', None)
+    pbt_spec = params.pop('pbt', None)
+    target_spec = params.pop('target', None)
+    args = tools.load_config(params.pop('config', CONFIG))
     args = tools.dict2class(args)
-    args.seed = SEED
     args.train_adv = False
     args.delta = 0
     args.run_name = RUN_NAME
     args.type_reward = 'Lagrangian'
-    
+    instance_name = params.pop('instance')
+    for key, value in params.items():
+        setattr(args, key, value)
+
+    instance = [env for env in env_list if env.instance_name == instance_name][0]
+    save_dir = 'cache/results/{}/seed_{}/'.format(instance_name, args.seed)
+    tools.mkdir(save_dir)
+    tools.setup_seed(args.seed)
+    early_stop = asha.Successive_Halving(max_steps=args.max_train_steps, **asha_spec) if asha_spec else None
+    # a 'target' spec (benchmarks/e2e.py) ends the run at the first evaluation that reaches it
+    target = monitor.Target_Detector(**target_spec) if target_spec else None
+    early_stop = target or early_stop
+    pbt = PBT_Member(**pbt_spec) if pbt_spec else None
+    PPO_agent = PPO_GameAgent(args=args, output_dir=save_dir, train_mode=True, early_stop=early_stop, pbt=pbt)
+    PPO_agent.train(instance.environment)
+    return {'best_reward': float(PPO_agent.best_reward), 'best_num_steps': float(PPO_agent.best_num_steps), 'total_steps': PPO_agent.total_steps,
+            'stopped': PPO_agent.stopped, 'output_dir': PPO_agent.output_dir, **(target.result() if target else {})}
+
+if __name__ == "__main__":
     seed_list = [10]
     for i in range(len(env_list)):
         for seed in seed_list:
-            args.seed = seed
-            save_dir = 'cache/results/{}/seed_{}/'.format(env_list[i].instance_name, args.seed)
-            tools.mkdir(save_dir)
-            tools.setup_seed(seed)
-            PPO_agent = PPO_GameAgent(args=args, output_dir=save_dir, train_mode=True)
-            PPO_agent.train(env_list[i].environment)
+            train_job({'instance': env_list[i].instance_name, 'seed': seed})
 
-    # PPO_agent.evaluate(env_list.environment_list[0])
\ No newline at end of file
+    # PPO_agent.evaluate(env_list.environment_list[0])
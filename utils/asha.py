@@ -0,0 +1,86 @@
+import os
+import math
+import shutil
+from loguru import logger
+from utils import io, checkpoint
+
+'''
+    Asynchronous successive halving (ASHA) for the jobs of a sweep (utils/scheduler.py).
+
+    Rungs are measured in env steps: min_steps, min_steps * reduction_factor, ... below max_steps. When a run passes
+    a rung it records its metric in <asha_dir>/rung_<steps>.json, shared by all jobs of the sweep, and it keeps
+    training only if it is in the top 1 / reduction_factor of the runs recorded at that rung so far. The model of
+    every survivor is promoted (copied) to <asha_dir>/rung_<steps>/<job>/. The last rung a job reported and its
+    decision are kept in <asha_dir>/jobs/<job>.json, so a resumed or restarted job skips the rungs it already passed
+    and a stopped job stays stopped.
+'''
+
+def make_rungs(min_steps, max_steps, reduction_factor):
+    rungs = []
+    rung = min_steps
+    while rung < max_steps:
+        rungs.append(int(rung))
+        rung = rung * reduction_factor
+    return rungs
+
+class Successive_Halving():
+    def __init__(self, dir, job, max_steps, min_steps=1e5, reduction_factor=3, metric='average_reward', window=50) -> None:
+        assert metric in ['average_reward', 'best_steps']
+        self.asha_dir = dir + '/'
+        self.job = job
+        self.reduction_factor = reduction_factor
+        self.metric = metric
+        self.window = window
+        self.rungs = make_rungs(min_steps, max_steps, reduction_factor)
+        os.makedirs(self.asha_dir + 'jobs/', exist_ok=True)
+        self.job_file = self.asha_dir + 'jobs/{}.json'.format(job)
+        state = io.load_json(self.job_file, default={'last_rung': None, 'stopped': False})
+        self.stopped = state['stopped']
+        self.next_rung = 0 if state['last_rung'] is None else len([rung for rung in self.rungs if rung <= state['last_rung']])
+
+    def value(self, learning_monitor):
+        # larger is better for both metrics
+        if self.metric == 'best_steps':
+            return -float(min(learning_monitor.steps))
+        return float(learning_monitor.average(self.window))
+
+    def record(self, rung, value):
+        rung_file = self.asha_dir + 'rung_{}.json'.format(rung)
+        with io.file_lock(self.asha_dir + 'lock'):
+            records = io.load_json(rung_file, default={})
+            records[self.job] = value
+            io.dump_json(rung_file, records)
+        return records
+
+    def promote(self, rung, model_dir):
+        promoted_dir = self.asha_dir + 'rung_{}/{}/'.format(rung, self.job)
+        checkpoint.flush()  # the best model may still be queued in the background writer
+        shutil.copytree(model_dir, promoted_dir, dirs_exist_ok=True)
+        return promoted_dir
+
+    def save_state(self, rung):
+        io.dump_json(self.job_file, {'last_rung': rung, 'stopped': self.stopped})
+
+    def should_stop(self, total_steps, learning_monitor, model_dir):
+        if self.stopped:
+            return True
+        if self.next_rung >= len(self.rungs) or total_steps < self.rungs[self.next_rung]:
+            return False
+        rung = self.rungs[self.next_rung]
+        self.next_rung += 1
+
+        value = self.value(learning_monitor)
+        records = self.record(rung, value)
+        ranked = sorted(records.values(), reverse=True)
+        num_survivors = max(math.floor(len(ranked) / self.reduction_factor), 1)
+        # NOTE: the first runs reaching a rung have no peers to compare with and always continue
+        if len(ranked) >= self.reduction_factor and value < ranked[num_survivors - 1]:
+            logger.warning('asha: {} stopped at rung {} ({} {} of {} runs)'.format(self.job, rung, self.metric, value, len(ranked)))
+            self.stopped = True
+            self.save_state(rung)
+            return True
+
+        promoted_dir = self.promote(rung, model_dir)
+        self.save_state(rung)
+        logger.success('asha: {} promoted at rung {} to {}'.format(self.job, rung, promoted_dir))
+        return False
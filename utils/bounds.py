@@ -0,0 +1,120 @@
+import numpy as np
+import torch
+
+# NOTE: Interval bound propagation (IBP) through the two hidden layer Actor_Gaussian used by the PPO trainers.
+# Every layer of the actor is either affine or a monotone activation (ReLU / Tanh / tanh squashing), so the
+# propagated [lower, upper] box is a sound over-approximation of every action mean reachable from the input box.
+
+def input_interval(states, delta, one_sided=False):
+    '''
+        delta is a scalar or one value per state. one_sided=True matches the [s, s + delta] noise used by
+        PPO_GameAgent.evaluate_robust, otherwise the L-inf ball [s - delta, s + delta] is used.
+    '''
+    states = torch.as_tensor(np.array(states), dtype=torch.float32)
+    if states.dim() == 1:
+        states = states.unsqueeze(0)
+    delta = torch.as_tensor(np.array(delta), dtype=torch.float32)
+    if delta.dim() == 1:
+        delta = delta.unsqueeze(1)
+
+    upper = states + delta
+    lower = states.expand_as(upper) if one_sided else states - delta
+    return lower, upper
+
+def interval_linear(layer, lower, upper):
+    center = (upper + lower) / 2
+    radius = (upper - lower) / 2
+    center = center @ layer.weight.t() + layer.bias
+    radius = radius @ layer.weight.abs().t()
+    return center - radius, center + radius
+
+def hidden_bounds(actor, lower, upper):
+    lower, upper = interval_linear(actor.fc1, lower.to(actor.device), upper.to(actor.device))
+    lower, upper = actor.activate_func(lower), actor.activate_func(upper)
+    lower, upper = interval_linear(actor.fc2, lower, upper)
+    lower, upper = actor.activate_func(lower), actor.activate_func(upper)
+    return lower, upper
+
+def action_mean_bounds(actor, states, delta, one_sided=False):
+    with torch.no_grad():
+        lower, upper = input_interval(states, delta, one_sided)
+        lower, upper = hidden_bounds(actor, lower, upper)
+        lower, upper = interval_linear(actor.mean_layer, lower, upper)
+        # same squashing as Actor_Gaussian.forward: [-1,1]->[0,max_action]
+        mean_lower = 1/2 * (actor.max_action * torch.tanh(lower) + actor.max_action)
+        mean_upper = 1/2 * (actor.max_action * torch.tanh(upper) + actor.max_action)
+    return mean_lower.cpu(), mean_upper.cpu()
+
+def speed_bounds(actor, states, delta, one_sided=False):
+    # NOTE: only the trainerV3 actor has a prob_layer (discrete speed head)
+    with torch.no_grad():
+        lower, upper = input_interval(states, delta, one_sided)
+        lower, upper = hidden_bounds(actor, lower, upper)
+        lower, upper = interval_linear(actor.prob_layer, lower, upper)
+        probs_lower = (torch.tanh(lower) + 1).reshape(-1, actor.num_agents, 2)
+        probs_upper = (torch.tanh(upper) + 1).reshape(-1, actor.num_agents, 2)
+    return probs_lower.cpu(), probs_upper.cpu()
+
+def action_mean(actor, states):
+    mean, _ = action_mean_bounds(actor, states, 0.0)
+    return mean
+
+def is_certified(actor, states, delta, tolerance, one_sided=False):
+    '''
+        True for the states whose action means provably stay within tolerance of the unperturbed
+        action means (and, for actors with a speed head, whose chosen speed cannot flip).
+    '''
+    nominal = action_mean(actor, states)
+    mean_lower, mean_upper = action_mean_bounds(actor, states, delta, one_sided)
+    deviation = torch.maximum(nominal - mean_lower, mean_upper - nominal).max(dim=1).values
+    certified = deviation <= tolerance
+
+    if hasattr(actor, 'prob_layer'):
+        probs_lower, probs_upper = speed_bounds(actor, states, 0.0)
+        speed = torch.argmax(probs_lower, dim=2, keepdim=True)
+        probs_lower, probs_upper = speed_bounds(actor, states, delta, one_sided)
+        chosen_lower = probs_lower.gather(2, speed)
+        other_upper = probs_upper.gather(2, 1 - speed)
+        certified = certified & (chosen_lower > other_upper).all(dim=1).flatten()
+
+    return certified
+
+def certified_radius(actor, states, tolerance, max_delta=1.0, iterations=20, one_sided=False):
+    '''
+        Per state largest delta (up to max_delta) for which is_certified holds, found by a bisection that is
+        batched over all states: every iteration is a single bound pass over the whole episode.
+    '''
+    num_states = len(states)
+    low = torch.zeros(num_states)
+    high = torch.full((num_states,), float(max_delta))
+
+    certified = is_certified(actor, states, high, tolerance, one_sided)
+    for _ in range(iterations):
+        mid = (low + high) / 2
+        ok = is_certified(actor, states, mid, tolerance, one_sided)
+        low = torch.where(ok, mid, low)
+        high = torch.where(ok, high, mid)
+
+    radius = torch.where(certified, torch.full((num_states,), float(max_delta)), low)
+    return radius.numpy()
+
+def monte_carlo_check(actor, states, delta, num_samples=100, one_sided=False):
+    '''
+        Samples perturbations inside the input box and compares the observed action means with the certified
+        bounds. sound must always be True; the ratio of observed to certified deviation shows how loose IBP is.
+    '''
+    states = torch.as_tensor(np.array(states), dtype=torch.float32)
+    nominal = action_mean(actor, states)
+    mean_lower, mean_upper = action_mean_bounds(actor, states, delta, one_sided)
+
+    noise = torch.rand((num_samples,) + tuple(states.shape))
+    noise = noise * delta if one_sided else (2 * noise - 1) * delta
+    samples = action_mean(actor, (states.unsqueeze(0) + noise).reshape(-1, states.shape[1]))
+    samples = samples.reshape(num_samples, len(states), -1)
+
+    eps = 1e-5
+    sound = bool(((samples >= mean_lower - eps) & (samples <= mean_upper + eps)).all())
+    observed = (samples - nominal).abs().amax(dim=(0, 2))
+    certified = torch.maximum(nominal - mean_lower, mean_upper - nominal).amax(dim=1)
+
+    return {'sound': sound, 'observed_deviation': observed.numpy(), 'certified_deviation': certified.numpy()}
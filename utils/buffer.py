@@ -2,12 +2,8 @@ import sys, os
 sys.path.append(os.path.abspath(os.path.dirname(__file__) + '/..'))
 import numpy as np
 from utils import graph, tools
-import matplotlib
-import matplotlib.pyplot as plt
 import pickle
 
-matplotlib.use("Agg")
-
 class ReplayBuffer():
     def __init__(self, max_size, input_shape, n_actions) -> None:
         self.mem_size = max_size
@@ -108,9 +104,11 @@ class Info():
             pickle.dump(data_collected, handle, protocol=pickle.HIGHEST_PROTOCOL)
         
         handle.close()
-        plt.close('all')
+        if plot:
+            graph.pyplot().close('all')
         
     def plot_dv_info(self, filename, data):
+        plt = graph.pyplot()
         # self.mkdir(type)
         t = [i+1 for i in range(self.timestamp)]
         plt.figure(figsize=(10,5))
@@ -138,3 +136,10 @@ class Info():
         self.data_left_t = []
         self.data_collect_rate_t = []
 
+    def truncate(self, timestamp):
+        # back to an earlier step of the same episode (environments/v2/game.Agent.restore)
+        timestamp = min(self.timestamp, int(timestamp))
+        for log in [self.position_t, self.action_t, self.data_collected_t, self.data_left_t, self.data_collect_rate_t]:
+            del log[timestamp:]
+        self.timestamp = timestamp
+
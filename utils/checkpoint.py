@@ -0,0 +1,121 @@
+import os
+import io
+import time
+import pickle
+import atexit
+import hashlib
+import threading
+import traceback
+import numpy as np
+import torch
+from loguru import logger
+from utils import io as io_utils
+
+'''
+    Background checkpoint writer shared by the whole process (see writer()).
+
+    save() takes a detached copy of the state dicts on the calling thread and returns; one background thread
+    serializes them, writes every file to <file>.tmp and renames it into place, so readers only ever see complete
+    files. Jobs are keyed (e.g. by checkpoint directory): a job that is still waiting when a newer one with the same
+    key arrives is replaced, so a burst of new best evaluations costs one write. Files that belong together (a best
+    model and the state normalizer it was evaluated with) go in the same job, 'pickled' ones in the plain pickle
+    format of io.dump_to_file. Every written file is recorded in manifest.json next to it with its step, reward and
+    sha256.
+'''
+
+def detached_copy(obj):
+    # copy of the live training state, taken on the training thread before the write is queued
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().cpu().clone()
+    if isinstance(obj, np.ndarray):
+        return np.array(obj)
+    if isinstance(obj, dict):
+        return type(obj)((key, detached_copy(value)) for key, value in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(detached_copy(value) for value in obj)
+    return obj
+
+def atomic_write(file, data):
+    with open(file + '.tmp', 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(file + '.tmp', file)
+
+def update_manifest(file, digest, info):
+    manifest_file = os.path.join(os.path.dirname(file), 'manifest.json')
+    manifest = io_utils.load_json(manifest_file, default={})
+    manifest[os.path.basename(file)] = dict(info, sha256=digest, time=time.time())
+    io_utils.dump_json(manifest_file, manifest)
+
+class Checkpoint_Writer():
+    def __init__(self) -> None:
+        self.pending = {}  # key -> (job, args), in submission order
+        self.busy = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, name='checkpoint_writer', daemon=True)
+        self.thread.start()
+        atexit.register(self.flush)
+
+    def submit(self, key, job, *args):
+        with self.condition:
+            if key in self.pending:
+                logger.debug('checkpoint {} coalesced with a newer one'.format(key))
+            self.pending[key] = (job, args)
+            self.condition.notify_all()
+
+    def save(self, key, files, pickled={}, **info):
+        # files: {checkpoint file: state_dict} saved with torch.save, pickled: {file: object} saved with pickle,
+        # info: step / reward recorded in the manifest
+        files = {file: detached_copy(state_dict) for file, state_dict in files.items()}
+        pickled = {file: detached_copy(content) for file, content in pickled.items()}
+        self.submit(key, self.write_files, files, info, pickled)
+
+    def write_files(self, files, info, pickled={}):
+        encoded = []
+        for file, state_dict in files.items():
+            buffer = io.BytesIO()
+            torch.save(state_dict, buffer)
+            encoded.append((file, buffer.getvalue()))
+        encoded += [(file, pickle.dumps(content, protocol=pickle.HIGHEST_PROTOCOL)) for file, content in pickled.items()]
+        for file, data in encoded:
+            atomic_write(file, data)
+            update_manifest(file, hashlib.sha256(data).hexdigest(), info)
+            logger.debug('saved {}'.format(file))
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                key = next(iter(self.pending))
+                job, args = self.pending.pop(key)
+                self.busy = True
+            try:
+                job(*args)
+            except Exception:
+                logger.error('checkpoint {} failed\n{}'.format(key, traceback.format_exc()))
+            finally:
+                with self.condition:
+                    self.busy = False
+                    self.condition.notify_all()
+
+    def flush(self):
+        # blocks until every submitted job is on disk
+        with self.condition:
+            while self.pending or self.busy:
+                self.condition.wait()
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = Checkpoint_Writer()
+    return _writer
+
+def flush():
+    if _writer is not None:
+        _writer.flush()
@@ -0,0 +1,163 @@
+import os
+import time
+import importlib
+import traceback
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from loguru import logger
+from environments import registry
+
+'''
+    Pre-warmed worker pool for short evaluation jobs (robustness sweeps, checkpoint tournaments).
+
+    with eval_pool.Eval_Pool(workers=4, preload=['trainerV2.MA_PPO.data.ma_env_list:config_5']) as pool:
+        results = pool.map([{'dirs': {'actor': model_dir, 'critic': model_dir}, 'env': 'trainerV2.MA_PPO.data.ma_env_list:config_5',
+                             'noise': {'type': 'random', 'delta': 0.05}, 'seed': 1000}, ...])
+
+    The workers are forked from a forkserver that imports torch, numpy and the PPO trainer once and builds the
+    'preload' environments ('module:instance_name' references, see environments/registry.py) or imports the
+    'preload' modules, so those environments and their signal maps are in every worker from its first task on.
+    Workers live as long as the pool; the checkpoints a worker loaded stay in its registry.models, so the same model under another noise level is not loaded again. A task then only costs
+    pickling it and its result.
+
+    Task keys: 'dirs' (actor / critic / adv_net model dirs), 'env' ('module:instance_name' or 'module:index' of an
+    env_list, or the to_dict() of a registry.Env_Spec), 'noise' ({'type': None | 'random' | 'adv', 'delta': float}),
+    'seed', optional 'config' (a PPO config, configs/config_ppo_default.yaml), 'args' (fields set on top of it), 'trainer' (module of the PPO_GameAgent,
+    trainerV2.MA_PPO.scripts.PPO_continuous_main) and 'output_dir'. Every task writes its episode stats to its own
+    <output_dir>/task_<n>/, n counted per pool, so tasks running at the same time never share a directory. map()
+    returns one dict per task, in order, with the metrics of PPO_GameAgent.evaluate_robust or the 'error' of a
+    failed task, each with the registry.models stats of its worker (summary() adds them up over the workers).
+'''
+
+TRAINER = 'trainerV2.MA_PPO.scripts.PPO_continuous_main'
+CONFIG = 'configs/config_ppo_default.yaml'
+OUTPUT_DIR = 'cache/eval_pool/'
+# torch._dynamo is imported by the first torch.optim optimizer of a process, which takes seconds
+PRELOAD = ['numpy', 'torch', 'torch._dynamo', 'utils.tools', 'utils.registry', TRAINER]
+PRELOAD_ENV = 'EVAL_POOL_PRELOAD'
+
+_configs = {}
+
+def evaluation_args(task):
+    from utils import tools
+    config = task.get('config', CONFIG)
+    if config not in _configs:
+        _configs[config] = tools.load_config(config)
+    args = tools.dict2class(dict(_configs[config]))
+    args.adv_lr = 0.005
+    args.type_reward = 'Lagrangian'
+    for key, value in task.get('args', {}).items():
+        setattr(args, key, value)
+    args.delta = task.get('noise', {}).get('delta', 0)
+    return args
+
+def evaluate(task):
+    start = time.perf_counter()
+    try:
+        trainer = importlib.import_module(task.get('trainer', TRAINER))
+        noise = task.get('noise') or {}
+        # a task called outside a pool has no number, the worker pid keeps it apart from other processes
+        output_dir = os.path.join(task.get('output_dir', OUTPUT_DIR), 'task_{}/'.format(task.get('task_id', 'pid{}'.format(os.getpid()))))
+        agent = trainer.PPO_GameAgent(args=evaluation_args(task), output_dir=output_dir, train_mode=False)
+        reward, std_reward, min_reward, steps, var_steps, max_steps = agent.evaluate_robust(
+            env=registry.make(task['env']), dirs=task['dirs'], noise_type=noise.get('type'), seed=task.get('seed'), plot=False)
+        result = {'reward': float(reward), 'std_reward': float(std_reward), 'min_reward': float(min_reward), 'steps': float(steps),
+                  'var_steps': float(var_steps), 'max_steps': float(max_steps)}
+    except Exception:
+        result = {'error': traceback.format_exc()}
+    result.update({'seconds': time.perf_counter() - start, 'pid': os.getpid(), 'registry': registry_stats()})
+    return result
+
+def registry_stats():
+    # utils.registry (checkpoints), not environments.registry
+    from utils.registry import models
+    return models.stats()
+
+def summary(results):
+    # registry.models summary over the workers; the counters of a worker only grow, its last one is the largest
+    workers = {}
+    for result in results:
+        if 'registry' in result:
+            workers[result['pid']] = {key: max(value, workers.get(result['pid'], {}).get(key, 0)) for key, value in result['registry'].items()}
+    totals = {key: sum(stats[key] for stats in workers.values()) for key in ['checkpoints', 'agents', 'hits', 'loads']}
+    return 'registry ({} workers): {} checkpoints, {} agents cached, {} hits, {} loads'.format(len(workers), totals['checkpoints'], totals['agents'],
+                                                                                          totals['hits'], totals['loads'])
+
+def preload_modules():
+    # runs in the forkserver when it imports this module; an environment that fails to build must not take the
+    # server down, its workers then build it on their first task
+    for name in os.environ.get(PRELOAD_ENV, '').split(','):
+        if name:
+            try:
+                if ':' in name:
+                    registry.make(name)
+                else:
+                    importlib.import_module(name)
+            except Exception:
+                logger.exception('eval pool: could not preload {}'.format(name))
+
+def ping(task):
+    # round trip without work, the fixed cost of a task
+    return {'pid': os.getpid()}
+
+def init_worker(threads):
+    import torch
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+
+class Eval_Pool():
+    def __init__(self, workers=None, preload=(), threads=1, method='forkserver') -> None:
+        self.workers = workers or max(1, (os.cpu_count() or 1) // threads)
+        if method not in mp.get_all_start_methods():
+            # NOTE: no forkserver on windows; spawned workers are still reused, only their start is not shared
+            method = 'spawn'
+        context = mp.get_context(method)
+        environ = {}
+        if method == 'forkserver':
+            # must come before the first pool of the process starts the server; the server does not get the
+            # sys.path of this process, so the repo root goes in through PYTHONPATH or the preload finds nothing
+            root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            environ = {'PYTHONPATH': os.pathsep.join([root] + [path for path in os.environ.get('PYTHONPATH', '').split(os.pathsep) if path]),
+                       PRELOAD_ENV: ','.join(PRELOAD + list(preload))}
+            context.set_forkserver_preload(['utils.eval_pool'])
+        start = time.perf_counter()
+        self.submitted = 0
+        # the server inherits the environment once, when the first worker starts; the parent gets its own back
+        saved = {name: os.environ.get(name) for name in environ}
+        os.environ.update(environ)
+        try:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context, initializer=init_worker, initargs=(threads,))
+            # start every worker now so the first tasks do not pay for it
+            list(self.executor.map(ping, range(self.workers)))
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+        logger.info('eval pool: {} {} workers ready in {}s'.format(self.workers, method, round(time.perf_counter() - start, 2)))
+
+    def number(self, task):
+        # the output directory of a task is numbered by the pool, see evaluate
+        if not isinstance(task, dict) or 'task_id' in task:
+            return task
+        self.submitted += 1
+        return dict(task, task_id=self.submitted - 1)
+
+    def submit(self, task, fn=evaluate):
+        return self.executor.submit(fn, self.number(task))
+
+    def map(self, tasks, fn=evaluate):
+        return list(self.executor.map(fn, [self.number(task) for task in tasks]))
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+preload_modules()
@@ -1,10 +1,16 @@
+import sys
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.path as mpath
-import matplotlib.patches as mpatches
-import matplotlib.cm as cm
+
+def pyplot():
+    # matplotlib is only imported by the first plot of a process, headless unless pyplot was set up before
+    import matplotlib
+    if 'matplotlib.pyplot' not in sys.modules:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
 
 def plot_learning_curve(x, scores, figure_file):
+    plt = pyplot()
     running_avg = np.zeros(len(scores))
     for i in range(len(running_avg)):
         running_avg[i] = np.mean(scores[max(0, i-100):(i+1)])
@@ -13,6 +19,7 @@ def plot_learning_curve(x, scores, figure_file):
     plt.savefig(figure_file)
 
 def plot_curve(x, y, figure_file):
+    plt = pyplot()
     plt.figure()
     plt.plot(x, y)
     # plt.title('Running average of previous 100 scores')
@@ -20,6 +27,9 @@ def plot_curve(x, y, figure_file):
     plt.close('all')
 
 def plot_result_path(x_limit, y_limit, tower_locations, paths, curved_path = False):
+    plt = pyplot()
+    import matplotlib.path as mpath
+    import matplotlib.patches as mpatches
     # w = 4
     # h = 3
     # d = 70
@@ -50,13 +60,16 @@ def plot_result_path(x_limit, y_limit, tower_locations, paths, curved_path = Fal
     plt.close('all')
 
 def plot_path(x_limit, y_limit, start_at, end_at, tower_locations, agent_paths, signal_range, dir):
+    plt = pyplot()
+    import matplotlib.path as mpath
+    import matplotlib.patches as mpatches
     tower_range = signal_range
     plt.figure()
     fig, ax = plt.subplots()
     ax.axis([-2, x_limit, -2, y_limit])
 
     color_wheel = ["#cc99ff50", "#ff99ff50", "#ffb36650", "#ff4d9450", "#80b3ff50"]
-    cmap = cm.get_cmap(name='rainbow')
+    cmap = plt.get_cmap('rainbow')  # cm.get_cmap is gone from matplotlib 3.9
     for i, (x, y) in enumerate(tower_locations):
         plt.plot(x, y, marker="*", markersize=10, markeredgecolor="red", markerfacecolor='red')
         circle = plt.Circle( (x, y ), tower_range[i], color=color_wheel[i])
@@ -104,6 +117,7 @@ def plot_path(x_limit, y_limit, start_at, end_at, tower_locations, agent_paths,
 
 
 def plot_robust_radius(name_arr, noise_level, mean_arr, std_arr):
+    plt = pyplot()
     # trail_names = ['weights_normalization/ci50', 'weights_normalization/ci200', 'weights_normalization/ci487', 'weights_normalization/ci4790', 'weights_normalization/uncap', 'vanilla/ci1327']
     colors = ['#ff8c1a', '#0066ff', '#d4ac0d', '#922b21', '#76448a', '#117a65', '#3498db']
     face_colors = ['#ffb366', '#66a3ff', '#f7dc6f', '#d98880', '#af7ac5', '#73c6b6', '#a9cce3']
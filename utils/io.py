@@ -1,6 +1,9 @@
 import pickle, os
 import yaml
 import csv
+import json
+import fcntl
+from contextlib import contextmanager
 
 def mkdir(dir):
     isExist = os.path.exists(dir)
@@ -39,4 +42,26 @@ def load_from_file(file):
 def save_config(output_dir, args, name='config'):
     with open(output_dir+'/{}.yaml'.format(name), "w", encoding = "utf-8") as yaml_file:
         dump = yaml.dump(args, default_flow_style = False, allow_unicode = True, encoding = None)
-        yaml_file.write(dump)
\ No newline at end of file
+        yaml_file.write(dump)
+
+@contextmanager
+def file_lock(lock_file):
+    # exclusive lock shared by the processes of a sweep (local disk or a shared file system with flock support)
+    with open(lock_file, 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def load_json(file, default=None):
+    if not os.path.exists(file):
+        return default
+    with open(file, 'r') as f:
+        return json.load(f)
+
+def dump_json(file, content):
+    # written to a temporary file first so readers never see a partial file
+    with open(file + '.tmp', 'w') as f:
+        json.dump(content, f, indent=2, default=str)
+    os.replace(file + '.tmp', file)
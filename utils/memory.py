@@ -0,0 +1,165 @@
+import os
+import gc
+import sys
+import resource
+import numpy as np
+from loguru import logger
+
+'''
+    Per-component memory accounting for training runs.
+
+    accountant = memory.Memory_Accountant(budget_gb=args.memory_budget_gb)
+    accountant.track('replay_buffer', replay_buffer)
+    accountant.track('actor', agent.actor)
+    accountant.check()                      # before the first step, MemoryError with the breakdown when over budget
+    metrics.scalars('memory', accountant.report(), total_steps)
+
+    A component is sized by what it is: numpy arrays and torch tensors by their bytes, networks by parameters and
+    buffers, optimizers by their state (Adam state that is only created at the first step is counted already),
+    signal maps of Phi_dif_Model by their dict entries, Info traces by their lists, anything else by the arrays
+    it holds (replay buffers). Arrays count at full capacity even while np.zeros has not touched their pages, so a
+    run that will not fit fails at startup rather than when its buffer fills. Every Phi_dif_Model alive when the
+    accountant is made (every environment built so far through environments/registry.py) is tracked on its own. The projected
+    total is the process RSS at that point plus everything tracked after it.
+'''
+
+MB = 2**20
+
+def rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # peak instead of current where there is no /proc (kilobytes on linux, bytes on mac)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+def tensor_bytes(tensor):
+    return tensor.numel() * tensor.element_size()
+
+def is_tensor(value):
+    return hasattr(value, 'element_size') and hasattr(value, 'numel')
+
+def signal_map_bytes(signal_map):
+    # every entry has the same shape ((x, y) -> list of per-tower rates), one entry is sized and multiplied out
+    if not signal_map:
+        return sys.getsizeof(signal_map)
+    key, value = next(iter(signal_map.items()))
+    entry = sys.getsizeof(key) + sum(sys.getsizeof(v) for v in key) + sys.getsizeof(value) + sum(sys.getsizeof(v) for v in value)
+    return sys.getsizeof(signal_map) + entry * len(signal_map)
+
+def trace_bytes(values):
+    # nested lists / arrays of an Info trace
+    if isinstance(values, np.ndarray):
+        return values.nbytes
+    if isinstance(values, (list, tuple)):
+        return sys.getsizeof(values) + sum(trace_bytes(v) for v in values)
+    return sys.getsizeof(values)
+
+def info_bytes(info):
+    return sum(trace_bytes(getattr(info, name)) for name in ['position_t', 'action_t', 'data_collected_t', 'data_left_t', 'data_collect_rate_t'])
+
+def network_bytes(network):
+    return sum(tensor_bytes(p) for p in network.parameters()) + sum(tensor_bytes(b) for b in network.buffers())
+
+def optimizer_bytes(optimizer):
+    total = 0
+    for group in optimizer.param_groups:
+        for param in group['params']:
+            state = optimizer.state.get(param, {})
+            if state:
+                total += sum(tensor_bytes(v) for v in state.values() if is_tensor(v))
+            elif 'betas' in group:
+                # Adam family before its first step: exp_avg and exp_avg_sq of the size of the parameter
+                total += 2 * tensor_bytes(param)
+    return total
+
+def array_bytes(obj):
+    # the numpy arrays and tensors held by an object, e.g. the memories of a replay buffer
+    total = 0
+    for value in vars(obj).values():
+        if isinstance(value, np.ndarray):
+            total += value.nbytes
+        elif is_tensor(value):
+            total += tensor_bytes(value)
+    return total
+
+def sizeof(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if is_tensor(obj):
+        return tensor_bytes(obj)
+    if hasattr(obj, 'signal_map'):
+        return signal_map_bytes(obj.signal_map)
+    if hasattr(obj, 'position_t') and hasattr(obj, 'data_collect_rate_t'):
+        return info_bytes(obj)
+    if hasattr(obj, 'named_parameters'):
+        return network_bytes(obj)
+    if hasattr(obj, 'param_groups'):
+        return optimizer_bytes(obj)
+    return array_bytes(obj)
+
+def signal_models():
+    # every Phi_dif_Model (v1 or v2) alive in the process
+    return [obj for obj in gc.get_objects() if type(obj).__name__ == 'Phi_dif_Model' and getattr(obj, 'signal_map', None) is not None]
+
+class Memory_Accountant():
+    def __init__(self, budget_gb=None) -> None:
+        self.budget = budget_gb * 2**30 if budget_gb else None
+        self.components = {}
+        self.baseline_rss = rss_bytes()
+        self.preloaded = 0
+        for model in signal_models():
+            name = 'signal_map/{}'.format(os.path.basename(model.save_file))
+            self.components[name] = model
+            self.preloaded += sizeof(model)
+
+    def track(self, name, obj):
+        self.components[name] = obj
+
+    def track_env(self, name, env):
+        # signal map and Info traces of a v2 game.Agent (the map may already be tracked under its file name)
+        if not any(obj is env.board.transmitting_model for obj in self.components.values()):
+            self.components['{}/signal_map'.format(name)] = env.board.transmitting_model
+        self.components['{}/running_info'.format(name)] = env.running_info
+        self.components['{}/board_log'.format(name)] = env.board.running_log
+
+    def track_agent(self, name, agent):
+        # every network and optimizer held by a trainer agent
+        for attr, value in vars(agent).items():
+            if (hasattr(value, 'named_parameters') and any(True for _ in value.parameters())) or hasattr(value, 'param_groups'):
+                self.components['{}/{}'.format(name, attr)] = value
+                optimizer = getattr(value, 'optimizer', None)
+                if optimizer is not None and hasattr(optimizer, 'param_groups'):
+                    self.components['{}/{}.optimizer'.format(name, attr)] = optimizer
+
+    def sizes(self):
+        return {name: sizeof(obj) for name, obj in self.components.items()}
+
+    def projected(self, sizes=None):
+        sizes = sizes if sizes is not None else self.sizes()
+        return self.baseline_rss - self.preloaded + sum(sizes.values())
+
+    def report(self):
+        # {tag: MiB} for tensorboard
+        sizes = self.sizes()
+        values = {name: size / MB for name, size in sizes.items()}
+        values.update({'accounted': sum(sizes.values()) / MB, 'projected': self.projected(sizes) / MB, 'process_rss': rss_bytes() / MB})
+        return values
+
+    def breakdown(self):
+        sizes = self.sizes()
+        width = max([len(name) for name in sizes] + [20])
+        lines = ['{:<{w}}  {:>10.1f} MiB'.format(name, size / MB, w=width) for name, size in sorted(sizes.items(), key=lambda item: -item[1])]
+        lines.append('{:<{w}}  {:>10.1f} MiB'.format('accounted', sum(sizes.values()) / MB, w=width))
+        lines.append('{:<{w}}  {:>10.1f} MiB'.format('process at startup', (self.baseline_rss - self.preloaded) / MB, w=width))
+        lines.append('{:<{w}}  {:>10.1f} MiB'.format('projected', self.projected(sizes) / MB, w=width))
+        if self.budget is not None:
+            lines.append('{:<{w}}  {:>10.1f} MiB'.format('budget', self.budget / MB, w=width))
+        return '\n'.join(lines)
+
+    def check(self):
+        breakdown = self.breakdown()
+        if self.budget is not None and self.projected() > self.budget:
+            raise MemoryError('projected memory over the budget of {} GiB\n{}'.format(self.budget / 2**30, breakdown))
+        logger.info('memory:\n{}'.format(breakdown))
@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import numpy as np
+
+'''
+    Streaming metrics for training loops.
+
+    Ring_Buffer keeps the last 'capacity' values of a series in a fixed numpy array with running sums, so the rolling
+    mean / std is O(1) per value whatever the length of the run. Metrics_Sink sits in front of a tensorboard
+    SummaryWriter: scalars and histograms are queued and handed to the writer in one batch at most every flush_secs,
+    histograms of a network at most every histogram_secs, and every scalar is appended to a jsonl log that is never
+    rewritten. summary_writer() imports tensorboard only when a writer is made, evaluation-only processes never do.
+'''
+
+def summary_writer(log_dir):
+    from torch.utils.tensorboard import SummaryWriter
+    return SummaryWriter(log_dir=log_dir)
+
+class Ring_Buffer():
+    def __init__(self, capacity) -> None:
+        self.capacity = int(capacity)
+        self.values = np.zeros(self.capacity)
+        self.index = 0
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    def push(self, value):
+        value = float(value)
+        if self.count == self.capacity:
+            old = self.values[self.index]
+            self.total -= old
+            self.total_sq -= old * old
+        else:
+            self.count += 1
+        self.values[self.index] = value
+        self.total += value
+        self.total_sq += value * value
+        self.index = (self.index + 1) % self.capacity
+        if self.index == 0:
+            # NOTE: the running sums are recomputed once per lap so float drift does not pile up
+            self.total = float(np.sum(self.values[:self.count]))
+            self.total_sq = float(np.sum(np.square(self.values[:self.count])))
+
+    def extend(self, values):
+        for value in values:
+            self.push(value)
+
+    def __len__(self):
+        return self.count
+
+    def mean(self):
+        return self.total / self.count if self.count else float('nan')
+
+    def std(self):
+        if not self.count:
+            return float('nan')
+        mean = self.mean()
+        return float(np.sqrt(max(self.total_sq / self.count - mean * mean, 0.0)))
+
+    def array(self):
+        # oldest to newest
+        if self.count < self.capacity:
+            return self.values[:self.count].copy()
+        return np.concatenate([self.values[self.index:], self.values[:self.index]])
+
+class Metrics_Sink():
+    def __init__(self, summary_writer=None, log_file=None, flush_secs=10, histogram_secs=300) -> None:
+        self.summary_writer = summary_writer
+        self.flush_secs = flush_secs
+        self.histogram_secs = histogram_secs
+        self.scalar_queue = []
+        self.histogram_queue = []
+        self.last_flush = time.monotonic()
+        self.last_histograms = {}
+        self.log = None
+        if log_file is not None:
+            os.makedirs(os.path.dirname(log_file) or '.', exist_ok=True)
+            self.log = open(log_file, 'a', buffering=1)
+
+    def scalar(self, tag, value, step):
+        self.scalar_queue.append((tag, float(value), int(step)))
+        self.flush(force=False)
+
+    def scalars(self, tag, values, step):
+        for name, value in values.items():
+            self.scalar_queue.append(('{}/{}'.format(tag, name), float(value), int(step)))
+        self.flush(force=False)
+
+    def histograms(self, tag, network, step):
+        # at most one set of histograms per network every histogram_secs, copied now so training can go on
+        now = time.monotonic()
+        if now - self.last_histograms.get(tag, -float('inf')) < self.histogram_secs:
+            return
+        self.last_histograms[tag] = now
+        for name, param in network.named_parameters():
+            self.histogram_queue.append(('{}/{}'.format(tag, name), param.detach().cpu().numpy().copy(), int(step)))
+        self.flush(force=False)
+
+    def flush(self, force=True):
+        if not force and time.monotonic() - self.last_flush < self.flush_secs:
+            return
+        self.last_flush = time.monotonic()
+        if self.log is not None and self.scalar_queue:
+            self.log.write(''.join(json.dumps({'tag': tag, 'value': value, 'step': step, 'time': time.time()}) + '\n'
+                                   for tag, value, step in self.scalar_queue))
+        if self.summary_writer is not None:
+            for tag, value, step in self.scalar_queue:
+                self.summary_writer.add_scalar(tag, value, step)
+            for tag, values, step in self.histogram_queue:
+                self.summary_writer.add_histogram(tag, values, step)
+            if self.scalar_queue or self.histogram_queue:
+                self.summary_writer.flush()
+        self.scalar_queue = []
+        self.histogram_queue = []
+
+    def close(self):
+        self.flush()
+        if self.log is not None:
+            self.log.close()
+            self.log = None
@@ -1,10 +1,15 @@
 import numpy as np
 from loguru import logger
-import matplotlib.pyplot as plt
-import pickle, os
+import pickle, os, time
 import yaml
+from utils import metrics, graph
 
 class Learning_Monitor():
+	'''
+		Evaluation history of a run. Every stored evaluation is appended to <name>_history.csv as it comes in,
+		average(n) is served by a ring buffer of the last n rewards (metrics.Ring_Buffer) instead of slicing the
+		history on every call.
+	'''
 	def __init__(self, output_dir='', name='', log = '', args=None) -> None:
 		self.rewards = []
 		self.steps = []
@@ -12,22 +17,43 @@ class Learning_Monitor():
 		self.output_dir = output_dir + '/'
 		self.log = log
 		self.args = args
+		self.windows = {}
 
 		self.mkdir(output_dir)
+		self.history_file = self.output_dir + '{}_history.csv'.format(self.name)
+		# output dirs are reused across runs, a fresh run starts an empty history; a resumed one rewrites it in restore()
+		open(self.history_file, 'w').close()
 
-	def store(self, reward, steps):
+	def store(self, reward, steps=None):
 		self.rewards.append(reward)
-		self.steps.append(steps)
+		if steps is not None:
+			self.steps.append(steps)
+		for window in self.windows.values():
+			window.push(reward)
+		with open(self.history_file, 'a') as f:
+			f.write('{},{},{}\n'.format(len(self.rewards) - 1, reward, '' if steps is None else steps))
 		logger.info('reward is {}'.format(reward))
 
+	def restore(self, rewards, steps):
+		# history of a resumed run; the csv is rewritten so evaluations after the snapshot are dropped
+		self.rewards = list(rewards)
+		self.steps = list(steps)
+		self.windows = {}
+		with open(self.history_file + '.tmp', 'w') as f:
+			for i, reward in enumerate(self.rewards):
+				f.write('{},{},{}\n'.format(i, reward, self.steps[i] if i < len(self.steps) else ''))
+		os.replace(self.history_file + '.tmp', self.history_file)
+
 	def average(self, n):
-		lower = max(len(self.rewards) - n, 0)
-		reward = np.array(self.rewards[lower:])
-		mean = np.mean(reward)
+		if n not in self.windows:
+			self.windows[n] = metrics.Ring_Buffer(n)
+			self.windows[n].extend(self.rewards[-n:])
+		mean = self.windows[n].mean() if len(self.windows[n]) else np.nan
 		logger.info('average rewards of last {} evaluation is {}'.format(n, mean))
 		return mean
 
 	def plot_learning_curve(self):
+		plt = graph.pyplot()
 		name = '/{}_rewards'.format(self.name)
 		filename = self.output_dir + name + '.png'
 
@@ -40,6 +66,7 @@ class Learning_Monitor():
 		plt.close()
 
 	def plot_steps_curve(self):
+		plt = graph.pyplot()
 		name = '/{}_steps'.format(self.name)
 		filename = self.output_dir + name + '.png'
 
@@ -52,14 +79,16 @@ class Learning_Monitor():
 		plt.close()
 
 	def plot_average_learning_curve(self, n):
+		plt = graph.pyplot()
 		name = '/{}_average_{}_rewards'.format(self.name, n)
 		filename = self.output_dir + name + '.png'
 
-		reward = np.array(self.rewards)
-		means = np.zeros(len(self.rewards))
+		# mean of reward[max(0, i-n):i+1] for every i, from one cumulative sum
+		reward = np.array(self.rewards, dtype=float)
 		x = np.arange(len(self.rewards))
-		for i in range(len(means)):
-			means[i] = np.mean(reward[max(0, i-n):(i+1)])
+		cumsum = np.concatenate([[0.0], np.cumsum(reward)])
+		lower = np.maximum(x - n, 0)
+		means = (cumsum[x + 1] - cumsum[lower]) / (x + 1 - lower)
 
 		plt.plot(x, means)
 		plt.title(label=name)
@@ -98,9 +127,105 @@ class Learning_Monitor():
 
 	def reset(self):
 		self.rewards = []
+		self.windows = {}
 
 	def mkdir(self, dir):
 		isExist = os.path.exists(dir)
 		if not isExist:
             # Create a new directory because it does not exist 
-			os.makedirs(dir)
\ No newline at end of file
+			os.makedirs(dir)
+
+class Plateau_Detector():
+	'''
+		Ends a run once the evaluation history of a Learning_Monitor stalls: neither the reward (by more than
+		min_delta) nor the steps improved their best value for 'patience' evaluations, the slope of a linear fit over
+		the last 'window' rewards is at most max_slope and, when max_std is given, their standard deviation is at
+		most max_std.
+	'''
+	def __init__(self, patience=100, window=50, min_delta=0.0, max_slope=0.0, max_std=None) -> None:
+		self.patience = patience
+		self.window = window
+		self.min_delta = min_delta
+		self.max_slope = max_slope
+		self.max_std = max_std
+
+		self.best_reward = -float('inf')
+		self.best_steps = float('inf')
+		self.stalled = 0
+		self.seen = 0
+
+	def update(self, learning_monitor):
+		# consumes every evaluation stored since the last call
+		for i in range(self.seen, len(learning_monitor.rewards)):
+			improved = False
+			if learning_monitor.rewards[i] > self.best_reward + self.min_delta:
+				self.best_reward = learning_monitor.rewards[i]
+				improved = True
+			if i < len(learning_monitor.steps) and learning_monitor.steps[i] < self.best_steps:
+				self.best_steps = learning_monitor.steps[i]
+				improved = True
+			self.stalled = 0 if improved else self.stalled + 1
+		self.seen = len(learning_monitor.rewards)
+
+	def slope(self, rewards):
+		if len(rewards) < 2:
+			return float('inf')
+		return np.polyfit(np.arange(len(rewards)), rewards, 1)[0]
+
+	def should_stop(self, total_steps, learning_monitor, model_dir=None):
+		self.update(learning_monitor)
+		if self.stalled < self.patience:
+			return False
+
+		rewards = np.array(learning_monitor.rewards[-self.window:], dtype=float)
+		slope = self.slope(rewards)
+		if slope > self.max_slope:
+			return False
+		if self.max_std is not None and np.std(rewards) > self.max_std:
+			return False
+
+		logger.warning('plateau after {} steps: {} evaluations without improvement, slope {}, std {}'.format(total_steps, self.stalled, slope, np.std(rewards)))
+		return True
+
+class Target_Detector():
+	'''
+		Time to solution of a run: the first evaluation whose episode took at most max_num_steps steps and, when
+		min_reward is given, earned at least min_reward. Records the training steps and the wall-clock seconds since
+		the detector was made at that point; with stop=True the run ends there.
+	'''
+	def __init__(self, max_num_steps=float('inf'), min_reward=None, stop=True) -> None:
+		self.max_num_steps = max_num_steps
+		self.min_reward = min_reward
+		self.stop = stop
+		self.start = time.monotonic()
+		self.solved = False
+		self.solved_steps = None
+		self.solved_seconds = None
+		self.solved_evaluations = None
+
+	def reached(self, reward, num_steps):
+		if num_steps is None or num_steps > self.max_num_steps:
+			return False
+		return self.min_reward is None or reward >= self.min_reward
+
+	def should_stop(self, total_steps, learning_monitor, model_dir=None):
+		if not self.solved and learning_monitor.rewards and learning_monitor.steps:
+			if self.reached(learning_monitor.rewards[-1], learning_monitor.steps[-1]):
+				self.solved = True
+				self.solved_steps = int(total_steps)
+				self.solved_seconds = time.monotonic() - self.start
+				self.solved_evaluations = len(learning_monitor.rewards)
+				logger.success('target reached after {} steps, {}s, {} evaluations'.format(self.solved_steps, round(self.solved_seconds, 1), self.solved_evaluations))
+		return self.solved and self.stop
+
+	def result(self):
+		return {'solved': self.solved, 'steps_to_target': self.solved_steps, 'seconds_to_target': self.solved_seconds,
+				'evaluations_to_target': self.solved_evaluations, 'seconds': time.monotonic() - self.start}
+
+def plateau_detector(args):
+	# early_stop_* fields of a PPO config, None when early stopping is off
+	patience = getattr(args, 'early_stop_patience', 0)
+	if not patience:
+		return None
+	return Plateau_Detector(patience=patience, window=getattr(args, 'early_stop_window', 50), min_delta=getattr(args, 'early_stop_min_delta', 0.0),
+							max_slope=getattr(args, 'early_stop_slope', 0.0), max_std=getattr(args, 'early_stop_std', None))
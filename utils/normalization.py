@@ -0,0 +1,178 @@
+import os
+import numpy as np
+import torch
+from utils import io, checkpoint
+
+# NOTE: shared by every PPO variant (the per-trainer normalization.py files re-export these classes).
+# update() accepts a single sample of the given shape or a batch with a leading dimension; batches are merged
+# with the parallel Welford / Chan et al. update so vector environments pay one numpy call per step.
+
+class RunningMeanStd:
+    # Dynamically calculate mean and std
+    def __init__(self, shape):  # shape:the dimension of input data
+        self.n = 0
+        self.mean = np.zeros(shape)
+        self.S = np.zeros(shape)
+        self.std = np.sqrt(self.S)
+
+    def update(self, x):
+        x = np.asarray(x, dtype=np.float64)
+        if x.ndim > self.mean.ndim:
+            batch_n = x.shape[0]
+            batch_mean = x.mean(axis=0)
+            batch_S = ((x - batch_mean) ** 2).sum(axis=0)
+        else:
+            batch_n = 1
+            batch_mean = x
+            batch_S = 0
+
+        if self.n == 0 and batch_n == 1:
+            ## NOTE: keep the behaviour of the original single sample update (std = x after the first sample)
+            self.n = 1
+            self.mean = np.array(x, dtype=np.float64)
+            self.std = np.array(x, dtype=np.float64)
+            return
+
+        total = self.n + batch_n
+        delta = batch_mean - self.mean
+        self.mean = self.mean + delta * batch_n / total
+        self.S = self.S + batch_S + delta * delta * self.n * batch_n / total
+        self.n = total
+        self.std = np.sqrt(self.S / self.n)
+
+    def state_dict(self):
+        return {'n': self.n, 'mean': np.array(self.mean), 'S': np.array(self.S), 'std': np.array(self.std)}
+
+    def load_state_dict(self, state):
+        self.n = state['n']
+        self.mean = np.array(state['mean'], dtype=np.float64)
+        self.S = np.array(state['S'], dtype=np.float64)
+        self.std = np.array(state['std'], dtype=np.float64)
+
+
+class Normalization:
+    def __init__(self, shape):
+        self.running_ms = RunningMeanStd(shape=shape)
+
+    def __call__(self, x, update=True):
+        # Whether to update the mean and std,during the evaluating,update=False
+        if update:
+            self.running_ms.update(x)
+        x = (x - self.running_ms.mean) / (self.running_ms.std + 1e-8)
+
+        return x
+
+    def state_dict(self):
+        return self.running_ms.state_dict()
+
+    def load_state_dict(self, state):
+        self.running_ms.load_state_dict(state)
+
+    def save_checkpoint(self, checkpoint_file):
+        # synchronous; next to a best model it goes through save_models(state_norm=...) instead, in the same job
+        io.dump_to_file(checkpoint_file, self.state_dict())
+
+    def load_checkpoint(self, checkpoint_file):
+        checkpoint.flush()  # may still be queued in the background writer with its model
+        if not os.path.exists(checkpoint_file):
+            return False
+        self.load_state_dict(io.load_from_file(checkpoint_file))
+        return True
+
+
+class RewardScaling:
+    def __init__(self, shape, gamma, num_envs=1):
+        self.shape = shape  # reward shape=1
+        self.gamma = gamma  # discount factor
+        self.num_envs = num_envs
+        self.running_ms = RunningMeanStd(shape=self.shape)
+        self.R = self.zeros()
+
+    def zeros(self):
+        # one discounted return per environment when running vector environments
+        if self.num_envs > 1:
+            return np.zeros((self.num_envs, self.shape))
+        return np.zeros(self.shape)
+
+    def __call__(self, x):
+        if self.num_envs > 1:
+            x = np.asarray(x, dtype=np.float64).reshape(self.num_envs, -1)
+        self.R = self.gamma * self.R + x
+        self.running_ms.update(self.R)
+        x = x / (self.running_ms.std + 1e-8)  # Only divided std
+        return x
+
+    def reset(self, done=None):  # When an episode is done,we should reset 'self.R'
+        if done is None:
+            self.R = self.zeros()
+        else:
+            self.R[np.asarray(done, dtype=bool).reshape(-1)] = 0
+
+    def state_dict(self):
+        return {'running_ms': self.running_ms.state_dict(), 'R': np.array(self.R)}
+
+    def load_state_dict(self, state):
+        self.running_ms.load_state_dict(state['running_ms'])
+        self.R = np.array(state['R'], dtype=np.float64)
+
+
+class TorchRunningMeanStd:
+    '''
+        Same statistics as RunningMeanStd kept as float64 tensors, so rollout storage that already lives on the
+        training device can be normalized without a round trip through numpy. state_dict() is interchangeable
+        with RunningMeanStd.
+    '''
+    def __init__(self, shape, device='cpu'):
+        self.device = device
+        self.n = 0
+        self.mean = torch.zeros(shape, dtype=torch.float64, device=device)
+        self.S = torch.zeros(shape, dtype=torch.float64, device=device)
+        self.std = torch.zeros(shape, dtype=torch.float64, device=device)
+
+    def update(self, x):
+        x = torch.as_tensor(x, dtype=torch.float64, device=self.device)
+        if x.dim() <= self.mean.dim():
+            x = x.unsqueeze(0)
+        batch_n = x.shape[0]
+        if self.n == 0 and batch_n == 1:
+            ## NOTE: same first single sample rule as RunningMeanStd (std = x after the first sample)
+            self.n = 1
+            self.mean = x[0].clone()
+            self.std = x[0].clone()
+            return
+        batch_mean = x.mean(dim=0)
+        batch_S = ((x - batch_mean) ** 2).sum(dim=0)
+
+        total = self.n + batch_n
+        delta = batch_mean - self.mean
+        self.mean = self.mean + delta * batch_n / total
+        self.S = self.S + batch_S + delta * delta * self.n * batch_n / total
+        self.n = total
+        self.std = torch.sqrt(self.S / self.n)
+
+    def state_dict(self):
+        return {'n': self.n, 'mean': self.mean.cpu().numpy(), 'S': self.S.cpu().numpy(), 'std': self.std.cpu().numpy()}
+
+    def load_state_dict(self, state):
+        self.n = state['n']
+        self.mean = torch.as_tensor(state['mean'], dtype=torch.float64, device=self.device)
+        self.S = torch.as_tensor(state['S'], dtype=torch.float64, device=self.device)
+        self.std = torch.as_tensor(state['std'], dtype=torch.float64, device=self.device)
+
+
+class TorchNormalization:
+    def __init__(self, shape, device='cpu'):
+        self.running_ms = TorchRunningMeanStd(shape=shape, device=device)
+
+    def __call__(self, x, update=True):
+        if update:
+            self.running_ms.update(x)
+        mean = self.running_ms.mean.to(x.dtype)
+        std = self.running_ms.std.to(x.dtype)
+        return (x - mean) / (std + 1e-8)
+
+    def state_dict(self):
+        return self.running_ms.state_dict()
+
+    def load_state_dict(self, state):
+        self.running_ms.load_state_dict(state)
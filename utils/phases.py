@@ -0,0 +1,113 @@
+import time
+import numpy as np
+from utils import io
+
+'''
+    Phase timers and throughput counters for the training hot path.
+
+    with phases.timers.phase('env_step'):
+        s_, r, done, _ = env.step(action, args)
+    phases.timers.count('steps')
+
+    A phase keeps its call count and total time as integers of time.perf_counter_ns() and its last 'reservoir'
+    durations in a fixed numpy ring for percentiles. The process-wide 'timers' are off by default: phase() then
+    returns a shared no-op context manager and count() returns at once, so the calls can stay in the hot path.
+    report() gives steps/sec and updates/sec since the last report and per-phase p50 / p90 / p99 in microseconds;
+    the PPO trainer sends it to tensorboard at every evaluation and writes summary() to logs/phases.json.
+'''
+
+class Null_Phase():
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_PHASE = Null_Phase()
+
+class Phase():
+    __slots__ = ('name', 'count', 'total_ns', 'samples', 'start')
+
+    def __init__(self, name, reservoir) -> None:
+        self.name = name
+        self.count = 0
+        self.total_ns = 0
+        self.samples = np.zeros(reservoir, dtype=np.int64)
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter_ns() - self.start
+        self.samples[self.count % len(self.samples)] = elapsed
+        self.count += 1
+        self.total_ns += elapsed
+        return False
+
+    def percentiles(self, q=(50, 90, 99)):
+        samples = self.samples[:min(self.count, len(self.samples))]
+        if not len(samples):
+            return [0.0 for _ in q]
+        return list(np.percentile(samples, q) / 1e3)
+
+class Phase_Timers():
+    def __init__(self, enabled=False, reservoir=4096) -> None:
+        self.enabled = enabled
+        self.reservoir = reservoir
+        self.reset()
+
+    def reset(self):
+        self.phases = {}
+        self.counters = {}
+        self.start_ns = time.perf_counter_ns()
+        self.last_report_ns = self.start_ns
+        self.last_counters = {}
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+        self.reset()
+
+    def phase(self, name):
+        if not self.enabled:
+            return NULL_PHASE
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = Phase(name, self.reservoir)
+        return phase
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def report(self):
+        # flat {tag: value} for tensorboard, rates are measured since the previous report
+        now = time.perf_counter_ns()
+        seconds = max(now - self.last_report_ns, 1) / 1e9
+        values = {}
+        for name, count in self.counters.items():
+            values['{}_per_sec'.format(name)] = (count - self.last_counters.get(name, 0)) / seconds
+        for name, phase in self.phases.items():
+            p50, p90, p99 = phase.percentiles()
+            values.update({'{}_p50_us'.format(name): p50, '{}_p90_us'.format(name): p90, '{}_p99_us'.format(name): p99})
+        self.last_report_ns = now
+        self.last_counters = dict(self.counters)
+        return values
+
+    def summary(self):
+        elapsed_ns = max(time.perf_counter_ns() - self.start_ns, 1)
+        phases = {}
+        for name, phase in sorted(self.phases.items(), key=lambda item: -item[1].total_ns):
+            p50, p90, p99 = phase.percentiles()
+            phases[name] = {'count': phase.count, 'total_s': phase.total_ns / 1e9, 'share': phase.total_ns / elapsed_ns,
+                            'mean_us': phase.total_ns / max(phase.count, 1) / 1e3, 'p50_us': p50, 'p90_us': p90, 'p99_us': p99}
+        return {'elapsed_s': elapsed_ns / 1e9, 'counters': dict(self.counters),
+                'rates': {name: count / (elapsed_ns / 1e9) for name, count in self.counters.items()}, 'phases': phases}
+
+    def dump(self, file):
+        io.dump_json(file, self.summary())
+
+timers = Phase_Timers()
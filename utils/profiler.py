@@ -0,0 +1,117 @@
+import os
+import sys
+import time
+import shutil
+import signal
+import threading
+import subprocess
+from collections import Counter
+from loguru import logger
+
+'''
+    On-demand sampling profiler for long training runs, standard library only.
+
+    install() registers a SIGUSR1 handler in the trainer process; 'kill -USR1 <pid>' then samples the stack of the
+    training thread every 'interval' seconds for 'seconds' seconds from a background thread and writes
+    <output_dir>/profile_<pid>_<time>.folded, one 'phase;file:function;...;file:function count' line per stack
+    (the collapsed format of flamegraph.pl, speedscope and inferno). Every stack is tagged with the training phase
+    found on it (rollout, update, evaluation or save, see PHASE_FUNCTIONS). When flamegraph.pl is on the PATH an
+    .svg is rendered next to it. start() runs the same profile from code, e.g. at a configured step.
+'''
+
+# innermost matching 'file:function' on the stack names the phase, anything else is the rollout
+PHASE_FUNCTIONS = {
+    'ppo_continuous.py:update': 'update', 'HER_ddqn.py:learn': 'update', 'sac.py:learn': 'update', 'ddpg.py:learn': 'update',
+    'PPO_continuous_main.py:evaluate_policy': 'evaluation', 'HER_Batch_Trainer.py:evaluate_with_model': 'evaluation',
+    'PPO_continuous_main.py:save_snapshot': 'save', 'snapshot.py:save': 'save', 'checkpoint.py:save': 'save', 'checkpoint.py:flush': 'save',
+}
+
+def frame_name(frame):
+    code = frame.f_code
+    return '{}:{}'.format(os.path.basename(code.co_filename), code.co_name)
+
+def collapse(frame):
+    stack = []
+    phase = 'rollout'
+    while frame is not None:
+        name = frame_name(frame)
+        stack.append(name)
+        if phase == 'rollout' and name in PHASE_FUNCTIONS:
+            phase = PHASE_FUNCTIONS[name]
+        frame = frame.f_back
+    return ';'.join([phase] + stack[::-1])
+
+class Sampling_Profiler():
+    def __init__(self, output_dir, seconds=30, interval=0.005, thread_id=None) -> None:
+        self.output_dir = output_dir
+        self.seconds = seconds
+        self.interval = interval
+        self.thread_id = thread_id if thread_id is not None else threading.main_thread().ident
+        self.samples = Counter()
+        self.thread = None
+        self.stop_event = threading.Event()
+
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        if self.running():
+            logger.warning('profiler already running')
+            return False
+        self.samples = Counter()
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name='sampling_profiler', daemon=True)
+        self.thread.start()
+        logger.warning('profiling pid {} for {}s'.format(os.getpid(), self.seconds))
+        return True
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def run(self):
+        end = time.monotonic() + self.seconds
+        while time.monotonic() < end and not self.stop_event.is_set():
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.samples[collapse(frame)] += 1
+            del frame
+            time.sleep(self.interval)
+        self.write()
+
+    def write(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        file = os.path.join(self.output_dir, 'profile_{}_{}.folded'.format(os.getpid(), time.strftime('%b%d-%H_%M_%S')))
+        with open(file, 'w') as f:
+            for stack, count in self.samples.most_common():
+                f.write('{} {}\n'.format(stack, count))
+
+        phases = Counter()
+        for stack, count in self.samples.items():
+            phases[stack.split(';', 1)[0]] += count
+        total = max(sum(phases.values()), 1)
+        logger.success('profile {}: {} samples, {}'.format(file, total, ', '.join('{} {}%'.format(phase, round(100 * count / total, 1)) for phase, count in phases.most_common())))
+
+        # optional local tool, the folded file is the result either way
+        flamegraph = shutil.which('flamegraph.pl')
+        if flamegraph is not None:
+            with open(file, 'r') as f, open(file.replace('.folded', '.svg'), 'w') as svg:
+                subprocess.run([flamegraph], stdin=f, stdout=svg, check=False)
+        return file
+
+_profiler = None
+
+def install(output_dir, seconds=30, interval=0.005, signum=getattr(signal, 'SIGUSR1', None)):
+    # call from the training thread; a signal starts one profile of that thread (no signal on windows)
+    global _profiler
+    _profiler = Sampling_Profiler(output_dir, seconds=seconds, interval=interval, thread_id=threading.get_ident())
+    if signum is not None and threading.current_thread() is threading.main_thread():
+        signal.signal(signum, lambda signum, frame: _profiler.start())
+        logger.info('kill -USR1 {} profiles the next {}s into {}'.format(os.getpid(), seconds, output_dir))
+    return _profiler
+
+def start():
+    if _profiler is not None:
+        return _profiler.start()
+    return False
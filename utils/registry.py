@@ -0,0 +1,94 @@
+import os
+import torch
+from loguru import logger
+from utils import tools
+
+'''
+    In-process model registry for evaluation scripts.
+
+    Checkpoint files are deserialized once per process and kept by (path, mtime, size), so a file that is rewritten
+    by a running training job is reloaded. Files above mmap_threshold bytes are memory-mapped instead of read into
+    memory. ppo_agent() returns a ready-to-infer PPO_continuous (actor, critic and optionally adv_net loaded, eval
+    mode) keyed by its model dirs and network shape, so evaluating the same run under many modes or noise levels
+    builds and loads it only once.
+'''
+
+# args that change the shape or behaviour of the networks built by PPO_continuous
+NETWORK_ARGS = ['state_dim', 'action_dim', 'num_agents', 'hidden_width', 'policy_dist', 'use_tanh', 'max_action', 'device']
+
+class Model_Registry():
+    def __init__(self, mmap_threshold=64 * 2**20) -> None:
+        self.mmap_threshold = mmap_threshold
+        self.state_dicts = {}
+        self.agents = {}
+        self.state_norms = {}
+        self.hits = 0
+        self.misses = 0
+
+    def file_key(self, file):
+        stat = os.stat(file)
+        return os.path.realpath(file), stat.st_mtime_ns, stat.st_size
+
+    def load_state_dict(self, file):
+        key = self.file_key(file)
+        if key in self.state_dicts:
+            self.hits += 1
+            return self.state_dicts[key]
+
+        self.misses += 1
+        mmap = key[2] >= self.mmap_threshold
+        logger.debug('registry: loading {}{}'.format(file, ' (mmap)' if mmap else ''))
+        state_dict = torch.load(file, map_location='cpu', mmap=mmap)
+        # drop the entries of an older version of the same file
+        self.state_dicts = {k: v for k, v in self.state_dicts.items() if k[0] != key[0]}
+        self.state_dicts[key] = state_dict
+        return state_dict
+
+    def load_network(self, network, chkpt_dir, mode='Default'):
+        network.checkpoint_file = chkpt_dir + network.name
+        network.load_state_dict(self.load_state_dict(tools.checkpoint_path(network.checkpoint_file, mode)))
+
+    def ppo_agent(self, agent_class, args, dirs, load_adv=False, mode='Default'):
+        adv_dir = dirs['adv_net'] if load_adv else None
+        files = [tools.checkpoint_path(dirs[name] + name_file, mode) for name, name_file in
+                 [('actor', 'actor_' + args.policy_dist.lower()), ('critic', 'critic')]]
+        if adv_dir is not None:
+            files.append(tools.checkpoint_path(adv_dir + 'adversial', mode))
+        key = (agent_class, tuple(self.file_key(file) for file in files), tuple(getattr(args, name, None) for name in NETWORK_ARGS))
+
+        if key in self.agents:
+            self.hits += 1
+            agent = self.agents[key]
+        else:
+            agent = agent_class(args, chkpt_dir=dirs['actor'])
+            self.load_network(agent.actor, dirs['actor'], mode)
+            self.load_network(agent.critic, dirs['critic'], mode)
+            if adv_dir is not None:
+                self.load_network(agent.adv_net, adv_dir, mode)
+            for network in [agent.actor, agent.critic, agent.adv_net]:
+                network.eval()
+            self.agents[key] = agent
+        # the clamp of the adversary is the only thing that differs between noise levels
+        agent.adv_net.delta = getattr(args, 'delta', agent.adv_net.delta)
+        return agent
+
+    def state_norm(self, norm_class, checkpoint_file, shape):
+        key = (norm_class, self.file_key(checkpoint_file) if os.path.exists(checkpoint_file) else checkpoint_file, shape)
+        if key not in self.state_norms:
+            state_norm = norm_class(shape=shape)
+            state_norm.load_checkpoint(checkpoint_file)
+            self.state_norms[key] = state_norm
+        return self.state_norms[key]
+
+    def clear(self):
+        self.state_dicts.clear()
+        self.agents.clear()
+        self.state_norms.clear()
+
+    def stats(self):
+        return {'checkpoints': len(self.state_dicts), 'agents': len(self.agents), 'hits': self.hits, 'loads': self.misses}
+
+    def summary(self):
+        return 'registry: {checkpoints} checkpoints, {agents} agents cached, {hits} hits, {loads} loads'.format(**self.stats())
+
+models = Model_Registry()
@@ -0,0 +1,158 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.dirname(__file__) + '/..'))
+import argparse
+import importlib
+import itertools
+import multiprocessing as mp
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from loguru import logger
+from utils import tools, io
+
+'''
+    Local scheduler for (instance x seed x config) sweeps.
+
+    A sweep spec (see configs/sweep_ppo_ma.yaml) names a trainer entry point 'package.module:function', a grid that is
+    expanded into its cartesian product and optional fixed parameters. Every combination is a job; the job state is
+    kept in cache/sweeps/<name>/jobs.json (rewritten atomically after every change) so a killed sweep resumes with
+    the jobs that did not finish. Finished jobs append their result to cache/sweeps/<name>/index.csv.
+    An optional 'asha' section turns on successive halving of the jobs (utils/asha.py), a 'pbt' section population
+    based training (trainerV3/MA_PPO/scripts/pbt.py).
+
+    python utils/scheduler.py configs/sweep_ppo_ma.yaml --threads 2
+'''
+
+PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+
+def available_cpus():
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count()))
+
+def cpu_slots(threads_per_job):
+    cpus = available_cpus()
+    return [cpus[i:i + threads_per_job] for i in range(0, len(cpus) - threads_per_job + 1, threads_per_job)]
+
+def init_worker(slot_queue):
+    # NOTE: every worker process owns one slot of cores for its whole life; torch is sized to the slot
+    cpus = slot_queue.get()
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpus)
+    import torch
+    torch.set_num_threads(len(cpus))
+    torch.set_num_interop_threads(1)
+
+def load_entry_point(entry_point):
+    module_name, function_name = entry_point.split(':')
+    return getattr(importlib.import_module(module_name), function_name)
+
+def run_job(entry_point, params):
+    start = time.time()
+    try:
+        result = load_entry_point(entry_point)(dict(params))
+        return DONE, result if result is not None else {}, time.time() - start, ''
+    except Exception:
+        return FAILED, {}, time.time() - start, traceback.format_exc()
+
+def job_name(params):
+    return '_'.join('{}-{}'.format(key, params[key]) for key in sorted(params)).replace('/', '.')
+
+class Sweep():
+    def __init__(self, spec_file, sweep_dir='cache/sweeps/') -> None:
+        self.spec = tools.load_config(spec_file)
+        self.name = self.spec['name']
+        self.entry_point = self.spec['entry_point']
+        self.sweep_dir = io.mkdir('{}/{}/'.format(sweep_dir, self.name))
+        self.state_file = self.sweep_dir + 'jobs.json'
+        self.jobs = self.load_state()
+
+        for params in self.expand():
+            name = job_name(params)
+            if name not in self.jobs:
+                self.jobs[name] = {'params': params, 'status': PENDING, 'result': {}, 'elapsed': 0, 'error': ''}
+        self.save_state()
+
+    def expand(self):
+        grid = self.spec.get('grid', {})
+        keys = sorted(grid)
+        jobs = []
+        for values in itertools.product(*[grid[key] for key in keys]):
+            params = dict(self.spec.get('fixed', {}))
+            params.update(zip(keys, values))
+            jobs.append(params)
+        return jobs
+
+    def job_params(self, name):
+        params = dict(self.jobs[name]['params'])
+        if 'asha' in self.spec:
+            # successive halving is shared by all jobs of the sweep through files in the sweep directory
+            params['asha'] = dict(self.spec['asha'], dir=self.sweep_dir + 'asha/', job=name)
+        if 'pbt' in self.spec:
+            # population based training, every job of the sweep is one member of the population
+            params['pbt'] = dict(self.spec['pbt'], dir=self.sweep_dir + 'pbt/', job=name)
+        return params
+
+    def load_state(self):
+        jobs = io.load_json(self.state_file, default={})
+        for name, job in jobs.items():
+            # jobs that were running when the sweep was killed start over
+            if job['status'] == RUNNING:
+                job['status'] = PENDING
+        return jobs
+
+    def save_state(self):
+        io.dump_json(self.state_file, self.jobs)
+
+    def save_index(self):
+        result_keys = sorted({key for job in self.jobs.values() for key in job['result']})
+        param_keys = sorted({key for job in self.jobs.values() for key in job['params']})
+        rows = []
+        for name, job in self.jobs.items():
+            rows.append([name, job['status'], round(job['elapsed'], 2)] + [job['params'].get(key, '') for key in param_keys]
+                        + [job['result'].get(key, '') for key in result_keys])
+        io.save_csv(output_dir=self.sweep_dir, name='index', headers=['job', 'status', 'elapsed'] + param_keys + result_keys, logs=rows)
+
+    def run(self, threads_per_job=1, max_workers=None, retry_failed=False):
+        todo = [name for name, job in self.jobs.items() if job['status'] == PENDING or (retry_failed and job['status'] == FAILED)]
+        slots = cpu_slots(threads_per_job)
+        num_workers = min(len(slots), len(todo), max_workers or len(slots))
+        logger.success('sweep {}: {} of {} jobs to run on {} workers x {} threads'.format(self.name, len(todo), len(self.jobs), num_workers, threads_per_job))
+        if num_workers == 0:
+            self.save_index()
+            return
+
+        ctx = mp.get_context('spawn')
+        slot_queue = ctx.Queue()
+        for slot in slots[:num_workers]:
+            slot_queue.put(slot)
+
+        with ProcessPoolExecutor(max_workers=num_workers, mp_context=ctx, initializer=init_worker, initargs=(slot_queue,)) as pool:
+            futures = {}
+            for name in todo:
+                futures[pool.submit(run_job, self.entry_point, self.job_params(name))] = name
+                self.jobs[name]['status'] = RUNNING
+            self.save_state()
+
+            for future in as_completed(futures):
+                name = futures[future]
+                status, result, elapsed, error = future.result()
+                self.jobs[name].update({'status': status, 'result': result, 'elapsed': elapsed, 'error': error})
+                self.save_state()
+                self.save_index()
+                if status == FAILED:
+                    logger.error('job {} failed\n{}'.format(name, error))
+                else:
+                    logger.success('job {} done in {}s'.format(name, round(elapsed)))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='Sweep', description='run a sweep spec on a local process pool')
+    parser.add_argument('spec', type=str)
+    parser.add_argument('--threads', type=int, default=None, help='torch threads (and pinned cores) per job')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--retry_failed', action='store_true')
+    parsed_args = parser.parse_args()
+
+    sweep = Sweep(parsed_args.spec)
+    threads = parsed_args.threads or sweep.spec.get('threads_per_job', 1)
+    sweep.run(threads_per_job=threads, max_workers=parsed_args.workers, retry_failed=parsed_args.retry_failed)
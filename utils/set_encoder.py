@@ -0,0 +1,42 @@
+import torch
+import torch.nn as nn
+
+'''
+    Masked input path of the policy and value networks for the padded observations of environments/vector.py.
+
+    encoder = set_encoder.Set_Encoder(max_agents=3, max_towers=5)
+    features = encoder(s, masks)        # s: (batch, observation_dim), masks: (batch, max_agents + max_towers)
+
+    Agents and towers go through one shared layer each. Padded agents and towers are zeroed by the mask and left out
+    of the pooling, so an instance with two towers gives the same features as the same instance padded to five.
+    The output keeps one block per agent slot (the actions of the policy are per agent) and pools the towers by
+    masked mean and max, so the order of the towers does not matter.
+'''
+
+class Set_Encoder(nn.Module):
+    def __init__(self, max_agents, max_towers, width=32, agent_features=4, tower_features=4, activate_func=None) -> None:
+        super(Set_Encoder, self).__init__()
+        self.max_agents = max_agents
+        self.max_towers = max_towers
+        self.agent_features = agent_features
+        self.tower_features = tower_features
+        self.agent_layer = nn.Linear(agent_features, width)
+        self.tower_layer = nn.Linear(tower_features, width)
+        self.activate_func = activate_func if activate_func is not None else nn.ReLU()
+        # per-agent blocks, agent mean, tower mean, tower max
+        self.out_dim = width * (max_agents + 3)
+
+    def forward(self, s, masks):
+        batch = s.shape[0]
+        masks = masks.to(s.dtype)
+        agent_mask = masks[:, :self.max_agents].unsqueeze(-1)
+        tower_mask = masks[:, self.max_agents:].unsqueeze(-1)
+        agents = s[:, :self.max_agents * self.agent_features].reshape(batch, self.max_agents, self.agent_features)
+        towers = s[:, self.max_agents * self.agent_features:].reshape(batch, self.max_towers, self.tower_features)
+
+        agents = self.activate_func(self.agent_layer(agents)) * agent_mask
+        towers = self.activate_func(self.tower_layer(towers)) * tower_mask
+        agent_mean = agents.sum(1) / agent_mask.sum(1).clamp(min=1)
+        tower_mean = towers.sum(1) / tower_mask.sum(1).clamp(min=1)
+        tower_max = towers.masked_fill(tower_mask == 0, -1e9).max(1)[0] * (tower_mask.sum(1) > 0)
+        return torch.cat([agents.flatten(1), agent_mean, tower_mean, tower_max], dim=1)
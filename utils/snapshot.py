@@ -0,0 +1,108 @@
+import os
+import random
+import shutil
+import numpy as np
+import torch
+from loguru import logger
+from utils import checkpoint
+from utils.checkpoint import detached_copy
+
+'''
+    Crash-safe resume snapshots.
+
+    A snapshot is a directory <snapshot_dir>/step_<step>/ holding state.pt (networks, optimizers, normalizers,
+    counters, monitor history and RNG states) and one raw .npy file per replay buffer array, so large buffers
+    reload with a plain np.load. Snapshots are written by the checkpoint writer into step_<step>.tmp/, renamed into
+    place when complete and published through the 'latest' file, so a run killed at any point finds either the
+    previous or the new snapshot, never a partial one. Trainers only load a snapshot when asked to resume and clear
+    their snapshots once the run finishes, so a rerun of a finished run starts from scratch.
+'''
+
+def rng_state():
+    state = {'python': random.getstate(), 'numpy': np.random.get_state(), 'torch': torch.get_rng_state()}
+    if torch.cuda.is_available():
+        state['cuda'] = torch.cuda.get_rng_state_all()
+    return state
+
+def set_rng_state(state):
+    random.setstate(state['python'])
+    np.random.set_state(state['numpy'])
+    torch.set_rng_state(state['torch'])
+    if 'cuda' in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state['cuda'])
+
+def buffer_state(buffer):
+    # every numpy array of a replay buffer goes to its own .npy file, the counters into state.pt
+    arrays = {key: np.array(value) for key, value in vars(buffer).items() if isinstance(value, np.ndarray)}
+    counters = {key: value for key, value in vars(buffer).items() if isinstance(value, (int, float)) and not isinstance(value, bool)}
+    return arrays, counters
+
+class Snapshot():
+    def __init__(self, snapshot_dir, keep=2) -> None:
+        self.snapshot_dir = snapshot_dir.rstrip('/') + '/'
+        self.keep = keep
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+
+    def latest(self):
+        latest_file = self.snapshot_dir + 'latest'
+        if not os.path.exists(latest_file):
+            return None
+        with open(latest_file, 'r') as f:
+            name = f.read().strip()
+        return self.snapshot_dir + name + '/' if os.path.exists(self.snapshot_dir + name) else None
+
+    def save(self, step, state, buffers={}):
+        state = detached_copy(state)
+        arrays = {}
+        state['buffers'] = {}
+        for name, buffer in buffers.items():
+            buffer_arrays, counters = buffer_state(buffer)
+            state['buffers'][name] = counters
+            arrays.update({'{}.{}'.format(name, key): value for key, value in buffer_arrays.items()})
+        # a snapshot still waiting for the writer is replaced by the newer one
+        checkpoint.writer().submit(self.snapshot_dir, self.write, step, state, arrays)
+
+    def write(self, step, state, arrays):
+        name = 'step_{}'.format(int(step))
+        tmp_dir = self.snapshot_dir + name + '.tmp/'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        torch.save(state, tmp_dir + 'state.pt')
+        for key, value in arrays.items():
+            np.save(tmp_dir + key + '.npy', value)
+        shutil.rmtree(self.snapshot_dir + name, ignore_errors=True)
+        os.rename(tmp_dir, self.snapshot_dir + name)
+
+        with open(self.snapshot_dir + 'latest.tmp', 'w') as f:
+            f.write(name)
+        os.replace(self.snapshot_dir + 'latest.tmp', self.snapshot_dir + 'latest')
+
+        snapshots = sorted([d for d in os.listdir(self.snapshot_dir) if d.startswith('step_')], key=lambda d: int(d.split('_')[1].split('.')[0]))
+        for old in snapshots[:-self.keep]:
+            shutil.rmtree(self.snapshot_dir + old, ignore_errors=True)
+        logger.debug('snapshot {} written'.format(self.snapshot_dir + name))
+
+    def load_state(self):
+        # None when there is nothing to resume from
+        snapshot = self.latest()
+        if snapshot is None:
+            return None
+        logger.warning('resuming from {}'.format(snapshot))
+        return torch.load(snapshot + 'state.pt', weights_only=False)
+
+    def restore_buffers(self, state, buffers):
+        snapshot = self.latest()
+        for name, buffer in buffers.items():
+            for key, value in state['buffers'][name].items():
+                setattr(buffer, key, value)
+            for key, value in vars(buffer).items():
+                if isinstance(value, np.ndarray) and os.path.exists(snapshot + '{}.{}.npy'.format(name, key)):
+                    value[...] = np.load(snapshot + '{}.{}.npy'.format(name, key))
+
+    def flush(self):
+        checkpoint.flush()
+
+    def clear(self):
+        # end of a finished run: pending writes land first, then nothing is left to resume from
+        checkpoint.flush()
+        shutil.rmtree(self.snapshot_dir, ignore_errors=True)
@@ -1,8 +1,8 @@
 import time, os, random, yaml, sys, re
 import numpy as np
 import torch as T
-import matplotlib.pyplot as plt
 from loguru import logger
+from utils import checkpoint, graph
 
 def set_logger_level(level):
     choice = ['TRACE', 'DEBUG', 'INFO', 'SUCCESS', 'WARNING', 'ERROR', 'CRITICAL']
@@ -11,6 +11,7 @@ def set_logger_level(level):
     logger.add(sys.stderr, level=choice[level])
 
 def plot_learning_curve(x, scores, figure_file):
+    plt = graph.pyplot()
     running_avg = np.zeros(len(scores))
     for i in range(len(running_avg)):
         running_avg[i] = np.mean(scores[max(0, i-100):(i+1)])
@@ -19,6 +20,7 @@ def plot_learning_curve(x, scores, figure_file):
     plt.savefig(figure_file)
 
 def plot_curve(x, y, figure_file):
+    plt = graph.pyplot()
     plt.figure()
     plt.plot(x, y)
     # plt.title('Running average of previous 100 scores')
@@ -59,24 +61,20 @@ def load_config(file):
         
     return config
 
-def save_network_params(checkpoint_file, state_dict, mode = 'Default'):
-    if mode == 'Default':
-        checkpoint_file = checkpoint_file
-        logger.debug('saving default to {}'.format(checkpoint_file))
-    else:
-        checkpoint_file = checkpoint_file + '_' + mode
-        logger.debug('saving {} to {}'.format(mode, checkpoint_file))
+def checkpoint_path(checkpoint_file, mode = 'Default'):
+    return checkpoint_file if mode == 'Default' else checkpoint_file + '_' + mode
 
-    T.save(state_dict, checkpoint_file)
+def save_network_params(checkpoint_file, state_dict, mode = 'Default'):
+    checkpoint_file = checkpoint_path(checkpoint_file, mode)
+    logger.debug('saving {} to {}'.format(mode, checkpoint_file))
+    # written next to the target and renamed, readers never see a partial file
+    T.save(state_dict, checkpoint_file + '.tmp')
+    os.replace(checkpoint_file + '.tmp', checkpoint_file)
 
 def load_network_params(checkpoint_file, mode = 'Default'):
-    if mode == 'Default':
-        checkpoint_file = checkpoint_file
-        logger.debug('loading default from {}'.format(checkpoint_file))
-    else:
-        checkpoint_file = checkpoint_file + '_' + mode
-        logger.debug('loading from {}'.format(checkpoint_file))
-    
+    checkpoint_file = checkpoint_path(checkpoint_file, mode)
+    logger.debug('loading {} from {}'.format(mode, checkpoint_file))
+    checkpoint.flush()  # checkpoints of this process still queued in the background writer
     return T.load(checkpoint_file)
 
 class dict2class(object):
@@ -0,0 +1,43 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.dirname(__file__) + '/../..'))
+import tempfile
+from utils import asha, monitor
+
+def job_monitor(dir, job, rewards):
+    tracker = monitor.Learning_Monitor(output_dir=dir + '/logs/{}/'.format(job), name='ppo')
+    for reward in rewards:
+        tracker.store(reward, 100)
+    return tracker
+
+def model_dir(dir, job):
+    model = dir + '/models/{}/'.format(job)
+    os.makedirs(model, exist_ok=True)
+    with open(model + 'actor', 'w') as f:
+        f.write(job)
+    return model
+
+def test_rungs_survive_restart():
+    dir = tempfile.mkdtemp()
+    asha_dir = dir + '/asha'
+    # rungs at 10 and 30 env steps
+    for job, reward in [('a', 3.0), ('b', 2.0)]:
+        scheduler = asha.Successive_Halving(asha_dir, job, max_steps=90, min_steps=10, reduction_factor=3, window=1)
+        assert not scheduler.should_stop(10, job_monitor(dir, job, [reward]), model_dir(dir, job))
+    assert os.path.exists(asha_dir + '/rung_10/a/actor')
+
+    # a restarted job does not report rung 10 again, it goes on to rung 30
+    restarted = asha.Successive_Halving(asha_dir, 'a', max_steps=90, min_steps=10, reduction_factor=3, window=1)
+    assert restarted.next_rung == 1
+    assert not restarted.should_stop(20, job_monitor(dir, 'a', [10.0]), model_dir(dir, 'a'))
+    assert asha.io.load_json(asha_dir + '/rung_10.json', default={}) == {'a': 3.0, 'b': 2.0}
+
+    # the third job is below the top third of rung 10 and stops, and stays stopped after a restart
+    scheduler = asha.Successive_Halving(asha_dir, 'c', max_steps=90, min_steps=10, reduction_factor=3, window=1)
+    assert scheduler.should_stop(10, job_monitor(dir, 'c', [1.0]), model_dir(dir, 'c'))
+    restarted = asha.Successive_Halving(asha_dir, 'c', max_steps=90, min_steps=10, reduction_factor=3, window=1)
+    assert restarted.stopped and restarted.should_stop(10, job_monitor(dir, 'c', [100.0]), model_dir(dir, 'c'))
+    assert not os.path.exists(asha_dir + '/rung_10/c/')
+
+if __name__ == '__main__':
+    test_rungs_survive_restart()
+    print('asha rungs survive a restart')
@@ -0,0 +1,31 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.dirname(__file__) + '/../..'))
+import tempfile
+import numpy as np
+import torch
+from utils import checkpoint, io
+from utils.normalization import Normalization
+
+def test_model_and_state_norm_in_one_job():
+    model_dir = tempfile.mkdtemp() + '/'
+    network = torch.nn.Linear(3, 2)
+    state_norm = Normalization(shape=3)
+    for x in np.random.default_rng(0).normal(size=(10, 3)):
+        state_norm(x)
+    checkpoint.writer().save(model_dir, {model_dir + 'actor': network.state_dict()}, pickled={model_dir + 'state_norm': state_norm.state_dict()},
+                             step=10, reward=1.5)
+
+    # load_checkpoint waits for the queued job, the normalizer reads back in the io.dump_to_file format
+    loaded = Normalization(shape=3)
+    assert loaded.load_checkpoint(model_dir + 'state_norm')
+    assert np.array_equal(loaded.running_ms.mean, state_norm.running_ms.mean) and np.array_equal(loaded.running_ms.std, state_norm.running_ms.std)
+    assert io.load_from_file(model_dir + 'state_norm')['n'] == 10
+    actor = torch.load(model_dir + 'actor')
+    assert all(torch.equal(actor[key], value) for key, value in network.state_dict().items())
+    manifest = io.load_json(model_dir + 'manifest.json', default={})
+    assert manifest['actor']['step'] == manifest['state_norm']['step'] == 10
+    assert not [file for file in os.listdir(model_dir) if file.endswith('.tmp')]
+
+if __name__ == '__main__':
+    test_model_and_state_norm_in_one_job()
+    print('model and state normalizer are written together')
@@ -0,0 +1,21 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.dirname(__file__) + '/../..'))
+from utils import eval_pool
+
+def test_pool_leaves_the_environment_alone():
+    before = {name: os.environ.get(name) for name in ['PYTHONPATH', eval_pool.PRELOAD_ENV]}
+    with eval_pool.Eval_Pool(workers=1) as pool:
+        assert 'pid' in pool.submit(None, fn=eval_pool.ping).result()
+    assert {name: os.environ.get(name) for name in before} == before
+
+def test_summary_over_workers():
+    results = [{'pid': 1, 'registry': {'checkpoints': 2, 'agents': 1, 'hits': 0, 'loads': 2}},
+               {'pid': 1, 'registry': {'checkpoints': 2, 'agents': 1, 'hits': 3, 'loads': 2}},
+               {'pid': 2, 'registry': {'checkpoints': 2, 'agents': 1, 'hits': 1, 'loads': 2}},
+               {'error': 'failed before the registry', 'pid': 3}]
+    assert eval_pool.summary(results) == 'registry (2 workers): 4 checkpoints, 2 agents cached, 4 hits, 4 loads'
+
+if __name__ == '__main__':
+    test_pool_leaves_the_environment_alone()
+    test_summary_over_workers()
+    print('eval pool passes')
@@ -0,0 +1,31 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.dirname(__file__) + '/../..'))
+import tempfile
+from utils import monitor
+
+def history(tracker):
+    with open(tracker.history_file) as f:
+        return f.read().splitlines()
+
+def test_rerun_starts_a_fresh_history():
+    output_dir = tempfile.mkdtemp() + '/logs/'
+    tracker = monitor.Learning_Monitor(output_dir=output_dir, name='ddqn')
+    for reward in [1.0, 2.0, 3.0]:
+        tracker.store(reward, 10)
+    assert len(history(tracker)) == 3
+
+    # a second run in the same output dir does not append onto the first one
+    rerun = monitor.Learning_Monitor(output_dir=output_dir, name='ddqn')
+    assert history(rerun) == []
+    rerun.store(5.0, 20)
+    assert history(rerun) == ['0,5.0,20']
+
+    # a resumed run gets back the history of its snapshot
+    resumed = monitor.Learning_Monitor(output_dir=output_dir, name='ddqn')
+    resumed.restore([1.0, 2.0], [10, 10])
+    resumed.store(4.0, 10)
+    assert history(resumed) == ['0,1.0,10', '1,2.0,10', '2,4.0,10']
+
+if __name__ == '__main__':
+    test_rerun_starts_a_fresh_history()
+    print('history csv starts fresh on a rerun')
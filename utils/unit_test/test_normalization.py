@@ -0,0 +1,28 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.dirname(__file__) + '/../..'))
+import numpy as np
+import torch
+from utils.normalization import Normalization, TorchNormalization
+
+def test_torch_normalization_matches_numpy():
+    # one stream of single states then a batch, both normalizers see the same updates
+    rng = np.random.default_rng(0)
+    stream = [rng.normal(size=5) for _ in range(20)] + [rng.normal(size=(8, 5))]
+    numpy_norm = Normalization(shape=5)
+    torch_norm = TorchNormalization(shape=5)
+    probe = rng.normal(size=5)
+    for x in stream:
+        expected = numpy_norm(x)
+        normalized = torch_norm(torch.as_tensor(x, dtype=torch.float64))
+        assert np.allclose(normalized.numpy(), expected)
+        # a state normalized without update, e.g. during an evaluation right after the first sample
+        assert np.allclose(torch_norm(torch.as_tensor(probe), update=False).numpy(), numpy_norm(probe, update=False))
+        assert np.allclose(torch_norm.running_ms.std.numpy(), numpy_norm.running_ms.std)
+
+    state = torch_norm.state_dict()
+    assert state['n'] == numpy_norm.state_dict()['n']
+    assert np.allclose(state['std'], numpy_norm.running_ms.std)
+
+if __name__ == '__main__':
+    test_torch_normalization_matches_numpy()
+    print('ok')
@@ -0,0 +1,72 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.dirname(__file__) + '/../..'))
+import random
+import tempfile
+import numpy as np
+import torch
+from utils import snapshot, monitor, tools
+from trainerV3.MA_PPO.scripts.replaybuffer import ReplayBuffer
+
+def draws():
+    return random.random(), np.random.rand(3).tolist(), torch.rand(3).tolist()
+
+def fill(buffer, rng, count):
+    for _ in range(count):
+        s = rng.normal(size=buffer.s.shape[1])
+        a = rng.normal(size=buffer.a.shape[1])
+        buffer.store(s, a, a, rng.normal(), s, False, False)
+
+def test_snapshot_round_trip():
+    # save, keep training, resume: the RNG streams, the replay buffer and the monitor continue from the snapshot
+    snapshot_dir = tempfile.mkdtemp()
+    args = tools.dict2class({'batch_size': 16, 'state_dim': 5, 'action_dim': 2, 'num_agents': 2})
+    rng = np.random.default_rng(0)
+    buffer = ReplayBuffer(args)
+    fill(buffer, rng, 10)
+    tracker = monitor.Learning_Monitor(output_dir=snapshot_dir + '/logs/', name='ppo')
+    for i in range(5):
+        tracker.store(-float(i), 100 - i)
+
+    tools.setup_seed(3)
+    snapshots = snapshot.Snapshot(snapshot_dir + '/snapshot/')
+    snapshots.save(10, {'total_steps': 10, 'monitor': {'rewards': tracker.rewards, 'steps': tracker.steps}, 'rng': snapshot.rng_state()},
+                   buffers={'replay_buffer': buffer})
+    snapshots.flush()
+    expected_draws = draws()
+    expected_arrays = {key: np.array(value) for key, value in vars(buffer).items() if isinstance(value, np.ndarray)}
+
+    # the run goes on past the snapshot before it is killed
+    fill(buffer, rng, 4)
+    tracker.store(1.0, 50)
+
+    resumed_buffer = ReplayBuffer(args)
+    resumed_tracker = monitor.Learning_Monitor(output_dir=snapshot_dir + '/logs/', name='ppo')
+    state = snapshot.Snapshot(snapshot_dir + '/snapshot/').load_state()
+    snapshots.restore_buffers(state, buffers={'replay_buffer': resumed_buffer})
+    resumed_tracker.restore(state['monitor']['rewards'], state['monitor']['steps'])
+    snapshot.set_rng_state(state['rng'])
+
+    assert state['total_steps'] == 10
+    assert draws() == expected_draws
+    assert resumed_buffer.count == 10
+    for key, value in expected_arrays.items():
+        assert np.array_equal(getattr(resumed_buffer, key), value)
+    assert resumed_tracker.rewards == [-float(i) for i in range(5)] and resumed_tracker.steps == [100 - i for i in range(5)]
+    with open(resumed_tracker.history_file) as f:
+        assert len(f.readlines()) == 5
+
+def test_snapshot_keep_and_clear():
+    snapshot_dir = tempfile.mkdtemp() + '/snapshot/'
+    snapshots = snapshot.Snapshot(snapshot_dir, keep=2)
+    for step in [1, 2, 3]:
+        snapshots.save(step, {'step': step})
+        snapshots.flush()
+    assert sorted(d for d in os.listdir(snapshot_dir) if d.startswith('step_')) == ['step_2', 'step_3']
+    assert snapshots.load_state()['step'] == 3
+    snapshots.clear()
+    assert snapshot.Snapshot(snapshot_dir).load_state() is None
+
+if __name__ == '__main__':
+    test_snapshot_round_trip()
+    test_snapshot_keep_and_clear()
+    print('snapshot round trips pass')